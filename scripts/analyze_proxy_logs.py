@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Proxy Log Analyzer
+==================
+Streams sing-box, Xray and Clash/mihomo access logs (plain, gzip or
+rotated) and measures how well the generated SA lists cover real traffic:
+
+- Hit rate of destinations against domains/sa.txt (suffix match) and
+  sa-ips/sa-all.txt
+- Per-rule counts: which list entries and which classification categories
+  (as in filter_crux_sa_domains.py) account for the hits
+- Top unmatched registrable domains, tracked with a bounded Space-Saving
+  sketch, optionally DNS-resolved to find the ones hosted in Saudi ranges
+  as suggested additions for data/sa-domains.txt
+
+Usage:
+    python3 analyze_proxy_logs.py /var/log/sing-box/access.log* \\
+        --domains domains/sa.txt --ips sa-ips/sa-all.txt --resolve --suggest suggestions.txt
+"""
+
+import re
+import sys
+import glob
+import heapq
+import json
+from collections import defaultdict
+
+from cidr_index import CidrIndex, ip_to_int
+from dedup_domains import read_domains
+from filter_crux_sa_domains import (
+    CATEGORY_EXCLUDED, classify_domain, open_text, resolve_domains_async,
+)
+
+# Destination "host:port" per log format
+LOG_PATTERNS = {
+    # +0300 2026-10-17 12:00:00 INFO [123 0ms] outbound/direct[direct]: outbound connection to example.com:443
+    'sing-box': re.compile(r'outbound connection to (\S+)'),
+    # 2026/10/17 12:00:00 10.0.0.2:51234 accepted tcp:example.com:443 [socks -> direct]
+    'xray': re.compile(r' accepted (?:tcp|udp):(\S+)'),
+    # time="..." level=info msg="[TCP] 10.0.0.2:51234 --> example.com:443 match GeoSite(sa) using DIRECT"
+    'clash': re.compile(r'--> ([^\s"]+)'),
+}
+
+
+def split_host_port(destination):
+    """Strip the port (and IPv6 brackets) from a log destination."""
+    if destination.startswith('['):
+        return destination[1:].partition(']')[0]
+    host, sep, port = destination.rpartition(':')
+    if sep and port.isdigit() and ':' not in host:
+        return host
+    return destination
+
+
+def iter_destinations(paths, log_format='auto'):
+    """Yield destination hosts (lowercased, no port) from log files."""
+    patterns = list(LOG_PATTERNS.values()) if log_format == 'auto' else [LOG_PATTERNS[log_format]]
+    for path in paths:
+        with open_text(path) as f:
+            for line in f:
+                for pattern in patterns:
+                    match = pattern.search(line)
+                    if match:
+                        yield split_host_port(match.group(1)).rstrip('.').lower()
+                        break
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-K sketch over a stream of keys.
+
+    Keeps at most `capacity` counters. A new key evicts the smallest counter
+    and inherits its count, so counts are overestimates by at most the
+    stored error, and any key with true frequency above N / capacity is
+    guaranteed to be tracked.
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._heap = []
+
+    def add(self, key, count=1):
+        if key in self.counts:
+            self.counts[key] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = count
+            self.errors[key] = 0
+        else:
+            # Pop stale heap entries until the top matches a live minimum
+            while True:
+                floor, victim = heapq.heappop(self._heap)
+                if self.counts.get(victim) == floor:
+                    break
+            del self.counts[victim], self.errors[victim]
+            self.counts[key] = floor + count
+            self.errors[key] = floor
+        heapq.heappush(self._heap, (self.counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c, k) for k, c in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, n):
+        """Top n (key, count, max overestimate) by count."""
+        ranked = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+        return [(key, count, self.errors[key]) for key, count in ranked]
+
+
+class SuffixSet:
+    """Domain list with domain_suffix matching, returning the covering entry."""
+
+    def __init__(self, domains):
+        self.domains = set(domains)
+
+    def match(self, host):
+        domain = host
+        while domain:
+            if domain in self.domains:
+                return domain
+            _, _, domain = domain.partition('.')
+        return None
+
+
+def analyze(destinations, suffixes, networks, sketch_size=10000):
+    """
+    Match destinations against the lists.
+
+    Returns a stats dict plus the Space-Saving sketch of unmatched
+    registrable domains.
+    """
+    stats = {
+        'connections': 0,
+        'domain_hits': 0,
+        'ip_hits': 0,
+        'misses': 0,
+        'unmatched_ips': 0,
+        'excluded_misses': 0,
+        'categories': defaultdict(int),
+        'rules': defaultdict(int),
+    }
+    unmatched = SpaceSaving(sketch_size)
+    for host in destinations:
+        stats['connections'] += 1
+        if ip_to_int(host) is not None:
+            if networks.contains(host):
+                stats['ip_hits'] += 1
+            else:
+                stats['misses'] += 1
+                stats['unmatched_ips'] += 1
+            continue
+        rule = suffixes.match(host)
+        if rule is not None:
+            stats['domain_hits'] += 1
+            stats['rules'][rule] += 1
+            stats['categories'][classify_domain(host)[0]] += 1
+            continue
+        stats['misses'] += 1
+        category, reg_domain, _ = classify_domain(host)
+        if category == CATEGORY_EXCLUDED:
+            stats['excluded_misses'] += 1
+        else:
+            unmatched.add(reg_domain or host)
+    return stats, unmatched
+
+
+def find_saudi_hosted(candidates, networks, **dns_kwargs):
+    """Resolve candidate domains and return those with an address in Saudi ranges."""
+    results = resolve_domains_async(candidates, **dns_kwargs)
+    return {domain for domain, result in results.items() if any(networks.contains_many(result.ips))}
+
+
+def expand_paths(patterns):
+    """Expand globs such as access.log* so rotated and .gz files are all included."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        paths.extend(matches or [pattern])
+    return paths
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Measure SA rule coverage on proxy access logs')
+    parser.add_argument('logs', nargs='+', help='Log files or globs (.gz and rotated files supported)')
+    parser.add_argument('--domains', default='domains/sa.txt', help='Domain suffix list')
+    parser.add_argument('--ips', default='sa-ips/sa-all.txt', help='CIDR list')
+    parser.add_argument('--format', choices=['auto'] + sorted(LOG_PATTERNS), default='auto', help='Log format')
+    parser.add_argument('--top', type=int, default=50, help='Unmatched domains / rules to report')
+    parser.add_argument('--sketch-size', type=int, default=10000, help='Counters kept for unmatched domains')
+    parser.add_argument('--resolve', action='store_true', help='DNS-resolve top unmatched domains against SA ranges')
+    parser.add_argument('--dns-server', default='8.8.8.8', help='DNS server (host or host:port)')
+    parser.add_argument('--suggest', help='Write unmatched Saudi-hosted domains here (needs --resolve)')
+    parser.add_argument('--json', help='Also write the full report as JSON')
+
+    args = parser.parse_args()
+
+    suffixes = SuffixSet(read_domains(args.domains))
+    networks = CidrIndex.from_file(args.ips)
+    paths = expand_paths(args.logs)
+    print(f"Analyzing {len(paths)} log files against {len(suffixes.domains)} domains, "
+          f"{len(networks)} CIDR ranges...", file=sys.stderr)
+
+    stats, unmatched = analyze(iter_destinations(paths, args.format), suffixes, networks, args.sketch_size)
+    total = stats['connections'] or 1
+    hits = stats['domain_hits'] + stats['ip_hits']
+
+    print(f"Connections: {stats['connections']}")
+    print(f"  Hit rate: {hits / total:.1%} ({stats['domain_hits']} by domain, {stats['ip_hits']} by IP)")
+    print(f"  Misses: {stats['misses']} ({stats['unmatched_ips']} bare IPs, "
+          f"{stats['excluded_misses']} known global services)")
+    print("  Hits by category: " + ', '.join(
+        f"{category}={count}" for category, count in sorted(stats['categories'].items(), key=lambda i: -i[1])))
+    print(f"Top {args.top} rules:")
+    for rule, count in sorted(stats['rules'].items(), key=lambda i: (-i[1], i[0]))[:args.top]:
+        print(f"  {count:>10}  {rule}")
+
+    top_unmatched = unmatched.top(args.top)
+    saudi_hosted = set()
+    if args.resolve and top_unmatched:
+        saudi_hosted = find_saudi_hosted([domain for domain, _, _ in top_unmatched], networks,
+                                         server=args.dns_server)
+    print(f"Top {args.top} unmatched domains" + (" (* = resolves to Saudi ranges)" if args.resolve else '') + ":")
+    for domain, count, error in top_unmatched:
+        mark = '*' if domain in saudi_hosted else ' '
+        print(f"  {count:>10}{'~' if error else ' '} {mark} {domain}")
+
+    if args.suggest:
+        with open(args.suggest, 'w') as f:
+            f.write("# Unmatched domains from proxy logs that resolve to Saudi ranges\n")
+            for domain, count, _ in top_unmatched:
+                if domain in saudi_hosted:
+                    f.write(f"{domain}\n")
+        print(f"Wrote {len(saudi_hosted)} suggestions to {args.suggest}", file=sys.stderr)
+
+    if args.json:
+        report = dict(stats, hit_rate=hits / total,
+                      categories=dict(stats['categories']), rules=dict(stats['rules']),
+                      unmatched=[{'domain': d, 'count': c, 'error': e, 'saudi_hosted': d in saudi_hosted}
+                                 for d, c, e in top_unmatched])
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
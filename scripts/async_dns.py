@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Asyncio UDP DNS Resolver
+========================
+A small stub resolver that speaks DNS over UDP directly to a configured
+recursive server, so thousands of lookups can be in flight at once over a
+single socket instead of one blocking getaddrinfo() per thread.
+
+Features:
+- Bounded concurrency (semaphore over domains in flight)
+- Per-query deadline with retries (fresh query ID on every attempt)
+- A/AAAA fan-out per domain, merged into one result
+- Minimum answer TTL and NXDOMAIN status reported for caching
+
+Usage as a script (prints "<domain> <status> <ttl> <ip,ip,...>"):
+    python3 async_dns.py --server 1.1.1.1 < domains.txt
+"""
+
+import sys
+import random
+import time
+import struct
+import socket
+import asyncio
+from collections import namedtuple
+
+QTYPES = {'A': 1, 'AAAA': 28}
+
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+
+# Result of resolving one domain across all requested record types.
+# status is one of: 'ok', 'nxdomain', 'error', 'timeout'
+DnsResult = namedtuple('DnsResult', ['ips', 'ttl', 'status'])
+
+
+def split_server(server, default_port=53):
+    """Split 'host', 'host:port' or '[v6]:port' into (host, port)."""
+    if server.startswith('['):
+        host, _, rest = server[1:].partition(']')
+        return host, int(rest[1:]) if rest.startswith(':') else default_port
+    if server.count(':') == 1:
+        host, port = server.split(':')
+        return host, int(port)
+    return server, default_port
+
+
+def build_query(query_id, name, qtype):
+    """Build a recursive DNS query packet for a single question."""
+    header = struct.pack('>HHHHHH', query_id, 0x0100, 1, 0, 0, 0)
+    qname = b''
+    for label in name.rstrip('.').split('.'):
+        encoded = label.encode('idna') if not label.isascii() else label.encode('ascii')
+        if not encoded or len(encoded) > 63:
+            raise ValueError(f"Invalid DNS label in {name!r}")
+        qname += bytes([len(encoded)]) + encoded
+    return header + qname + b'\x00' + struct.pack('>HH', qtype, 1)
+
+
+def _skip_name(data, offset):
+    """Return the offset just past an encoded (possibly compressed) name."""
+    while True:
+        length = data[offset]
+        if length == 0:
+            return offset + 1
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        offset += length + 1
+
+
+def parse_response(data):
+    """
+    Parse a DNS response packet.
+
+    Returns (query_id, rcode, answers) where answers is a list of
+    (qtype, ttl, ip_string) for every A/AAAA record in the answer section.
+    Raises ValueError on malformed packets.
+    """
+    try:
+        query_id, flags, qdcount, ancount, _, _ = struct.unpack_from('>HHHHHH', data, 0)
+        offset = 12
+        for _ in range(qdcount):
+            offset = _skip_name(data, offset) + 4
+
+        answers = []
+        for _ in range(ancount):
+            offset = _skip_name(data, offset)
+            rtype, _, ttl, rdlength = struct.unpack_from('>HHIH', data, offset)
+            offset += 10
+            rdata = data[offset:offset + rdlength]
+            offset += rdlength
+            if rtype == 1 and rdlength == 4:
+                answers.append((rtype, ttl, socket.inet_ntop(socket.AF_INET, rdata)))
+            elif rtype == 28 and rdlength == 16:
+                answers.append((rtype, ttl, socket.inet_ntop(socket.AF_INET6, rdata)))
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"Malformed DNS response: {e}")
+    return query_id, flags & 0x000F, answers
+
+
+class _DnsProtocol(asyncio.DatagramProtocol):
+    """Routes incoming datagrams to pending queries by query ID."""
+
+    def __init__(self):
+        self.pending = {}
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            parsed = parse_response(data)
+        except ValueError:
+            return
+        entry = self.pending.get(parsed[0])
+        if entry is None:
+            return
+        future, question = entry
+        # A late reply to an abandoned query may reuse a live ID; check the question too
+        if data[12:12 + len(question)].lower() != question:
+            return
+        del self.pending[parsed[0]]
+        if not future.done():
+            future.set_result(parsed)
+
+    def error_received(self, exc):
+        # ICMP errors cannot be tied to a query; pending queries will time out
+        pass
+
+
+class DnsResolver:
+    """
+    Concurrent UDP DNS resolver.
+
+    Args:
+        server: Recursive DNS server address (IPv4 or IPv6)
+        port: DNS server port
+        concurrency: Maximum number of domains resolved at once
+        timeout: Per-query deadline in seconds
+        retries: Extra attempts after a timed-out query
+        qtypes: Record types to query for each domain
+        observer: Optional callback(name, result, seconds) run as each domain
+            finishes; seconds excludes time spent waiting for a free slot
+    """
+
+    def __init__(self, server='8.8.8.8', port=53, concurrency=1000, timeout=2.0, retries=2, qtypes=('A', 'AAAA'),
+                 observer=None):
+        self.server = server
+        self.port = port
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.qtypes = [QTYPES[q] for q in qtypes]
+        self.observer = observer
+        self._protocol = None
+        self._transport = None
+        self._semaphore = None
+
+    async def open(self):
+        """Create the UDP endpoint shared by all queries."""
+        loop = asyncio.get_running_loop()
+        family = socket.AF_INET6 if ':' in self.server else socket.AF_INET
+        self._transport, self._protocol = await loop.create_datagram_endpoint(
+            _DnsProtocol, remote_addr=(self.server, self.port), family=family)
+        # Replies to thousands of in-flight queries arrive in bursts
+        sock = self._transport.get_extra_info('socket')
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        except OSError:
+            pass
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def _new_query_id(self):
+        pending = self._protocol.pending
+        while True:
+            query_id = random.getrandbits(16)
+            if query_id not in pending:
+                return query_id
+
+    async def query(self, name, qtype):
+        """
+        Send one question, retrying on timeout.
+
+        Returns (rcode, answers), or (None, []) if every attempt timed out.
+        """
+        loop = asyncio.get_running_loop()
+        for _ in range(self.retries + 1):
+            query_id = self._new_query_id()
+            packet = build_query(query_id, name, qtype)
+            future = loop.create_future()
+            self._protocol.pending[query_id] = (future, packet[12:].lower())
+            self._transport.sendto(packet)
+            try:
+                _, rcode, answers = await asyncio.wait_for(future, self.timeout)
+                return rcode, answers
+            except asyncio.TimeoutError:
+                self._protocol.pending.pop(query_id, None)
+        return None, []
+
+    async def resolve(self, name):
+        """Resolve all configured record types for a domain into a DnsResult."""
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                replies = await asyncio.gather(*(self.query(name, qtype) for qtype in self.qtypes))
+            except ValueError:
+                replies = None
+            seconds = time.perf_counter() - start
+
+        result = self._merge_replies(replies)
+        if self.observer is not None:
+            self.observer(name, result, seconds)
+        return result
+
+    @staticmethod
+    def _merge_replies(replies):
+        """Combine the per-qtype (rcode, answers) replies into one DnsResult."""
+        if replies is None:
+            return DnsResult([], 0, 'error')
+
+        ips = []
+        ttls = []
+        rcodes = set()
+        for rcode, answers in replies:
+            rcodes.add(rcode)
+            for _, ttl, ip in answers:
+                if ip not in ips:
+                    ips.append(ip)
+                ttls.append(ttl)
+
+        if ips:
+            return DnsResult(ips, min(ttls), 'ok')
+        if RCODE_NXDOMAIN in rcodes:
+            return DnsResult([], 0, 'nxdomain')
+        # An empty answer is only a (cacheable) 'ok' when every query got one;
+        # a timeout or server failure on any qtype leaves the name unresolved
+        if rcodes - {RCODE_NOERROR, None}:
+            return DnsResult([], 0, 'error')
+        if None in rcodes:
+            return DnsResult([], 0, 'timeout')
+        return DnsResult([], 0, 'ok')
+
+    async def resolve_many(self, names, progress=None):
+        """
+        Resolve many domains concurrently.
+
+        Args:
+            names: Iterable of domain names
+            progress: Optional callback(done, total) invoked after each domain
+
+        Returns a dict of domain -> DnsResult.
+        """
+        names = list(names)
+        results = {}
+
+        async def worker(name):
+            results[name] = await self.resolve(name)
+            if progress:
+                progress(len(results), len(names))
+
+        await asyncio.gather(*(worker(name) for name in names))
+        return results
+
+
+def resolve_all(names, progress=None, **kwargs):
+    """Synchronous helper: resolve many domains with a fresh DnsResolver."""
+
+    async def run():
+        async with DnsResolver(**kwargs) as resolver:
+            return await resolver.resolve_many(names, progress=progress)
+
+    return asyncio.run(run())
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Resolve domains from stdin over UDP DNS')
+    parser.add_argument('--server', default='8.8.8.8', help='DNS server address')
+    parser.add_argument('--port', type=int, default=53, help='DNS server port')
+    parser.add_argument('--concurrency', type=int, default=1000, help='Max domains in flight')
+    parser.add_argument('--timeout', type=float, default=2.0, help='Per-query timeout in seconds')
+    parser.add_argument('--retries', type=int, default=2, help='Retries per query')
+
+    args = parser.parse_args()
+
+    domains = [line.strip() for line in sys.stdin if line.strip() and not line.startswith('#')]
+    results = resolve_all(
+        domains,
+        server=args.server,
+        port=args.port,
+        concurrency=args.concurrency,
+        timeout=args.timeout,
+        retries=args.retries,
+    )
+    for domain in domains:
+        result = results[domain]
+        print(f"{domain} {result.status} {result.ttl} {','.join(result.ips)}")
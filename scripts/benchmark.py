@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Pipeline Benchmark Suite
+========================
+Generates deterministic synthetic inputs (CrUX CSVs, RIPE delegated-stats
+files, CIDR and domain lists) and times each pipeline stage, recording
+wall time, throughput and peak traced memory. Runs fully offline: the DNS
+stage uses a mocked resolver.
+
+Stages:
+    parse       Stream CrUX rows (iter_crux_rows)
+    classify    Classify CrUX rows (iter_classified)
+    filter      End-to-end filter_crux_domains with mocked DNS
+    ip_match    CidrIndex.contains_many over random addresses
+    cidr_split  Delegated file -> minimal CIDR list (ripe-to-cidr)
+    karing      Karing JSON emit (generate_karing_config)
+
+Usage:
+    python3 benchmark.py --sizes 10000,100000 -o bench.json
+    python3 benchmark.py --sizes 10000 --baseline bench.json --max-regression 1.25
+"""
+
+import os
+import sys
+import zlib
+import gzip
+import json
+import time
+import random
+import shutil
+import platform
+import tempfile
+import tracemalloc
+import importlib.util
+
+import filter_crux_sa_domains as crux
+from async_dns import DnsResult
+from cidr_index import CidrIndex, int_to_ip, intervals_to_cidrs
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _load_script(name):
+    """Import a hyphenated script (e.g. ripe-to-cidr.py) as a module."""
+    path = os.path.join(SCRIPTS_DIR, name)
+    spec = importlib.util.spec_from_file_location(name[:-3].replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# ============================================
+# Synthetic fixtures
+# ============================================
+
+CRUX_RANK_BUCKETS = [1000, 5000, 10000, 50000, 100000, 500000, 1000000]
+CRUX_TLDS = ['sa', 'com.sa', 'gov.sa', 'edu.sa', 'com', 'com', 'com', 'net', 'org', 'io', 'co.uk', 'com.eg', 'ae']
+SYLLABLES = ['al', 'ra', 'ji', 'di', 'ha', 'ma', 'ka', 'sh', 'op', 'net', 'tech', 'zo', 'qu', 'ee', 'ban', 'mar']
+
+
+def _random_name(rnd):
+    return ''.join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 5)))
+
+
+def make_crux_csv(path, n, seed=1, compress=False):
+    """Write a CrUX-shaped CSV (origin,rank) with n origins ordered by rank bucket."""
+    rnd = random.Random(seed)
+    keywords = sorted(crux.SA_KEYWORDS)
+    excludes = sorted(crux.GLOBAL_EXCLUDES)
+    per_bucket = max(1, n // len(CRUX_RANK_BUCKETS))
+    opener = gzip.open if compress else open
+    with opener(path, 'wt', newline='') as f:
+        f.write('origin,rank\n')
+        for i in range(n):
+            rank = CRUX_RANK_BUCKETS[min(i // per_bucket, len(CRUX_RANK_BUCKETS) - 1)]
+            roll = rnd.random()
+            if roll < 0.05:
+                host = f"{rnd.choice(['www.', 'm.', ''])}{rnd.choice(excludes)}"
+            elif roll < 0.15:
+                host = f"{_random_name(rnd)}{rnd.choice(keywords)}.{rnd.choice(CRUX_TLDS[4:])}"
+            else:
+                sub = rnd.choice(['www.', '', '', 'shop.', 'api.'])
+                host = f"{sub}{_random_name(rnd)}{i}.{rnd.choice(CRUX_TLDS)}"
+            f.write(f"https://{host},{rank}\n")
+
+
+def make_delegated(path, n, seed=2, country='SA'):
+    """Write a RIPE delegated-extended file with n mostly-contiguous records."""
+    rnd = random.Random(seed)
+    cursor4 = 5 << 24
+    with open(path, 'w') as f:
+        f.write('2|ripencc|20240101|%d|19830705|20240101|+0100\n' % n)
+        f.write('ripencc|*|ipv4|*|%d|summary\n' % n)
+        for i in range(n):
+            cc = country if rnd.random() < 0.7 else rnd.choice(['AE', 'DE', 'GB'])
+            if rnd.random() < 0.85:
+                count = rnd.choice([256, 512, 768, 1024, 1280, 2048, 3072, 4096, 8192, 65536])
+                f.write(f"ripencc|{cc}|ipv4|{int_to_ip(cursor4, 4)}|{count}|20100101|allocated|id{i}\n")
+                cursor4 += count if rnd.random() < 0.8 else count + 256 * rnd.randint(1, 64)
+            else:
+                prefix = rnd.choice([29, 32, 48])
+                start = (0x2a00 << 112) | (rnd.getrandbits(32) << (128 - 48 - rnd.randint(0, 16)))
+                start &= ~((1 << (128 - prefix)) - 1)
+                f.write(f"ripencc|{cc}|ipv6|{int_to_ip(start, 6)}|{prefix}|20100101|allocated|id{i}\n")
+
+
+def make_cidr_list(n, seed=3):
+    """Return n random IPv4/IPv6 CIDR strings (about 85% IPv4)."""
+    rnd = random.Random(seed)
+    cidrs = []
+    for _ in range(n):
+        if rnd.random() < 0.85:
+            prefix = rnd.randint(12, 28)
+            start = rnd.getrandbits(32) & ~((1 << (32 - prefix)) - 1)
+            cidrs.append(f"{int_to_ip(start, 4)}/{prefix}")
+        else:
+            prefix = rnd.randint(29, 64)
+            start = ((0x2a00 << 112) | rnd.getrandbits(112)) & ~((1 << (128 - prefix)) - 1)
+            cidrs.append(f"{int_to_ip(start, 6)}/{prefix}")
+    return cidrs
+
+
+def make_ip_sample(n, seed=4):
+    rnd = random.Random(seed)
+    return [int_to_ip(rnd.getrandbits(32), 4) if rnd.random() < 0.85
+            else int_to_ip((0x2a00 << 112) | rnd.getrandbits(112), 6) for _ in range(n)]
+
+
+def make_domain_list(n, seed=5):
+    rnd = random.Random(seed)
+    return [f"{_random_name(rnd)}{i}.{rnd.choice(CRUX_TLDS)}" for i in range(n)]
+
+
+def mock_resolve_domains_async(domains, **kwargs):
+    """Offline stand-in for the async resolver: deterministic fake answers."""
+    results = {}
+    for domain in domains:
+        h = zlib.crc32(domain.encode())
+        results[domain] = DnsResult([int_to_ip(h, 4)], 300, 'ok') if h % 7 else DnsResult([], 0, 'nxdomain')
+    return results
+
+
+# ============================================
+# Measurement
+# ============================================
+
+def measure(func, repeat=1):
+    """
+    Time func (best of repeat runs), then run it once more under tracemalloc.
+
+    Timing runs are not traced, since tracing slows allocation-heavy code
+    several-fold. Returns (best seconds, peak traced KiB, result).
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    try:
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak // 1024, result
+
+
+def run_benchmarks(sizes, workdir, repeat=1, stages=None):
+    """Run every selected stage for every CrUX size and return a results dict."""
+    ripe = _load_script('ripe-to-cidr.py')
+    karing = _load_script('generate-karing-config.py')
+    results = {}
+
+    def record(name, items, func):
+        if stages and name.split('@')[0] not in stages:
+            return
+        seconds, peak_kib, _ = measure(func, repeat)
+        results[name] = {
+            'seconds': round(seconds, 6),
+            'peak_kib': peak_kib,
+            'items': items,
+            'items_per_sec': round(items / seconds, 1) if seconds else None,
+        }
+        print(f"  {name:<24} {seconds:9.4f}s  {peak_kib:>8} KiB  {items / seconds if seconds else 0:>12,.0f}/s",
+              file=sys.stderr)
+
+    cidr_file = os.path.join(workdir, 'sa-all.txt')
+    with open(cidr_file, 'w') as f:
+        f.write('\n'.join(make_cidr_list(2000)) + '\n')
+
+    for size in sizes:
+        csv_path = os.path.join(workdir, f'crux-{size}.csv.gz')
+        make_crux_csv(csv_path, size, compress=True)
+
+        record(f'parse@{size}', size, lambda: sum(1 for _ in crux.iter_crux_rows(csv_path)))
+        record(f'classify@{size}', size,
+               lambda: sum(1 for _ in crux.iter_classified(crux.iter_crux_rows(csv_path))))
+
+        def run_filter():
+            original = crux.resolve_domains_async
+            crux.resolve_domains_async = mock_resolve_domains_async
+            try:
+                stderr, sys.stderr = sys.stderr, open(os.devnull, 'w')
+                try:
+                    return crux.filter_crux_domains(
+                        csv_path, sa_ip_file=cidr_file, output_file=os.path.join(workdir, 'out.txt'),
+                        resolve_dns=True, resolver='async')
+                finally:
+                    sys.stderr.close()
+                    sys.stderr = stderr
+            finally:
+                crux.resolve_domains_async = original
+        record(f'filter@{size}', size, run_filter)
+
+    index = CidrIndex.from_file(cidr_file)
+    ips = make_ip_sample(200000)
+    record('ip_match', len(ips), lambda: index.contains_many(ips))
+
+    delegated = os.path.join(workdir, 'delegated.txt')
+    make_delegated(delegated, 20000)
+
+    def run_split():
+        cidrs = []
+        for ip_version, version in (('ipv4', 4), ('ipv6', 6)):
+            cidrs += intervals_to_cidrs(ripe.read_delegated_intervals(delegated, 'SA', ip_version), version)
+        return cidrs
+    record('cidr_split', 20000, run_split)
+
+    domains_file = os.path.join(workdir, 'sa.txt')
+    with open(domains_file, 'w') as f:
+        f.write('\n'.join(make_domain_list(20000)) + '\n')
+    v4_file = os.path.join(workdir, 'v4.txt')
+    v6_file = os.path.join(workdir, 'v6.txt')
+    with open(v4_file, 'w') as f4, open(v6_file, 'w') as f6:
+        for cidr in make_cidr_list(2000):
+            (f6 if ':' in cidr else f4).write(cidr + '\n')
+
+    def run_karing():
+        stderr, sys.stderr = sys.stderr, open(os.devnull, 'w')
+        try:
+            karing.generate_karing_config(domains_file, v4_file, v6_file, os.path.join(workdir, 'karing.json'))
+        finally:
+            sys.stderr.close()
+            sys.stderr = stderr
+    record('karing', 20000, run_karing)
+
+    return results
+
+
+def compare(results, baseline, max_regression):
+    """Print per-stage ratios against a baseline; return the regressed stage names."""
+    regressed = []
+    for name, current in sorted(results.items()):
+        base = baseline.get('results', {}).get(name)
+        if not base or not base['seconds']:
+            continue
+        ratio = current['seconds'] / base['seconds']
+        flag = ''
+        if ratio > max_regression:
+            regressed.append(name)
+            flag = '  <-- REGRESSION'
+        print(f"  {name:<24} {base['seconds']:9.4f}s -> {current['seconds']:9.4f}s  x{ratio:.2f}{flag}",
+              file=sys.stderr)
+    return regressed
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the SA routing rules pipeline on synthetic data')
+    parser.add_argument('--sizes', default='10000,100000', help='Comma-separated CrUX origin counts')
+    parser.add_argument('--stages', help='Comma-separated subset of stages to run')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per stage (best time is kept)')
+    parser.add_argument('-o', '--output', help='Write JSON results to this file')
+    parser.add_argument('--baseline', help='Baseline JSON results to compare against')
+    parser.add_argument('--max-regression', type=float, default=1.25,
+                        help='Fail if a stage is slower than baseline by this factor')
+
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    stages = set(args.stages.split(',')) if args.stages else None
+    workdir = tempfile.mkdtemp(prefix='sa-bench-')
+    try:
+        print(f"Benchmarking sizes {sizes} in {workdir}", file=sys.stderr)
+        results = run_benchmarks(sizes, workdir, repeat=args.repeat, stages=stages)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sizes': sizes,
+            'repeat': args.repeat,
+            'timestamp': int(time.time()),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Written to {args.output}", file=sys.stderr)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"Comparing against {args.baseline}:", file=sys.stderr)
+        if compare(results, baseline, args.max_regression):
+            sys.exit(1)
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Release Build Orchestrator
+==========================
+Declares every stage of the release build with its input and output files
+and runs the stages as a dependency graph: a stage starts as soon as the
+stages producing its inputs have finished, so the IP branch (RIPE ->
+CIDR -> merge) and the domain branch (CrUX filter -> combine -> dedup)
+overlap, and the per-format writers run side by side.
+
+- Stages whose inputs are unchanged are skipped and their outputs restored
+  through the incremental build manifest (build_manifest.py)
+- The first failing stage stops the build: running stages are terminated,
+  nothing new is started, and the failing stage's log tail is printed
+- A timing report shows each stage, the critical path and the speedup
+  over running the same stages one after another
+
+Stages backed by the Go toolchain (geoip.dat/Country.mmdb via
+Loyalsoldier/geoip, geosite.dat via domain-list-community) stay in the
+workflow; rerun the checksums stage after them.
+
+Usage:
+    python3 scripts/build.py                       # full release build
+    python3 scripts/build.py --dns --jobs 8        # DNS-verify CrUX domains
+    python3 scripts/build.py srs-geosite           # one target and what it needs
+    python3 scripts/build.py checksums --no-deps   # rehash release/ only
+    python3 scripts/build.py --list
+"""
+
+import os
+import sys
+import glob
+import time
+import shutil
+import threading
+import subprocess
+import concurrent.futures
+
+import domain_tiers
+import export_rules
+import geolite2_csv
+from build_manifest import DEFAULT_CACHE_DIR, BuildManifest, file_digest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES_DIR = os.path.join(DEFAULT_CACHE_DIR, 'sources')
+WORK_DIR = os.path.join(DEFAULT_CACHE_DIR, 'work')
+LOG_DIR = os.path.join(DEFAULT_CACHE_DIR, 'logs')
+RELEASE_DIR = 'release'
+# Rank-tiered geosite variants: name -> highest CrUX rank bucket included
+DOMAIN_TIERS = {'sa-top1k': 1000, 'sa-top10k': 10000}
+# MaxMind GeoLite2 Country CSVs, when the workflow could download them
+GEOLITE2_DIR = 'geolite2'
+CHECKSUM_PATTERNS = ('*.dat', '*.srs', '*.mmdb', '*.json', '*.yaml', '*.idx')
+PYTHON = sys.executable or 'python3'
+
+# Stage status values
+STATUS_DONE = 'done'
+STATUS_CACHED = 'cached'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+
+
+class StageError(Exception):
+    """A stage action failed; the message says how."""
+
+
+class Stage:
+    """
+    One build step.
+
+    action(log) does the work, writing progress to the open log file and
+    raising StageError on failure. Cached stages are skipped when the build
+    manifest shows their inputs and params unchanged.
+    """
+
+    def __init__(self, name, action, inputs=(), outputs=(), after=(), cached=True, params=None):
+        self.name = name
+        self.action = action
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.after = list(after)
+        self.cached = cached
+        self.params = params or {}
+
+
+class _Processes:
+    """Running subprocesses, so a failure elsewhere can terminate them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = set()
+        self.cancelled = False
+
+    def run(self, argv, log, stdout=None):
+        with self._lock:
+            if self.cancelled:
+                raise StageError('cancelled')
+            proc = subprocess.Popen(argv, stdout=stdout or log, stderr=log, cwd=ROOT)
+            self._running.add(proc)
+        try:
+            returncode = proc.wait()
+        finally:
+            with self._lock:
+                self._running.discard(proc)
+        if self.cancelled:
+            raise StageError('cancelled')
+        if returncode != 0:
+            raise StageError(f"{' '.join(argv[:3])} ... exited with status {returncode}")
+
+    def terminate_all(self):
+        with self._lock:
+            self.cancelled = True
+            for proc in self._running:
+                proc.terminate()
+
+
+PROCESSES = _Processes()
+
+
+def command(*argv, stdout=None):
+    """Stage action running a command; stdout=path captures its output atomically."""
+    def run_command(log):
+        if stdout is None:
+            PROCESSES.run(list(argv), log)
+            return
+        tmp = stdout + '.tmp'
+        try:
+            with open(tmp, 'wb') as out:
+                PROCESSES.run(list(argv), log, stdout=out)
+            os.replace(tmp, stdout)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return run_command
+
+
+def script(name, *args, stdout=None):
+    return command(PYTHON, os.path.join('scripts', name), *args, stdout=stdout)
+
+
+def _list_lines(path):
+    """Lowercased first fields of a list file's non-comment lines ([] if missing); drops "domain rank" ranks."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            lines = [line.split(None, 1)[0].lower() for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+    return [line for line in lines if not line.startswith('#')]
+
+
+def _write_lines(path, lines):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(''.join(line + '\n' for line in lines))
+    os.replace(tmp, path)
+
+
+def crux_filter_action(crux_file, output, dns, dns_server, ip_file):
+    """Run the CrUX filter, or write an empty list when no CrUX data could be fetched."""
+    def run_crux_filter(log):
+        if not os.path.exists(crux_file) or os.path.getsize(crux_file) == 0:
+            log.write(f"{crux_file} not available, skipping the live CrUX list\n".encode())
+            _write_lines(output, [])
+            return
+        argv = [PYTHON, 'scripts/filter_crux_sa_domains.py', crux_file,
+                '--state', os.path.join(DEFAULT_CACHE_DIR, 'crux-state.json.gz'), '-o', output,
+                '--metrics', os.path.join(LOG_DIR, 'crux-filter-metrics.json'), '--with-ranks']
+        if dns:
+            argv += ['-i', ip_file, '--resolve-dns', '--resolver', 'async', '--dns-server', dns_server,
+                     '--dns-cache', os.path.join(DEFAULT_CACHE_DIR, 'crux-dns-cache.sqlite')]
+        PROCESSES.run(argv, log)
+    return run_crux_filter
+
+
+def combine_domains_action(sources, combined, categories):
+    """Merge the domain sources into one list plus the per-category lists (as generate-sa-domains.sh)."""
+    def combine_domains(log):
+        domains = {'sa', 'xn--mgbaam7a8h'}
+        for path in sources:
+            lines = _list_lines(path)
+            log.write(f"{path}: {len(lines)} domains\n".encode())
+            domains.update(lines)
+        _write_lines(combined, sorted(domains))
+        for source, output in categories:
+            _write_lines(output, sorted(set(_list_lines(source))))
+    return combine_domains
+
+
+def release_files_action(copies):
+    def copy_release_files(log):
+        os.makedirs(RELEASE_DIR, exist_ok=True)
+        for source, dest in copies:
+            if os.path.exists(source):
+                shutil.copyfile(source, dest)
+                log.write(f"{source} -> {dest}\n".encode())
+    return copy_release_files
+
+
+def checksums_action(release_dir):
+    """Write <file>.sha256sum next to every release artifact, in sha256sum format."""
+    def write_checksums(log):
+        paths = sorted({p for pattern in CHECKSUM_PATTERNS for p in glob.glob(os.path.join(release_dir, pattern))})
+        for path in paths:
+            with open(path + '.sha256sum', 'w') as f:
+                f.write(f"{file_digest(path)}  {os.path.basename(path)}\n")
+        log.write(f"{len(paths)} checksums written\n".encode())
+    return write_checksums
+
+
+def release_stages(dns=False, dns_server='8.8.8.8', keep_categories=False):
+    """The release build as a list of stages; dependencies follow from inputs and outputs."""
+    ripe = os.path.join(SOURCES_DIR, 'ripencc-delegated.txt')
+    crux = os.path.join(SOURCES_DIR, 'crux-sa-latest.csv.gz')
+    banks = os.path.join(SOURCES_DIR, 'sa-banks.txt')
+    ripe_deps = ['scripts/ripe-to-cidr.py', 'scripts/cidr_index.py']
+    merge_inputs = ['sa-ips/sa-ipv4-ripe.txt', 'sa-ips/sa-ipv6-ripe.txt']
+    geolite2 = [os.path.join(GEOLITE2_DIR, name)
+                for name in (geolite2_csv.LOCATIONS_FILE, *geolite2_csv.BLOCKS_FILES.values())]
+    geolite2_stages = []
+    if os.path.exists(geolite2[0]):
+        # SA ranges from the GeoLite2 Country CSVs, merged with the RIPE ranges
+        geolite2_stages.append(
+            Stage('geolite2', script('geolite2_csv.py', '--dir', GEOLITE2_DIR, '-o', 'sa-ips/sa-geolite2.txt'),
+                  inputs=[p for p in geolite2 if os.path.exists(p)] + ['scripts/geolite2_csv.py', 'scripts/cidr_set.py'],
+                  outputs=['sa-ips/sa-geolite2.txt']))
+        merge_inputs.append('sa-ips/sa-geolite2.txt')
+    merge_args = ['--exclude-private']
+    if os.path.exists('data/sa-extra-ips.txt'):
+        merge_inputs.append('data/sa-extra-ips.txt')
+    merge_excludes = [p for p in ['data/sa-exclude-ips.txt'] if os.path.exists(p)]
+    for path in merge_excludes:
+        merge_args += ['--exclude', path]
+    filter_deps = ['scripts/filter_crux_sa_domains.py', 'scripts/keyword_matcher.py', 'scripts/psl.py',
+                   'scripts/table_cache.py', 'scripts/run_metrics.py', 'data/public_suffix_list.dat', 'data/global-excludes.txt',
+                   'data/sa-keywords.txt', 'data/known-saudi-domains.txt']
+    crux_live = os.path.join(WORK_DIR, 'sa-crux-live.txt')
+    combined = os.path.join(WORK_DIR, 'sa-combined.txt')
+    categories = [
+        ('data/sa-gov-domains.txt', 'domains/sa-gov.txt'),
+        (banks, 'domains/sa-bank.txt'),
+        ('data/sa-services-domains.txt', 'domains/sa-services.txt'),
+    ]
+    domain_sources = [banks, 'data/sa-domains.txt', 'data/sa-gov-domains.txt', 'data/sa-services-domains.txt',
+                      'data/sa-crux-domains.txt', crux_live]
+    keep_args = []
+    if keep_categories:
+        for _, output in categories:
+            keep_args += ['--keep', output]
+    # Curated, gov, services and bank lists go into every tier regardless of rank
+    tier_always = ['data/sa-domains.txt', 'data/sa-gov-domains.txt', 'data/sa-services-domains.txt', banks]
+    tier_names = [*DOMAIN_TIERS, domain_tiers.FULL_TIER]
+    tier_outputs = ([f'domains/{name}.txt' for name in tier_names]
+                    + [f'rule-set/geosite-{name}.srs' for name in tier_names])
+    release_copies = [
+        ('rule-set/geosite-sa.srs', os.path.join(RELEASE_DIR, 'geosite-sa.srs')),
+        ('rule-set/geoip-sa.srs', os.path.join(RELEASE_DIR, 'geoip-sa.srs')),
+        ('domains/sa.txt', os.path.join(RELEASE_DIR, 'sa.txt')),
+        *[(f'rule-set/geosite-{name}.srs', os.path.join(RELEASE_DIR, f'geosite-{name}.srs')) for name in tier_names],
+        ('karing/SA_Diversion_Rules_Karing_App.json', os.path.join(RELEASE_DIR, 'SA_Karing_Template.json')),
+    ]
+
+    stages = [
+        # Conditional requests: unchanged sources are not downloaded again
+        Stage('fetch', script('fetch_sources.py', '--dir', SOURCES_DIR), outputs=[ripe, crux, banks],
+              cached=False),
+
+        Stage('ripe-ipv4', script('ripe-to-cidr.py', ripe, 'SA', 'ipv4', stdout='sa-ips/sa-ipv4-ripe.txt'),
+              inputs=[ripe] + ripe_deps, outputs=['sa-ips/sa-ipv4-ripe.txt']),
+        Stage('ripe-ipv6', script('ripe-to-cidr.py', ripe, 'SA', 'ipv6', stdout='sa-ips/sa-ipv6-ripe.txt'),
+              inputs=[ripe] + ripe_deps, outputs=['sa-ips/sa-ipv6-ripe.txt']),
+        *geolite2_stages,
+        Stage('merge-ips', script('cidr_set.py', *merge_inputs, *merge_args, '-o', 'sa-ips/sa-all.txt'),
+              inputs=merge_inputs + merge_excludes + ['scripts/cidr_set.py', 'scripts/cidr_index.py'],
+              outputs=['sa-ips/sa-all.txt']),
+
+        # Only waits for the merged IP list when DNS verification needs it
+        Stage('crux-filter', crux_filter_action(crux, crux_live, dns, dns_server, 'sa-ips/sa-all.txt'),
+              inputs=[crux] + filter_deps + (['sa-ips/sa-all.txt'] if dns else []),
+              outputs=[crux_live], params={'dns': dns, 'dns_server': dns_server if dns else None, 'ranks': True}),
+        Stage('combine-domains', combine_domains_action(domain_sources, combined, categories),
+              inputs=domain_sources + ['scripts/build.py'],
+              outputs=[combined] + [output for _, output in categories]),
+        Stage('dedup-domains', script('dedup_domains.py', combined, *keep_args,
+                                      '--report', 'domains/sa-dedup-report.txt', '-o', 'domains/sa.txt'),
+              inputs=[combined, 'scripts/dedup_domains.py'] + ([o for _, o in categories] if keep_categories else []),
+              outputs=['domains/sa.txt', 'domains/sa-dedup-report.txt'], params={'keep': keep_categories}),
+
+        Stage('srs-geosite', script('srs.py', 'compile', '--domain-suffix', 'domains/sa.txt',
+                                    '-o', 'rule-set/geosite-sa.srs', '--verify'),
+              inputs=['domains/sa.txt', 'scripts/srs.py'], outputs=['rule-set/geosite-sa.srs']),
+        # Smaller rank-cut variants of the geosite list for low-memory clients
+        Stage('domain-tiers', script('domain_tiers.py', '--ranked', crux_live, '--full', 'domains/sa.txt',
+                                     *[arg for path in tier_always for arg in ('--always', path)],
+                                     *[arg for name, rank in DOMAIN_TIERS.items() for arg in ('--tier', f'{name}={rank}')]),
+              inputs=[crux_live, 'domains/sa.txt', *tier_always, 'scripts/domain_tiers.py',
+                      'scripts/dedup_domains.py', 'scripts/srs.py'],
+              outputs=tier_outputs, params={'tiers': DOMAIN_TIERS}),
+        Stage('srs-geoip', script('srs.py', 'compile', '--ip-cidr', 'sa-ips/sa-all.txt',
+                                  '-o', 'rule-set/geoip-sa.srs', '--verify'),
+              inputs=['sa-ips/sa-all.txt', 'scripts/srs.py'], outputs=['rule-set/geoip-sa.srs']),
+        Stage('geoip-lite-dat', script('geoip_dat.py', 'build', '--entry', 'SA=sa-ips/sa-all.txt', '--private',
+                                       '-o', os.path.join(RELEASE_DIR, 'geoip-lite.dat'), '--verify'),
+              inputs=['sa-ips/sa-all.txt', 'scripts/geoip_dat.py', 'scripts/mmdb.py', 'scripts/cidr_set.py'],
+              outputs=[os.path.join(RELEASE_DIR, 'geoip-lite.dat')]),
+        Stage('mmdb-lite', script('mmdb.py', 'build', '--entry', 'SA=sa-ips/sa-all.txt', '--private',
+                                  '-o', os.path.join(RELEASE_DIR, 'Country-lite.mmdb'), '--verify'),
+              inputs=['sa-ips/sa-all.txt', 'scripts/mmdb.py', 'scripts/cidr_set.py'],
+              outputs=[os.path.join(RELEASE_DIR, 'Country-lite.mmdb')]),
+        # Every client format (sing-box JSON, Clash, Xray, Karing) from one load of the lists
+        Stage('export', script('export_rules.py', '--domains', 'domains/sa.txt', '--ips', 'sa-ips/sa-all.txt',
+                               '--crux', crux),
+              inputs=['domains/sa.txt', 'sa-ips/sa-all.txt', crux, 'scripts/export_rules.py',
+                      'scripts/generate-karing-config.py', 'scripts/cidr_index.py', 'scripts/psl.py',
+                      'data/public_suffix_list.dat'],
+              outputs=[path for path, _ in export_rules.TARGETS.values()]),
+        Stage('sa-matcher', script('sa_matcher.py', 'compile', '--domains', 'domains/sa.txt',
+                                   '--ips', 'sa-ips/sa-all.txt', '-o', os.path.join(RELEASE_DIR, 'sa-matcher.idx')),
+              inputs=['domains/sa.txt', 'sa-ips/sa-all.txt', 'scripts/sa_matcher.py'],
+              outputs=[os.path.join(RELEASE_DIR, 'sa-matcher.idx')]),
+        Stage('release-files', release_files_action(release_copies),
+              inputs=[source for source, _ in release_copies], outputs=[dest for _, dest in release_copies],
+              cached=False),
+    ]
+    # Hashes whatever is in release/ once every stage writing there is done
+    writers = [s.name for s in stages if any(p.startswith(RELEASE_DIR + os.sep) for p in s.outputs)]
+    stages.append(Stage('checksums', checksums_action(RELEASE_DIR), after=writers, cached=False))
+    return stages
+
+
+def dependencies(stages):
+    """Map stage name -> names of the stages it waits for."""
+    producers = {}
+    for stage in stages:
+        for path in stage.outputs:
+            producers[path] = stage.name
+    return {stage.name: sorted({producers[p] for p in stage.inputs if p in producers and producers[p] != stage.name}
+                               | set(stage.after))
+            for stage in stages}
+
+
+def select_stages(stages, targets, with_deps=True):
+    """The target stages, plus everything they depend on unless with_deps is False."""
+    by_name = {stage.name: stage for stage in stages}
+    unknown = [t for t in targets if t not in by_name]
+    if unknown:
+        raise KeyError(', '.join(unknown))
+    if not targets:
+        return stages
+    deps = dependencies(stages)
+    wanted = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            if with_deps:
+                todo.extend(deps[name])
+    return [stage for stage in stages if stage.name in wanted]
+
+
+def _run_action(stage):
+    os.makedirs(LOG_DIR, exist_ok=True)
+    start = time.perf_counter()
+    with open(os.path.join(LOG_DIR, f'{stage.name}.log'), 'wb') as log:
+        for path in stage.outputs:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        stage.action(log)
+    return time.perf_counter() - start
+
+
+def _log_tail(name, lines=20):
+    try:
+        with open(os.path.join(LOG_DIR, f'{name}.log'), errors='replace') as f:
+            return f.readlines()[-lines:]
+    except FileNotFoundError:
+        return []
+
+
+def run_build(stages, jobs=4, manifest=None, force=False):
+    """
+    Run the stages on a pool of jobs workers, respecting dependencies.
+
+    Dependencies outside the selected stages are assumed to be built.
+    Returns {name: (status, seconds, finished at)} with times relative to
+    the start of the build.
+    """
+    selected = {stage.name for stage in stages}
+    deps = {name: [d for d in names if d in selected] for name, names in dependencies(stages).items()}
+    by_name = {stage.name: stage for stage in stages}
+    results = {}
+    running = {}
+    failed = None
+    build_start = time.perf_counter()
+
+    def finish(name, status, seconds):
+        results[name] = (status, seconds, time.perf_counter() - build_start)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        while True:
+            if failed is None:
+                for stage in stages:
+                    name = stage.name
+                    if name in results or name in running or any(results.get(d, (None,))[0] not in
+                                                                 (STATUS_DONE, STATUS_CACHED) for d in deps[name]):
+                        continue
+                    if (stage.cached and manifest is not None and not force
+                            and manifest.is_fresh(name, stage.inputs, stage.outputs, stage.params)):
+                        print(f"  -> [{name}] inputs unchanged, reusing cached outputs", file=sys.stderr)
+                        finish(name, STATUS_CACHED, 0.0)
+                        continue
+                    print(f"  -> [{name}] running", file=sys.stderr)
+                    running[name] = executor.submit(_run_action, stage)
+                # Cached stages may have unblocked others; rescan before waiting
+                if any(name not in results and name not in running and
+                       all(results.get(d, (None,))[0] in (STATUS_DONE, STATUS_CACHED) for d in deps[name])
+                       for name in selected):
+                    continue
+            if not running:
+                break
+            done, _ = concurrent.futures.wait(running.values(), return_when=concurrent.futures.FIRST_COMPLETED)
+            for name, future in list(running.items()):
+                if future not in done:
+                    continue
+                del running[name]
+                stage = by_name[name]
+                try:
+                    seconds = future.result()
+                except Exception as e:
+                    if failed is not None and str(e) == 'cancelled':
+                        finish(name, STATUS_CANCELLED, 0.0)
+                        continue
+                    finish(name, STATUS_FAILED, 0.0)
+                    if failed is None:
+                        failed = name
+                        print(f"  !! [{name}] failed: {e}", file=sys.stderr)
+                        for line in _log_tail(name):
+                            print(f"     {name}| {line.rstrip()}", file=sys.stderr)
+                        PROCESSES.terminate_all()
+                    continue
+                finish(name, STATUS_DONE, seconds)
+                print(f"  -> [{name}] done in {seconds:.2f}s", file=sys.stderr)
+                if stage.cached and manifest is not None:
+                    manifest.record(name, stage.inputs, stage.outputs, stage.params)
+                    manifest.save()
+
+    for name in selected:
+        results.setdefault(name, (STATUS_CANCELLED, 0.0, 0.0))
+    if manifest is not None and failed is None:
+        manifest.prune_artifacts()
+        manifest.save()
+    return results
+
+
+def critical_path(stages, results):
+    """Longest chain of dependent stages by measured time: (seconds, [names])."""
+    selected = {stage.name for stage in stages}
+    deps = {name: [d for d in names if d in selected] for name, names in dependencies(stages).items()}
+    best = {}
+    for stage in stages:  # declaration order is a topological order
+        name = stage.name
+        before = max(deps[name], key=lambda d: best[d][0], default=None)
+        length = results[name][1] + (best[before][0] if before else 0.0)
+        best[name] = (length, (best[before][1] if before else []) + [name])
+    return max(best.values(), key=lambda item: item[0], default=(0.0, []))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the release build as a parallel stage graph')
+    parser.add_argument('targets', nargs='*', help='Stages to build (default: all)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 4, help='Stages run at once')
+    parser.add_argument('--dns', action='store_true', help='DNS-verify remaining CrUX domains (needs network)')
+    parser.add_argument('--dns-server', default='8.8.8.8', help='DNS server for verification (host or host:port)')
+    parser.add_argument('--keep-categories', action='store_true',
+                        help='Keep gov/bank/services entries in domains/sa.txt even when a suffix covers them')
+    parser.add_argument('--no-deps', action='store_true', help='Run only the named stages, assuming inputs exist')
+    parser.add_argument('--force', action='store_true', help='Rerun cached stages even if inputs are unchanged')
+    parser.add_argument('--list', action='store_true', help='Print the stages and their dependencies')
+
+    args = parser.parse_args()
+    os.chdir(ROOT)
+
+    all_stages = release_stages(dns=args.dns, dns_server=args.dns_server, keep_categories=args.keep_categories)
+    try:
+        stages = select_stages(all_stages, args.targets, with_deps=not args.no_deps)
+    except KeyError as e:
+        parser.error(f"unknown stage(s): {e.args[0]} (see --list)")
+
+    if args.list:
+        deps = dependencies(all_stages)
+        for stage in stages:
+            print(f"{stage.name:<16} <- {', '.join(deps[stage.name]) or '-'}")
+        sys.exit(0)
+
+    start = time.perf_counter()
+    results = run_build(stages, jobs=max(1, args.jobs), manifest=BuildManifest(), force=args.force)
+    wall = time.perf_counter() - start
+
+    print(f"\nStage timings (wall {wall:.2f}s):", file=sys.stderr)
+    for stage in stages:
+        status, seconds, finished = results[stage.name]
+        print(f"  {stage.name:<16} {status:<9} {seconds:>8.2f}s  (finished at {finished:.2f}s)", file=sys.stderr)
+    serial = sum(results[stage.name][1] for stage in stages)
+    length, path = critical_path(stages, results)
+    print(f"  Critical path {length:.2f}s: {' -> '.join(path)}", file=sys.stderr)
+    if wall > 0:
+        print(f"  Serial stage time {serial:.2f}s, {serial / wall:.1f}x parallel speedup", file=sys.stderr)
+
+    failed = [name for name, (status, _, _) in results.items() if status == STATUS_FAILED]
+    if failed:
+        print(f"Build failed in stage {failed[0]} (log: {os.path.join(LOG_DIR, failed[0] + '.log')})",
+              file=sys.stderr)
+        sys.exit(1)
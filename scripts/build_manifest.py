@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Incremental Build Manifest
+==========================
+Records a content hash for every input and output of each build stage, so
+a stage whose inputs are byte-identical to the last run can be skipped and
+its outputs restored from a local artifact store instead of recomputed.
+
+Layout (under the cache directory, default .cache/):
+    build-manifest.json     stage -> {inputs: {path: sha256}, outputs: {path: sha256}, params}
+    artifacts/<sha256>      content-addressed copies of stage outputs
+
+Usage:
+    # Run the command only if an input changed or an output is missing/unknown
+    python3 build_manifest.py run ripe-ipv4 \\
+        --inputs ripencc-delegated.txt scripts/ripe-to-cidr.py \\
+        --outputs sa-ips/sa-ipv4-ripe.txt \\
+        -- sh -c 'python3 scripts/ripe-to-cidr.py ripencc-delegated.txt SA ipv4 > sa-ips/sa-ipv4-ripe.txt'
+
+    python3 build_manifest.py status
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import subprocess
+
+DEFAULT_CACHE_DIR = os.environ.get('BUILD_CACHE_DIR', '.cache')
+
+
+def file_digest(path):
+    """SHA-256 of a file's contents, or None if it does not exist."""
+    h = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    except FileNotFoundError:
+        return None
+    return h.hexdigest()
+
+
+class BuildManifest:
+    """Per-stage input/output hashes plus a content-addressed artifact store."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, 'build-manifest.json')
+        self.artifact_dir = os.path.join(cache_dir, 'artifacts')
+        try:
+            with open(self.path) as f:
+                self.stages = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.stages = {}
+
+    def save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.stages, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def _artifact(self, digest):
+        return os.path.join(self.artifact_dir, digest)
+
+    def is_fresh(self, stage, inputs, outputs, params=None):
+        """
+        Check whether a stage can be skipped.
+
+        Fresh means the recorded input hashes and params match the current
+        ones, and every output either already matches its recorded hash or
+        can be restored from the artifact store. Missing outputs are restored
+        as a side effect.
+        """
+        entry = self.stages.get(stage)
+        if entry is None or entry.get('params') != (params or {}):
+            return False
+        if sorted(entry['inputs']) != sorted(inputs) or sorted(entry['outputs']) != sorted(outputs):
+            return False
+        for path in inputs:
+            if file_digest(path) != entry['inputs'][path]:
+                return False
+        for path in outputs:
+            digest = entry['outputs'][path]
+            if file_digest(path) == digest:
+                continue
+            if digest is None or not os.path.exists(self._artifact(digest)):
+                return False
+        # Every output is either current or stored; restore the stale/missing ones
+        for path in outputs:
+            digest = entry['outputs'][path]
+            if file_digest(path) != digest:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                shutil.copyfile(self._artifact(digest), path)
+        return True
+
+    def record(self, stage, inputs, outputs, params=None):
+        """Hash a stage's inputs and outputs and store the outputs as artifacts."""
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        output_digests = {}
+        for path in outputs:
+            digest = file_digest(path)
+            output_digests[path] = digest
+            if digest is not None and not os.path.exists(self._artifact(digest)):
+                shutil.copyfile(path, self._artifact(digest))
+        self.stages[stage] = {
+            'inputs': {path: file_digest(path) for path in inputs},
+            'outputs': output_digests,
+            'params': params or {},
+        }
+
+    def prune_artifacts(self):
+        """Delete stored artifacts no longer referenced by any stage."""
+        live = {d for entry in self.stages.values() for d in entry['outputs'].values() if d}
+        removed = 0
+        if os.path.isdir(self.artifact_dir):
+            for name in os.listdir(self.artifact_dir):
+                if name not in live:
+                    os.remove(self._artifact(name))
+                    removed += 1
+        return removed
+
+
+def run_stage(manifest, stage, inputs, outputs, command, params=None, force=False):
+    """Run command unless the stage is fresh; record the result. Returns the exit code."""
+    if not force and manifest.is_fresh(stage, inputs, outputs, params):
+        print(f"  -> [{stage}] inputs unchanged, reusing cached outputs", file=sys.stderr)
+        return 0
+    print(f"  -> [{stage}] running", file=sys.stderr)
+    returncode = subprocess.call(command)
+    if returncode == 0:
+        manifest.record(stage, inputs, outputs, params)
+        manifest.prune_artifacts()
+        manifest.save()
+    return returncode
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Skip build stages whose inputs have not changed')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='Manifest and artifact directory')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='Run a stage command unless its inputs are unchanged')
+    run.add_argument('stage', help='Stage name')
+    run.add_argument('--inputs', nargs='*', default=[], help='Input files')
+    run.add_argument('--outputs', nargs='*', default=[], help='Output files')
+    run.add_argument('--param', action='append', default=[], help='Extra KEY=VALUE that invalidates the stage')
+    run.add_argument('--force', action='store_true', help='Always run the command')
+
+    sub.add_parser('status', help='List recorded stages')
+
+    # Everything after the first "--" is the stage command
+    argv = sys.argv[1:]
+    split = argv.index('--') if '--' in argv else len(argv)
+    argv, command = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+    manifest = BuildManifest(args.cache_dir)
+
+    if args.command == 'status':
+        for stage, entry in sorted(manifest.stages.items()):
+            print(f"{stage}: {len(entry['inputs'])} inputs, {len(entry['outputs'])} outputs")
+        sys.exit(0)
+
+    if not command:
+        parser.error('run requires a command after --')
+    params = dict(p.split('=', 1) for p in args.param)
+    sys.exit(run_stage(manifest, args.stage, args.inputs, args.outputs, command, params, args.force))
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+CIDR Lookup Index
+=================
+Compiles a list of IPv4/IPv6 CIDR blocks into sorted, merged integer
+intervals (one table per address family) so that checking whether an
+address falls inside any block is a single bisect instead of a scan over
+every network.
+
+Usage as a library:
+    index = CidrIndex.from_file('sa-ips/sa-all.txt')
+    index.contains('212.26.1.1')
+    index.contains_many(['212.26.1.1', '2001:16a0::1'])
+
+Usage as a script (prints "<ip> <yes|no>" for every address on stdin):
+    python3 cidr_index.py sa-ips/sa-all.txt < ips.txt
+"""
+
+import sys
+import socket
+import bisect
+import ipaddress
+
+
+# Upper 96 bits of ::ffff:0:0/96
+IPV4_MAPPED = 0xFFFF
+
+
+def parse_cidr(text):
+    """Parse a CIDR string into a (version, first, last) integer interval."""
+    net = ipaddress.ip_network(text.strip(), strict=False)
+    first = int(net.network_address)
+    return net.version, first, first + net.num_addresses - 1
+
+
+def ip_to_int(ip_str):
+    """
+    Convert an address string to (version, integer), or None if invalid.
+
+    IPv4-mapped IPv6 addresses (::ffff:a.b.c.d, as dual-stack sockets and
+    proxy logs report IPv4 peers) are returned as the IPv4 address.
+    """
+    try:
+        if ':' in ip_str:
+            # getaddrinfo may return scoped link-local addresses (fe80::1%eth0)
+            value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip_str.split('%', 1)[0]), 'big')
+            if value >> 32 == IPV4_MAPPED:
+                return 4, value & 0xFFFFFFFF
+            return 6, value
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip_str), 'big')
+    except (OSError, TypeError):
+        return None
+
+
+def merge_intervals(intervals):
+    """Sort integer intervals and merge overlapping or adjacent ones."""
+    merged = []
+    for first, last in sorted(intervals):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1][1] = last
+        else:
+            merged.append([first, last])
+    return [(first, last) for first, last in merged]
+
+
+def int_to_ip(value, version):
+    """Format an integer address as an IPv4 or IPv6 string."""
+    if version == 4:
+        return socket.inet_ntop(socket.AF_INET, value.to_bytes(4, 'big'))
+    return socket.inet_ntop(socket.AF_INET6, value.to_bytes(16, 'big'))
+
+
+def range_to_cidrs(first, last, version):
+    """
+    Split an inclusive integer address range into the minimal list of CIDRs.
+
+    Each block is the largest power of two that is both aligned at the
+    current address (first & -first) and fits in what is left of the range.
+    """
+    bits = 32 if version == 4 else 128
+    cidrs = []
+    while first <= last:
+        size = first & -first if first else 1 << bits
+        remaining = last - first + 1
+        if size > remaining:
+            size = 1 << (remaining.bit_length() - 1)
+        cidrs.append(f"{int_to_ip(first, version)}/{bits - size.bit_length() + 1}")
+        first += size
+    return cidrs
+
+
+def intervals_to_cidrs(intervals, version):
+    """Collapse integer intervals and convert them to a minimal CIDR list."""
+    cidrs = []
+    for first, last in merge_intervals(intervals):
+        cidrs.extend(range_to_cidrs(first, last, version))
+    return cidrs
+
+
+class CidrIndex:
+    """
+    Immutable membership index over a set of CIDR blocks.
+
+    Accepts CIDR strings, ipaddress network objects or pre-parsed
+    (version, first, last) tuples.
+    """
+
+    def __init__(self, networks=()):
+        intervals = {4: [], 6: []}
+        for net in networks:
+            if isinstance(net, str):
+                version, first, last = parse_cidr(net)
+            elif isinstance(net, tuple):
+                version, first, last = net
+            else:
+                first = int(net.network_address)
+                version, last = net.version, first + net.num_addresses - 1
+            intervals[version].append((first, last))
+
+        self._starts = {}
+        self._ends = {}
+        for version, items in intervals.items():
+            merged = merge_intervals(items)
+            self._starts[version] = [first for first, _ in merged]
+            self._ends[version] = [last for _, last in merged]
+
+    @classmethod
+    def from_file(cls, ip_file):
+        """Build an index from a CIDR file, skipping comments and bad lines."""
+        networks = []
+        with open(ip_file) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    try:
+                        networks.append(parse_cidr(line))
+                    except ValueError:
+                        pass
+        return cls(networks)
+
+    def __len__(self):
+        """Number of merged intervals across both address families."""
+        return len(self._starts[4]) + len(self._starts[6])
+
+    def __contains__(self, ip_str):
+        return self.contains(ip_str)
+
+    def contains(self, ip_str):
+        """Check if a single address string falls inside any indexed block."""
+        parsed = ip_to_int(ip_str)
+        if parsed is None:
+            return False
+        version, value = parsed
+        starts = self._starts[version]
+        i = bisect.bisect_right(starts, value) - 1
+        return i >= 0 and value <= self._ends[version][i]
+
+    def contains_many(self, ips):
+        """Check a batch of address strings, returning a list of booleans."""
+        bisect_right = bisect.bisect_right
+        starts4, ends4 = self._starts[4], self._ends[4]
+        starts6, ends6 = self._starts[6], self._ends[6]
+        results = []
+        append = results.append
+        for ip_str in ips:
+            parsed = ip_to_int(ip_str)
+            if parsed is None:
+                append(False)
+                continue
+            version, value = parsed
+            if version == 4:
+                starts, ends = starts4, ends4
+            else:
+                starts, ends = starts6, ends6
+            i = bisect_right(starts, value) - 1
+            append(i >= 0 and value <= ends[i])
+        return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print(f"Usage: {sys.argv[0]} <cidr-file> < ips.txt", file=sys.stderr)
+        sys.exit(1)
+
+    index = CidrIndex.from_file(sys.argv[1])
+    print(f"Loaded {len(index)} merged intervals", file=sys.stderr)
+    ips = [line.strip() for line in sys.stdin if line.strip()]
+    for ip, hit in zip(ips, index.contains_many(ips)):
+        print(f"{ip} {'yes' if hit else 'no'}")
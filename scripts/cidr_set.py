@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+CIDR Set Algebra
+================
+Represents a set of IPv4/IPv6 addresses as sorted, merged integer
+intervals (one list per address family) and supports union, intersection
+and difference. Any set can be written back out as the minimal list of
+CIDR blocks that covers it, so nested, overlapping and adjacent prefixes
+from different sources collapse into one clean list.
+
+Usage as a script:
+    python3 cidr_set.py sa-ips/sa-ipv4-ripe.txt sa-ips/sa-ipv6-ripe.txt data/sa-extra-ips.txt \\
+        --exclude data/sa-exclude-ips.txt --exclude-private -o sa-ips/sa-all.txt
+"""
+
+import sys
+
+from cidr_index import intervals_to_cidrs, merge_intervals, parse_cidr
+
+# Special-purpose ranges that never belong in a country list
+PRIVATE_CIDRS = [
+    '0.0.0.0/8', '10.0.0.0/8', '100.64.0.0/10', '127.0.0.0/8', '169.254.0.0/16',
+    '172.16.0.0/12', '192.0.0.0/24', '192.0.2.0/24', '192.88.99.0/24', '192.168.0.0/16',
+    '198.18.0.0/15', '198.51.100.0/24', '203.0.113.0/24', '224.0.0.0/4', '240.0.0.0/4',
+    '255.255.255.255/32',
+    '::/128', '::1/128', '64:ff9b::/96', '100::/64', '2001:db8::/32', 'fc00::/7', 'fe80::/10', 'ff00::/8',
+]
+
+
+def read_cidr_file(path):
+    """Read (version, first, last) intervals from a CIDR file, skipping comments and bad lines."""
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                try:
+                    entries.append(parse_cidr(line))
+                except ValueError:
+                    print(f"  !! Skipping invalid CIDR in {path}: {line}", file=sys.stderr)
+    return entries
+
+
+class CidrSet:
+    """
+    Immutable set of addresses stored as merged integer intervals.
+
+    Accepts CIDR strings or pre-parsed (version, first, last) tuples.
+    """
+
+    def __init__(self, networks=()):
+        intervals = {4: [], 6: []}
+        for net in networks:
+            version, first, last = parse_cidr(net) if isinstance(net, str) else net
+            intervals[version].append((first, last))
+        self._intervals = {version: merge_intervals(items) for version, items in intervals.items()}
+
+    @classmethod
+    def _from_intervals(cls, intervals):
+        result = cls()
+        result._intervals = intervals
+        return result
+
+    @classmethod
+    def from_files(cls, *paths):
+        entries = []
+        for path in paths:
+            entries.extend(read_cidr_file(path))
+        return cls(entries)
+
+    def intervals(self, version):
+        """Merged (first, last) intervals of one address family."""
+        return list(self._intervals[version])
+
+    def __eq__(self, other):
+        return isinstance(other, CidrSet) and self._intervals == other._intervals
+
+    def __bool__(self):
+        return bool(self._intervals[4] or self._intervals[6])
+
+    def num_addresses(self, version):
+        return sum(last - first + 1 for first, last in self._intervals[version])
+
+    def union(self, other):
+        return self._from_intervals({
+            version: merge_intervals(self._intervals[version] + other._intervals[version])
+            for version in (4, 6)
+        })
+
+    def intersection(self, other):
+        result = {}
+        for version in (4, 6):
+            a, b = self._intervals[version], other._intervals[version]
+            out = []
+            i = j = 0
+            while i < len(a) and j < len(b):
+                first = max(a[i][0], b[j][0])
+                last = min(a[i][1], b[j][1])
+                if first <= last:
+                    out.append((first, last))
+                if a[i][1] < b[j][1]:
+                    i += 1
+                else:
+                    j += 1
+            result[version] = out
+        return self._from_intervals(result)
+
+    def difference(self, other):
+        result = {}
+        for version in (4, 6):
+            b = other._intervals[version]
+            out = []
+            j = 0
+            for first, last in self._intervals[version]:
+                # Skip exclusions entirely to the left of this interval
+                while j < len(b) and b[j][1] < first:
+                    j += 1
+                k = j
+                while k < len(b) and b[k][0] <= last:
+                    if b[k][0] > first:
+                        out.append((first, b[k][0] - 1))
+                    first = max(first, b[k][1] + 1)
+                    if b[k][1] >= last:
+                        break
+                    k += 1
+                if first <= last:
+                    out.append((first, last))
+            result[version] = out
+        return self._from_intervals(result)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def to_cidrs(self, version=None):
+        """Minimal CIDR list covering the set (IPv4 first, then IPv6)."""
+        versions = (4, 6) if version is None else (version,)
+        cidrs = []
+        for v in versions:
+            cidrs.extend(intervals_to_cidrs(self._intervals[v], v))
+        return cidrs
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Merge CIDR lists into a minimal covering set')
+    parser.add_argument('inputs', nargs='+', help='CIDR files to union')
+    parser.add_argument('-x', '--exclude', action='append', default=[], help='CIDR file to subtract (repeatable)')
+    parser.add_argument('--exclude-private', action='store_true', help='Subtract private/special-purpose ranges')
+    parser.add_argument('--intersect', help='Keep only addresses also present in this CIDR file')
+    parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+
+    args = parser.parse_args()
+
+    entries = []
+    for path in args.inputs:
+        entries.extend(read_cidr_file(path))
+    result = CidrSet(entries)
+
+    if args.intersect:
+        result = result & CidrSet.from_files(args.intersect)
+    exclusions = CidrSet.from_files(*args.exclude)
+    if args.exclude_private:
+        exclusions = exclusions | CidrSet(PRIVATE_CIDRS)
+    result = result - exclusions
+
+    cidrs = result.to_cidrs()
+    lines = ''.join(cidr + '\n' for cidr in cidrs)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(lines)
+    else:
+        sys.stdout.write(lines)
+
+    print(f"  -> {len(entries)} input entries -> {len(cidrs)} CIDR blocks "
+          f"({len(entries) - len(cidrs)} removed by collapse/exclusion)", file=sys.stderr)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Domain Suffix Deduplication
+===========================
+Drops every domain that is already covered by a listed ancestor suffix
+under domain_suffix semantics (sing-box rule-sets, v2ray geosite plain
+entries): with "example.com.sa" listed, "sub.example.com.sa" is redundant,
+and with the bare "sa" entry listed every .sa domain is redundant.
+
+Domains are inserted into a reversed-label trie; a domain is redundant if
+walking its labels from the TLD passes through a node that is itself a
+listed domain.
+
+Usage:
+    python3 dedup_domains.py domains/sa.txt -o domains/sa.txt --report dedup-report.txt
+    python3 dedup_domains.py domains/sa.txt --keep domains/sa-gov.txt   # never drop gov entries
+"""
+
+import sys
+
+# Trie node marker for "this exact domain is listed"
+_END = ''
+
+
+def read_domains(path):
+    """Read non-empty, non-comment lines from a domain list, lowercased."""
+    domains = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip().lower()
+            if line and not line.startswith('#'):
+                domains.append(line)
+    return domains
+
+
+def build_suffix_trie(domains):
+    """Insert domains into a trie keyed by labels from the TLD inwards."""
+    root = {}
+    for domain in domains:
+        node = root
+        for label in reversed(domain.split('.')):
+            node = node.setdefault(label, {})
+        node[_END] = True
+    return root
+
+
+def covering_suffix(trie, domain):
+    """Return the closest listed proper ancestor suffix of domain, or None."""
+    labels = domain.split('.')
+    node = trie
+    covering = None
+    for depth, label in enumerate(reversed(labels[1:]), 1):
+        node = node.get(label)
+        if node is None:
+            break
+        if _END in node:
+            covering = '.'.join(labels[-depth:])
+    return covering
+
+
+def dedup_domains(domains, keep=()):
+    """
+    Remove domains covered by a listed ancestor suffix.
+
+    Args:
+        domains: Iterable of domain names
+        keep: Domains that must stay listed even when covered
+
+    Returns (kept, removed) where kept is the sorted unique list of domains
+    and removed is a sorted list of (domain, covering suffix) pairs.
+    """
+    unique = sorted(set(domains))
+    trie = build_suffix_trie(unique)
+    keep = set(keep)
+    kept = []
+    removed = []
+    for domain in unique:
+        covering = covering_suffix(trie, domain)
+        if covering is None or domain in keep:
+            kept.append(domain)
+        else:
+            removed.append((domain, covering))
+    return kept, removed
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Remove domains covered by a listed ancestor suffix')
+    parser.add_argument('input', help='Domain list (one per line)')
+    parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+    parser.add_argument('--keep', action='append', default=[],
+                        help='Domain list whose entries are never removed (repeatable, e.g. category lists)')
+    parser.add_argument('--report', help='Write "<removed domain> <covering suffix>" lines here')
+
+    args = parser.parse_args()
+
+    domains = read_domains(args.input)
+    keep = set()
+    for path in args.keep:
+        keep.update(read_domains(path))
+
+    kept, removed = dedup_domains(domains, keep=keep)
+
+    lines = ''.join(d + '\n' for d in kept)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(lines)
+    else:
+        sys.stdout.write(lines)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            f.write(f"# Removed {len(removed)} domains covered by a listed suffix\n")
+            for domain, covering in removed:
+                f.write(f"{domain} {covering}\n")
+
+    print(f"  -> Suffix dedup: {len(domains)} entries -> {len(kept)} kept, {len(removed)} removed", file=sys.stderr)
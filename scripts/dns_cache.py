@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Persistent DNS Result Cache
+===========================
+SQLite-backed cache of domain resolutions so weekly CrUX rebuilds only
+query domains that are new or whose cached answer has expired.
+
+Each entry stores the resolved IPs, the time it was resolved and the
+answer TTL. Because the build runs weekly, the TTL is clamped to
+[min_ttl, max_ttl] when deciding whether an entry is still fresh; the
+floors sit a little above CADENCE so an entry outlives exactly one run.
+NXDOMAIN answers are stored as negative entries (no IPs) and expire after
+negative_ttl. When the cache grows beyond max_entries, the entries that
+were least recently used are evicted.
+
+Usage as a script:
+    python3 dns_cache.py stats  crux-dns-cache.sqlite
+    python3 dns_cache.py purge  crux-dns-cache.sqlite   # drop expired entries
+"""
+
+import sys
+import time
+import sqlite3
+
+# Interval between scheduled builds (the weekly cron in release.yml), plus
+# slack for late or re-run builds
+CADENCE = 7 * 24 * 3600
+CADENCE_SLACK = 2 * 24 * 3600
+
+# Floor/ceiling applied to answer TTLs so that very short TTLs (CDNs) still
+# survive into the next run, and nothing is trusted for longer than a month
+MIN_TTL = CADENCE + CADENCE_SLACK
+MAX_TTL = 30 * 24 * 3600
+
+# Negative (NXDOMAIN) entries are reused by the next run and retried on the
+# one after, instead of keeping the longer positive TTLs
+NEGATIVE_TTL = CADENCE + CADENCE_SLACK
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dns_cache (
+    domain     TEXT PRIMARY KEY,
+    ips        TEXT NOT NULL,
+    resolved   INTEGER NOT NULL,
+    ttl        INTEGER NOT NULL,
+    last_used  INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dns_cache_last_used ON dns_cache (last_used);
+"""
+
+
+class DnsCache:
+    """
+    Domain -> resolved IPs cache with TTL expiry and LRU eviction.
+
+    Args:
+        path: SQLite database file
+        max_entries: Evict least recently used entries beyond this size
+        min_ttl: Lower bound applied to positive answer TTLs
+        max_ttl: Upper bound applied to positive answer TTLs
+        negative_ttl: TTL for NXDOMAIN entries
+    """
+
+    def __init__(self, path, max_entries=500000, min_ttl=MIN_TTL, max_ttl=MAX_TTL, negative_ttl=NEGATIVE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM dns_cache').fetchone()[0]
+
+    def lookup_many(self, domains, now=None):
+        """
+        Look up domains in the cache.
+
+        Returns (cached, missing): cached maps each fresh domain to its list
+        of IPs (empty for negative entries); missing lists the domains that
+        are new or expired and must be resolved.
+        """
+        now = int(now if now is not None else time.time())
+        cached = {}
+        missing = []
+        fresh = []
+        cursor = self._conn.cursor()
+        for domain in domains:
+            row = cursor.execute('SELECT ips, resolved, ttl FROM dns_cache WHERE domain = ?', (domain,)).fetchone()
+            if row is None:
+                self.misses += 1
+                missing.append(domain)
+            elif row[1] + self._effective_ttl(row[0], row[2]) <= now:
+                self.expired += 1
+                missing.append(domain)
+            else:
+                ips = row[0].split(',') if row[0] else []
+                if ips:
+                    self.hits += 1
+                else:
+                    self.negative_hits += 1
+                cached[domain] = ips
+                fresh.append((now, domain))
+        cursor.executemany('UPDATE dns_cache SET last_used = ? WHERE domain = ?', fresh)
+        self._conn.commit()
+        return cached, missing
+
+    def store_many(self, results, now=None):
+        """
+        Store resolver results.
+
+        Args:
+            results: Iterable of (domain, ips, ttl, status) where status is
+                'ok', 'nxdomain', 'timeout' or 'error'. Timeouts and errors
+                are not cached so they are retried on the next run.
+        """
+        now = int(now if now is not None else time.time())
+        rows = []
+        for domain, ips, ttl, status in results:
+            if status == 'nxdomain' or (status == 'ok' and not ips):
+                rows.append((domain, '', now, 0, now))
+            elif status == 'ok':
+                rows.append((domain, ','.join(ips), now, ttl, now))
+        self._conn.executemany('INSERT OR REPLACE INTO dns_cache VALUES (?, ?, ?, ?, ?)', rows)
+        self._conn.commit()
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries beyond max_entries."""
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                'DELETE FROM dns_cache WHERE domain IN '
+                '(SELECT domain FROM dns_cache ORDER BY last_used, resolved LIMIT ?)', (excess,))
+            self._conn.commit()
+            self.evicted += excess
+
+    def _effective_ttl(self, ips, ttl):
+        if not ips:
+            return self.negative_ttl
+        return min(max(ttl, self.min_ttl), self.max_ttl)
+
+    def _expired_clause(self):
+        return ("resolved + CASE WHEN ips = '' THEN ? ELSE MAX(MIN(ttl, ?), ?) END <= ?",
+                (self.negative_ttl, self.max_ttl, self.min_ttl))
+
+    def purge_expired(self, now=None):
+        """Delete all expired entries; returns how many were removed."""
+        now = int(now if now is not None else time.time())
+        clause, params = self._expired_clause()
+        cursor = self._conn.execute(f'DELETE FROM dns_cache WHERE {clause}', params + (now,))
+        self._conn.commit()
+        return cursor.rowcount
+
+    def summary(self, now=None):
+        """Return (entries, negative entries, expired entries) for the whole cache."""
+        now = int(now if now is not None else time.time())
+        clause, params = self._expired_clause()
+        total, negative, expired = self._conn.execute(
+            f"SELECT COUNT(*), SUM(ips = ''), SUM({clause}) FROM dns_cache", params + (now,)).fetchone()
+        return total, negative or 0, expired or 0
+
+    def stats(self):
+        """Return hit/miss counters for this session plus the cache size."""
+        lookups = self.hits + self.negative_hits + self.misses + self.expired
+        return {
+            'entries': len(self),
+            'lookups': lookups,
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'hit_rate': (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+        }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Inspect or maintain the DNS result cache')
+    parser.add_argument('command', choices=['stats', 'purge'], help='Action to perform')
+    parser.add_argument('cache_file', help='Path to the SQLite cache file')
+
+    args = parser.parse_args()
+
+    with DnsCache(args.cache_file) as cache:
+        if args.command == 'purge':
+            print(f"Removed {cache.purge_expired()} expired entries", file=sys.stderr)
+        total, negative, expired = cache.summary()
+        print(f"Entries: {total} | Negative: {negative} | Expired: {expired}")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Rank-Tiered Domain Lists
+========================
+Builds smaller variants of the Saudi domain list for memory-constrained
+clients (routers, phones), cut by CrUX rank:
+
+    sa-top1k    always-included lists + CrUX domains ranked in the top 1,000
+    sa-top10k   always-included lists + CrUX domains ranked in the top 10,000
+    sa-full     the complete list (domains/sa.txt)
+
+The always-included lists (curated, gov, bank, services and the .sa TLD
+entries) are part of every tier whatever their traffic. Ranks come from
+the CrUX filter's --with-ranks output ("domain rank" lines). Each tier is
+suffix-deduplicated, written as a list for geosite and compiled to a
+sing-box .srs, and its entry count and compiled size are reported.
+
+Usage:
+    python3 domain_tiers.py --ranked sa-crux-live.txt --full domains/sa.txt \\
+        --always data/sa-domains.txt --always data/sa-gov-domains.txt \\
+        --tier sa-top1k=1000 --tier sa-top10k=10000
+"""
+
+import os
+import sys
+import json
+
+from dedup_domains import dedup_domains
+from srs import write_rule_set
+
+# Top-level entries every tier carries (the .sa and .السعودية TLDs)
+TLD_ENTRIES = ('sa', 'xn--mgbaam7a8h')
+DEFAULT_TIERS = {'sa-top1k': 1000, 'sa-top10k': 10000}
+FULL_TIER = 'sa-full'
+
+
+def read_ranked(*paths):
+    """Read "domain [rank]" lines into {domain: rank or None}, keeping each domain's best rank."""
+    ranks = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                fields = line.split('#', 1)[0].split()
+                if not fields:
+                    continue
+                domain = fields[0].lower()
+                rank = int(fields[1]) if len(fields) > 1 else None
+                if domain not in ranks or (rank is not None and (ranks[domain] is None or rank < ranks[domain])):
+                    ranks[domain] = rank
+    return ranks
+
+
+def build_tiers(ranked, always, full, tiers=DEFAULT_TIERS):
+    """
+    Domain lists per tier name, each sorted and suffix-deduplicated.
+
+    Args:
+        ranked: {domain: CrUX rank or None}
+        always: Domains included in every tier
+        full: The complete list, emitted as FULL_TIER
+        tiers: {tier name: highest CrUX rank bucket included}
+    """
+    base = set(always) | set(TLD_ENTRIES)
+    result = {}
+    for name, max_rank in sorted(tiers.items(), key=lambda item: item[1]):
+        picked = {d for d, rank in ranked.items() if rank is not None and rank <= max_rank}
+        result[name], _ = dedup_domains(base | picked)
+    result[FULL_TIER], _ = dedup_domains(full)
+    return result
+
+
+def write_tiers(tiers, domains_dir='domains', rule_set_dir='rule-set'):
+    """Write <tier>.txt and geosite-<tier>.srs for every tier; returns one report dict per tier."""
+    os.makedirs(domains_dir, exist_ok=True)
+    os.makedirs(rule_set_dir, exist_ok=True)
+    reports = []
+    for name, domains in tiers.items():
+        list_path = os.path.join(domains_dir, f'{name}.txt')
+        srs_path = os.path.join(rule_set_dir, f'geosite-{name}.srs')
+        tmp = list_path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(''.join(d + '\n' for d in domains))
+        os.replace(tmp, list_path)
+        tmp = srs_path + '.tmp'
+        size = write_rule_set(tmp, [{'domain_suffix': domains}])
+        os.replace(tmp, srs_path)
+        reports.append({'tier': name, 'entries': len(domains), 'list': list_path,
+                        'list_bytes': os.path.getsize(list_path), 'srs': srs_path, 'srs_bytes': size})
+    return reports
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build rank-tiered variants of the SA domain list')
+    parser.add_argument('--ranked', action='append', default=[],
+                        help='CrUX filter output written with --with-ranks (repeatable)')
+    parser.add_argument('--always', action='append', default=[],
+                        help='List included in every tier, e.g. curated, gov and bank lists (repeatable)')
+    parser.add_argument('--full', default='domains/sa.txt', help=f'Complete list, emitted as {FULL_TIER}')
+    parser.add_argument('--tier', action='append', default=[],
+                        help='NAME=MAX_RANK (default: ' + ', '.join(f'{n}={r}' for n, r in DEFAULT_TIERS.items()) + ')')
+    parser.add_argument('--domains-dir', default='domains', help='Directory for the tier lists')
+    parser.add_argument('--rule-set-dir', default='rule-set', help='Directory for the tier .srs files')
+    parser.add_argument('--json', help='Also write the report as JSON')
+
+    args = parser.parse_args()
+
+    tiers = {}
+    for spec in args.tier:
+        name, sep, max_rank = spec.partition('=')
+        if not sep or not max_rank.isdigit() or name == FULL_TIER:
+            parser.error(f'--tier expects NAME=MAX_RANK with NAME other than {FULL_TIER}')
+        tiers[name] = int(max_rank)
+
+    ranked = read_ranked(*args.ranked)
+    always = list(read_ranked(*[path for path in args.always if os.path.exists(path)]))
+    full = list(read_ranked(args.full))
+
+    reports = write_tiers(build_tiers(ranked, always, full, tiers or DEFAULT_TIERS),
+                          domains_dir=args.domains_dir, rule_set_dir=args.rule_set_dir)
+    full_report = reports[-1]
+    for report in reports:
+        share = report['srs_bytes'] / full_report['srs_bytes'] if full_report['srs_bytes'] else 0
+        print(f"  -> {report['tier']}: {report['entries']} entries, {report['list_bytes']} bytes listed, "
+              f"{report['srs_bytes']} bytes compiled ({share:.0%} of {FULL_TIER})", file=sys.stderr)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Multi-Client Rule Exporter
+==========================
+Loads the Saudi domain list and CIDR lists once into an in-memory model
+and writes every client format from it:
+
+- sing-box rule-set sources (JSON, "format": "source"):
+      geosite-sa.json (domain_suffix), geoip-sa.json (ip_cidr)
+- Clash / mihomo rule-providers (YAML payloads):
+      domain behavior ('+.example.sa'), ipcidr behavior, and classical
+      (DOMAIN-SUFFIX / IP-CIDR / IP-CIDR6 lines, no-resolve)
+- Xray / V2Ray routing fragment: one "domain:" rule and one ip rule for
+  a configurable outbound tag, mergeable with -confdir
+- Karing App diversion rules (see generate-karing-config.py)
+
+JSON is streamed with a compact encoder (no indentation). Every output is
+written to a temporary file and moved into place only when complete, and
+its size and emit time are reported.
+
+Usage:
+    python3 export_rules.py --domains domains/sa.txt --ips sa-ips/sa-all.txt
+    python3 export_rules.py clash-domain xray --output xray=/tmp/sa-routing.json
+    python3 export_rules.py --crux crux.csv.gz --json export-report.json
+"""
+
+import os
+import sys
+import json
+import time
+import functools
+import importlib.util
+
+from cidr_index import parse_cidr
+
+# Compact separators; non-ASCII (the Karing rule names) is written as UTF-8
+COMPACT_JSON = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_script(name):
+    """Import a hyphenated script from this directory as a module."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    spec = importlib.util.spec_from_file_location(name[:-3].replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def read_list(path):
+    """Stripped, lowercased non-comment lines of a list file, in order and without duplicates."""
+    seen = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip().lower()
+            if line and not line.startswith('#'):
+                seen[line] = None
+    return list(seen)
+
+
+class RuleModel:
+    """Domains and CIDRs shared by every export target."""
+
+    def __init__(self, domains, ipv4, ipv6, keywords=()):
+        self.domains = domains
+        self.ipv4 = ipv4
+        self.ipv6 = ipv6
+        self.keywords = list(keywords)
+
+    @property
+    def cidrs(self):
+        return self.ipv4 + self.ipv6
+
+
+def load_model(domains_file, ip_files):
+    """Read the domain list and CIDR lists once, splitting CIDRs by address family."""
+    domains = read_list(domains_file)
+    ipv4, ipv6 = [], []
+    for path in ip_files:
+        for cidr in read_list(path):
+            parse_cidr(cidr)  # reject malformed entries before they reach a client
+            (ipv6 if ':' in cidr else ipv4).append(cidr)
+    return RuleModel(domains, ipv4, ipv6)
+
+
+# ---------------------------------------------------------------------------
+# Emitters: each returns an iterable of text chunks
+# ---------------------------------------------------------------------------
+
+def emit_singbox_geosite(model, **_):
+    return COMPACT_JSON.iterencode({'version': 2, 'rules': [{'domain_suffix': model.domains}]})
+
+
+def emit_singbox_geoip(model, **_):
+    return COMPACT_JSON.iterencode({'version': 2, 'rules': [{'ip_cidr': model.cidrs}]})
+
+
+def _yaml_payload(items):
+    yield 'payload:\n'
+    for item in items:
+        yield f"  - '{item}'\n"
+
+
+def emit_clash_domain(model, **_):
+    # '+.' matches the domain itself and every subdomain
+    return _yaml_payload(f'+.{domain}' for domain in model.domains)
+
+
+def emit_clash_ipcidr(model, **_):
+    return _yaml_payload(model.cidrs)
+
+
+def emit_clash_classical(model, **_):
+    yield 'payload:\n'
+    for domain in model.domains:
+        yield f'  - DOMAIN-SUFFIX,{domain}\n'
+    for cidr in model.ipv4:
+        yield f'  - IP-CIDR,{cidr},no-resolve\n'
+    for cidr in model.ipv6:
+        yield f'  - IP-CIDR6,{cidr},no-resolve\n'
+
+
+def emit_xray(model, outbound_tag='direct', **_):
+    rules = []
+    if model.domains:
+        rules.append({'type': 'field', 'outboundTag': outbound_tag,
+                      'domain': [f'domain:{domain}' for domain in model.domains]})
+    if model.cidrs:
+        rules.append({'type': 'field', 'outboundTag': outbound_tag, 'ip': model.cidrs})
+    return COMPACT_JSON.iterencode({'routing': {'rules': rules}})
+
+
+def emit_karing(model, **_):
+    karing = _load_script('generate-karing-config.py')
+    return COMPACT_JSON.iterencode(karing.karing_config(model.keywords, model.ipv4, model.ipv6))
+
+
+# name -> (default output path, emitter)
+TARGETS = {
+    'singbox-geosite': ('rule-set/geosite-sa.json', emit_singbox_geosite),
+    'singbox-geoip': ('rule-set/geoip-sa.json', emit_singbox_geoip),
+    'clash-domain': ('release/clash-sa-domain.yaml', emit_clash_domain),
+    'clash-ipcidr': ('release/clash-sa-ipcidr.yaml', emit_clash_ipcidr),
+    'clash-classical': ('release/clash-sa-classical.yaml', emit_clash_classical),
+    'xray': ('release/xray-sa-routing.json', emit_xray),
+    'karing': ('release/SA_Diversion_Rules_Karing_App.json', emit_karing),
+}
+
+
+def write_atomic(path, chunks):
+    """Write text chunks to path via a temporary file; returns the byte size."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w', encoding='utf-8', newline='\n') as f:
+            f.writelines(chunks)
+        size = os.path.getsize(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return size
+
+
+def export(model, outputs, outbound_tag='direct'):
+    """
+    Write each target from the model.
+
+    outputs maps target name -> path. Returns one report dict per target
+    with its path, size in bytes and emit seconds.
+    """
+    reports = []
+    for name, path in outputs.items():
+        _, emitter = TARGETS[name]
+        start = time.perf_counter()
+        size = write_atomic(path, emitter(model, outbound_tag=outbound_tag))
+        reports.append({'target': name, 'path': path, 'bytes': size,
+                        'seconds': round(time.perf_counter() - start, 6)})
+    return reports
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export the SA domain and IP lists for every client format')
+    parser.add_argument('targets', nargs='*', help=f"Targets to write (default: all of {', '.join(TARGETS)})")
+    parser.add_argument('--domains', default='domains/sa.txt', help='Domain list (suffix semantics)')
+    parser.add_argument('--ips', action='append', help='CIDR list, IPv4 and/or IPv6 (default: sa-ips/sa-all.txt)')
+    parser.add_argument('--output', action='append', default=[], help='NAME=PATH to override a target path')
+    parser.add_argument('--outbound-tag', default='direct', help='Outbound tag for the Xray rules')
+    parser.add_argument('--crux', help='CrUX CSV (.csv/.csv.gz) for Karing keyword ranking')
+    parser.add_argument('--max-keywords', type=int, default=300, help='Cap on Karing domain_keyword entries')
+    parser.add_argument('--json', help='Also write the report as JSON')
+
+    args = parser.parse_args()
+
+    unknown = [name for name in args.targets if name not in TARGETS]
+    if unknown:
+        parser.error(f'unknown target(s): {", ".join(unknown)}')
+    outputs = {name: TARGETS[name][0] for name in (args.targets or TARGETS)}
+    for override in args.output:
+        name, sep, path = override.partition('=')
+        if not sep or name not in TARGETS:
+            parser.error(f'--output expects NAME=PATH with NAME one of {", ".join(TARGETS)}')
+        outputs[name] = path
+
+    start = time.perf_counter()
+    model = load_model(args.domains, args.ips or ['sa-ips/sa-all.txt'])
+    print(f"  -> Loaded {len(model.domains)} domains, {len(model.ipv4)} IPv4 and {len(model.ipv6)} IPv6 CIDRs "
+          f"in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    if 'karing' in outputs:
+        karing = _load_script('generate-karing-config.py')
+        model.keywords = karing.karing_keywords(model.domains, crux_file=args.crux, max_keywords=args.max_keywords)
+
+    reports = export(model, outputs, outbound_tag=args.outbound_tag)
+    for report in reports:
+        print(f"  -> {report['target']}: {report['path']} ({report['bytes']} bytes in {report['seconds']:.3f}s)",
+              file=sys.stderr)
+    print(f"  -> {len(reports)} outputs, {sum(r['bytes'] for r in reports)} bytes "
+          f"in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Upstream Source Fetcher
+=======================
+Downloads the upstream data sources concurrently into a local directory
+that is kept between runs (.cache/sources/ by default):
+
+- Conditional requests: the ETag and Last-Modified of every download are
+  recorded in sources.json and sent back as If-None-Match /
+  If-Modified-Since, so an unchanged source costs one 304 round trip and
+  the file on disk (and every build stage hashed on it) stays untouched
+- Streaming: bodies are written in chunks to a temporary file and moved
+  into place only when complete; gzip transfer encoding, and for sources
+  marked gunzip the gzip payload itself, is decompressed on the fly
+- A failed download keeps the previous copy; only required sources with
+  no copy at all make the run fail
+- Bytes, time and status are reported per source
+
+Usage:
+    python3 fetch_sources.py                         # all sources
+    python3 fetch_sources.py ripe crux --max-age 3600
+    python3 fetch_sources.py crux --url crux=http://127.0.0.1:8000/latest.csv.gz
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import http.client
+import concurrent.futures
+import urllib.error
+import urllib.request
+
+from build_manifest import DEFAULT_CACHE_DIR
+
+DEFAULT_SOURCES_DIR = os.path.join(DEFAULT_CACHE_DIR, 'sources')
+METADATA_FILE = 'sources.json'
+CHUNK_SIZE = 1 << 16
+USER_AGENT = 'SA-Routing-Rules/1.0 (+https://github.com/Wincing9950/SA-Routing-Rules)'
+
+# name -> source definition; filename is relative to the sources directory
+SOURCES = {
+    'ripe': {
+        'url': 'https://ftp.ripe.net/pub/stats/ripencc/delegated-ripencc-extended-latest',
+        'filename': 'ripencc-delegated.txt',
+        'required': True,
+    },
+    'crux': {
+        'url': 'https://raw.githubusercontent.com/InternetHealthReport/crux-top-lists-country/refs/heads/main/data/SA/latest.csv.gz',
+        # Kept compressed: the CrUX filter streams .csv.gz directly
+        'filename': 'crux-sa-latest.csv.gz',
+        'required': False,
+    },
+    'banks': {
+        'url': 'https://raw.githubusercontent.com/karenyousefi/bank-domains/main/sa/list.txt',
+        'filename': 'sa-banks.txt',
+        'required': False,
+    },
+}
+
+STATUS_FETCHED = 'fetched'
+STATUS_NOT_MODIFIED = 'not-modified'
+STATUS_FRESH = 'fresh'
+STATUS_FAILED = 'failed'
+
+
+def load_metadata(sources_dir):
+    try:
+        with open(os.path.join(sources_dir, METADATA_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_metadata(sources_dir, metadata):
+    path = os.path.join(sources_dir, METADATA_FILE)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(metadata, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def conditional_headers(entry, path):
+    """Validators from a previous download, if its file is still on disk."""
+    headers = {}
+    if not entry or not os.path.exists(path):
+        return headers
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def _gzip_decoder():
+    # wbits 16+MAX_WBITS: expect a gzip header and trailer
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+def fetch_source(name, source, sources_dir, entry=None, timeout=60):
+    """
+    Download one source unless the server says it has not changed.
+
+    Returns (new metadata entry, report dict). The report holds status,
+    bytes received over the wire, bytes written and seconds taken.
+    """
+    path = os.path.join(sources_dir, source['filename'])
+    validators = conditional_headers(entry, path)
+    headers = {'User-Agent': USER_AGENT, 'Accept-Encoding': 'gzip', **validators}
+    report = {'name': name, 'url': source['url'], 'path': path, 'received': 0, 'written': 0}
+    start = time.perf_counter()
+    request = urllib.request.Request(source['url'], headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            decoders = []
+            if response.headers.get('Content-Encoding', '').lower() == 'gzip':
+                decoders.append(_gzip_decoder())
+            if source.get('gunzip'):
+                decoders.append(_gzip_decoder())
+            tmp = f"{path}.{os.getpid()}.part"
+            try:
+                with open(tmp, 'wb') as f:
+                    while True:
+                        chunk = response.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        report['received'] += len(chunk)
+                        for decoder in decoders:
+                            chunk = decoder.decompress(chunk)
+                        f.write(chunk)
+                        report['written'] += len(chunk)
+                    # read(n) returns b'' when the connection drops early
+                    # instead of raising; compare with Content-Length
+                    if response.length:
+                        raise http.client.IncompleteRead(b'', response.length)
+                    for i, decoder in enumerate(decoders):
+                        tail = decoder.flush()
+                        for later in decoders[i + 1:]:
+                            tail = later.decompress(tail)
+                        f.write(tail)
+                        report['written'] += len(tail)
+                    if any(not decoder.eof for decoder in decoders):
+                        raise OSError('truncated gzip stream')
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            entry = {
+                'url': source['url'],
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'size': report['written'],
+            }
+            report['status'] = STATUS_FETCHED
+    except urllib.error.HTTPError as e:
+        if e.code != 304:
+            report['status'] = STATUS_FAILED
+            report['error'] = f'HTTP {e.code}'
+        elif not validators:
+            # Nothing on disk (or no validators) to be "not modified" from
+            report['status'] = STATUS_FAILED
+            report['error'] = 'HTTP 304 to an unconditional request'
+        else:
+            report['status'] = STATUS_NOT_MODIFIED
+            # A 304 may carry refreshed validators
+            entry = dict(entry, etag=e.headers.get('ETag') or entry.get('etag'),
+                         last_modified=e.headers.get('Last-Modified') or entry.get('last_modified'))
+    except (OSError, zlib.error, http.client.HTTPException) as e:
+        report['status'] = STATUS_FAILED
+        report['error'] = str(getattr(e, 'reason', e))
+    report['seconds'] = time.perf_counter() - start
+    if report['status'] != STATUS_FAILED:
+        entry = dict(entry, checked_at=time.time())
+    return entry, report
+
+
+def fetch_sources(names=None, sources_dir=DEFAULT_SOURCES_DIR, sources=SOURCES, max_age=0,
+                  workers=8, timeout=60):
+    """
+    Fetch the named sources (default: all) concurrently.
+
+    Sources checked less than max_age seconds ago are not requested at all.
+    Returns the list of per-source reports, in the order requested.
+    """
+    names = list(names or sources)
+    os.makedirs(sources_dir, exist_ok=True)
+    metadata = load_metadata(sources_dir)
+    reports = {}
+    pending = []
+    now = time.time()
+    for name in names:
+        source = sources[name]
+        entry = metadata.get(name)
+        if entry and entry.get('url') != source['url']:
+            entry = None
+        path = os.path.join(sources_dir, source['filename'])
+        if max_age and entry and os.path.exists(path) and now - entry.get('checked_at', 0) < max_age:
+            reports[name] = {'name': name, 'url': source['url'], 'path': path, 'status': STATUS_FRESH,
+                             'received': 0, 'written': 0, 'seconds': 0.0}
+        else:
+            pending.append((name, source, entry))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending) or 1))) as executor:
+        futures = {executor.submit(fetch_source, name, source, sources_dir, entry, timeout): name
+                   for name, source, entry in pending}
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]
+            entry, report = future.result()
+            if entry:
+                metadata[name] = entry
+            reports[name] = report
+    save_metadata(sources_dir, metadata)
+
+    for name in names:
+        report = reports[name]
+        report['available'] = os.path.exists(report['path'])
+    return [reports[name] for name in names]
+
+
+def format_report(report):
+    seconds = report['seconds']
+    rate = f", {report['received'] / seconds / 1e6:.1f} MB/s" if report['received'] and seconds else ''
+    line = (f"  -> {report['name']}: {report['status']}, {report['received']} bytes received, "
+            f"{report['written']} written in {seconds:.2f}s{rate}")
+    if report.get('error'):
+        line += f" ({report['error']}{', using previous copy' if report['available'] else ''})"
+    return line
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Fetch upstream data sources with conditional requests')
+    parser.add_argument('names', nargs='*', help=f"Sources to fetch (default: all of {', '.join(SOURCES)})")
+    parser.add_argument('-d', '--dir', default=DEFAULT_SOURCES_DIR, help='Sources directory (kept between runs)')
+    parser.add_argument('--url', action='append', default=[], help='NAME=URL override, e.g. for a local mirror')
+    parser.add_argument('--max-age', type=int, default=0,
+                        help='Skip sources checked less than this many seconds ago')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent downloads')
+    parser.add_argument('--timeout', type=float, default=60, help='Per-request timeout in seconds')
+    parser.add_argument('--json', help='Also write the report as JSON')
+
+    args = parser.parse_args()
+
+    sources = {name: dict(source) for name, source in SOURCES.items()}
+    for override in args.url:
+        name, sep, url = override.partition('=')
+        if not sep or name not in sources:
+            parser.error(f'--url expects NAME=URL with NAME one of {", ".join(sources)}')
+        sources[name]['url'] = url
+    unknown = [name for name in args.names if name not in sources]
+    if unknown:
+        parser.error(f'unknown source(s): {", ".join(unknown)}')
+
+    start = time.perf_counter()
+    reports = fetch_sources(args.names, sources_dir=args.dir, sources=sources, max_age=args.max_age,
+                            workers=args.workers, timeout=args.timeout)
+    for report in reports:
+        print(format_report(report), file=sys.stderr)
+    print(f"  -> {len(reports)} sources in {time.perf_counter() - start:.2f}s, "
+          f"{sum(r['received'] for r in reports)} bytes received", file=sys.stderr)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+    missing = [r['name'] for r in reports if sources[r['name']].get('required') and not r['available']]
+    if missing:
+        print(f"  !! Required source(s) unavailable: {', '.join(missing)}", file=sys.stderr)
+        sys.exit(1)
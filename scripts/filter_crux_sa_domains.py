@@ -16,142 +16,76 @@ Filtering Strategy:
 The output is a clean list of Saudi domains suitable for geosite:sa.
 """
 
-import csv
+import gzip
 import sys
 import os
-import re
-import socket
-import ipaddress
-import concurrent.futures
+import itertools
 from urllib.parse import urlparse
-from collections import defaultdict
+from collections import defaultdict, deque
+
+# Kept light so hooks can import the classifier cheaply: csv, json, DNS,
+# SQLite and multiprocessing modules are imported by the functions using them
+from keyword_matcher import KeywordMatcher, load_keywords
+from psl import DEFAULT_PSL_FILE, registrable_domain
+from table_cache import load_table
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
 
 # Saudi Arabia TLDs and sub-TLDs
 SA_TLDS = {'.sa', '.com.sa', '.gov.sa', '.edu.sa', '.org.sa', '.net.sa', '.med.sa', '.sch.sa'}
 
-# Global services to exclude (these are NOT Saudi even if popular in SA)
-GLOBAL_EXCLUDES = {
-    # Search & Tech Giants
-    'google.com', 'google.com.sa', 'googleapis.com', 'gstatic.com', 'googleusercontent.com',
-    'googlevideo.com', 'youtube.com', 'youtu.be', 'ytimg.com', 'ggpht.com',
-    'google.co', 'googleadservices.com', 'googlesyndication.com', 'googletagmanager.com',
-    'googleanalytics.com', 'google-analytics.com', 'doubleclick.net', 'goo.gl',
-    'facebook.com', 'fb.com', 'fbcdn.net', 'instagram.com', 'meta.com', 'whatsapp.com',
-    'twitter.com', 'x.com', 'twimg.com', 't.co',
-    'microsoft.com', 'live.com', 'outlook.com', 'office.com', 'office365.com',
-    'windows.com', 'windowsupdate.com', 'bing.com', 'msn.com', 'skype.com',
-    'linkedin.com', 'github.com', 'azure.com', 'azureedge.net', 'msecnd.net',
-    'apple.com', 'icloud.com', 'mzstatic.com', 'itunes.com',
-    'amazon.com', 'amazonaws.com', 'cloudfront.net', 'aws.amazon.com',
-    'tiktok.com', 'tiktokcdn.com', 'bytedance.com', 'musical.ly',
-    'snapchat.com', 'snap.com', 'sc-cdn.net',
-    'reddit.com', 'redd.it', 'redditstatic.com',
-    'wikipedia.org', 'wikimedia.org', 'wiktionary.org',
-    'yahoo.com', 'yimg.com',
-    
-    # CDN & Infrastructure
-    'cloudflare.com', 'cloudflare-dns.com', 'cdnjs.cloudflare.com',
-    'akamai.com', 'akamaized.net', 'akamaihd.net', 'akamaitechnologies.com',
-    'fastly.net', 'fastly.com', 'fastlylb.net',
-    'jsdelivr.net', 'unpkg.com', 'cdnjs.com',
-    'bootstrapcdn.com', 'fontawesome.com',
-    'maxcdn.com', 'stackpath.com',
-    'incapsula.com', 'imperva.com',
-    
-    # E-commerce (Global)
-    'ebay.com', 'aliexpress.com', 'alibaba.com', 'wish.com',
-    
-    # Streaming (Global)
-    'netflix.com', 'nflxvideo.net', 'nflximg.net', 'nflxext.com',
-    'spotify.com', 'scdn.co', 'spotifycdn.com',
-    'twitch.tv', 'twitchcdn.net',
-    'hulu.com', 'disneyplus.com', 'disney.com',
-    
-    # Gaming
-    'steampowered.com', 'steamcommunity.com', 'steamstatic.com',
-    'epicgames.com', 'unrealengine.com',
-    'roblox.com', 'rbxcdn.com',
-    
-    # Communication
-    'zoom.us', 'zoom.com', 'zoomcdn.com',
-    'telegram.org', 't.me', 'telegram.me',
-    'discord.com', 'discord.gg', 'discordapp.com',
-    'signal.org',
-    
-    # Ad/Tracking
-    'adsrvr.org', 'adnxs.com', 'criteo.com', 'criteo.net',
-    'outbrain.com', 'taboola.com', 'pubmatic.com',
-    'rubiconproject.com', 'openx.net', 'casalemedia.com',
-    'moatads.com', 'doubleverify.com', 'adsafeprotected.com',
-    'quantserve.com', 'scorecardresearch.com',
-    'hotjar.com', 'mouseflow.com', 'crazyegg.com',
-    'mixpanel.com', 'segment.com', 'amplitude.com',
-    'appsflyer.com', 'adjust.com', 'branch.io',
-    'onesignal.com', 'pushwoosh.com',
-    
-    # Fonts & Assets
-    'fonts.googleapis.com', 'fonts.gstatic.com',
-    'use.typekit.net', 'p.typekit.net',
-    
-    # Other Global
-    'wordpress.com', 'wp.com', 'wordpress.org',
-    'blogger.com', 'blogspot.com',
-    'medium.com',
-    'pinterest.com', 'pinimg.com',
-    'tumblr.com',
-    'quora.com',
-    'stackoverflow.com', 'stackexchange.com',
-    'paypal.com', 'paypalobjects.com',
-    'stripe.com', 'stripe.network',
-    'recaptcha.net', 'hcaptcha.com',
-    'sentry.io', 'sentry-cdn.com',
-    'intercom.io', 'intercomcdn.com',
-    'zendesk.com', 'zdassets.com',
-    'freshdesk.com', 'freshworks.com',
-    'hubspot.com', 'hsforms.com', 'hubspotusercontent.com',
-    'salesforce.com', 'force.com',
-    'shopify.com', 'myshopify.com', 'shopifycdn.com',
-    'wix.com', 'wixsite.com', 'wixstatic.com',
-    'squarespace.com', 'sqspcdn.com',
-    'godaddy.com', 'secureserver.net',
-    'namecheap.com',
-    'canva.com',
-    'figma.com',
-    'notion.so', 'notion.com',
-    'slack.com', 'slackcdn.com',
-    'trello.com',
-    'dropbox.com', 'dropboxusercontent.com',
-    'box.com', 'boxcdn.net',
-    'onedrive.com', 'sharepoint.com',
-    'drive.google.com', 'docs.google.com',
+# Lookup tables kept in data files and loaded on first use:
+#   GLOBAL_EXCLUDES      global services (NOT Saudi even if popular in SA)
+#   SA_KEYWORDS          Saudi-specific keywords that suggest a domain is Saudi-related
+#   KNOWN_SAUDI_DOMAINS  known Saudi companies with non-.sa domains
+# They remain available as module attributes (filter_crux_sa_domains.GLOBAL_EXCLUDES).
+TABLE_FILES = {
+    'GLOBAL_EXCLUDES': os.path.join(DATA_DIR, 'global-excludes.txt'),
+    'SA_KEYWORDS': os.path.join(DATA_DIR, 'sa-keywords.txt'),
+    'KNOWN_SAUDI_DOMAINS': os.path.join(DATA_DIR, 'known-saudi-domains.txt'),
 }
+_tables = {}
 
-# Saudi-specific keywords that suggest a domain is Saudi-related
-SA_KEYWORDS = {
-    'saudi', 'riyadh', 'jeddah', 'jidda', 'makkah', 'mecca', 'madinah', 'medina',
-    'dammam', 'khobar', 'dhahran', 'tabuk', 'taif', 'abha', 'najran', 'hail',
-    'jizan', 'jazan', 'yanbu', 'jubail', 'neom', 'kaec', 'qassim', 'buraidah',
-    'ksa', 'saudia', 'aramco', 'sabic', 'stc-', 'mobily', 'zain-sa',
-    'alrajhi', 'alinma', 'albilad', 'sabb-', 'riyadbank', 'bankalahli',
-    'tawakkalna', 'absher', 'nafath', 'sehhaty',
-    'haraj', 'jarir', 'panda-sa', 'tamimi',
-    'hungerstation', 'jahez', 'marsool', 'mrsool',
-}
 
-# Known Saudi companies with non-.sa domains
-KNOWN_SAUDI_DOMAINS = {
-    'noon.com', 'careem.com', 'hungerstation.com', 'argaam.com',
-    'sabq.org', 'alarabiya.net', 'aawsat.com', 'mbc.net',
-    'shahid.net', 'rotana.net', 'anghami.com', 'thmanyah.com',
-    'srmg.com', 'flynas.com', 'flyadeal.com', 'almosafer.com',
-    'aramex.com', 'fetchr.us', 'neom.com', 'aramco.com',
-    'saudiaramco.com', 'sabic.com', 'ithra.com',
-    'tawuniya.com', 'bupa.com', 'tamara.co', 'tabby.ai',
-    'moyasar.com', 'tap.company', 'hyperpay.com',
-    'namshi.com', 'ounass.com', 'fordeal.com',
-    'bayt.com', 'adslgate.com', 'jeeny.com',
-    'stcplay.gg', 'jawwy.tv',
-}
+def _table(name):
+    table = _tables.get(name)
+    if table is None:
+        table = load_table(TABLE_FILES[name])
+        if name == 'SA_KEYWORDS':
+            # Extended in place by add_sa_keywords()
+            table = set(table)
+        _tables[name] = table
+    return table
+
+
+def __getattr__(name):
+    if name in TABLE_FILES:
+        return _table(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+
+# Compiled on first use; see add_sa_keywords() for extending it
+_keyword_matcher = None
+
+
+def _get_keyword_matcher():
+    global _keyword_matcher
+    if _keyword_matcher is None:
+        _keyword_matcher = KeywordMatcher(_table('SA_KEYWORDS'))
+    return _keyword_matcher
+
+# Classification categories, in the order they are checked
+CATEGORY_SA_TLD = 'sa_tld'
+CATEGORY_EXCLUDED = 'excluded'
+CATEGORY_KNOWN = 'known_saudi'
+CATEGORY_KEYWORD = 'keyword'
+CATEGORY_REMAINING = 'remaining'
+
+# Bump when classify_domain() changes in a way the data-based fingerprint
+# below cannot see, so stale classification state is discarded
+CLASSIFIER_VERSION = 1
+
 
 
 def extract_domain(url):
@@ -170,26 +104,8 @@ def extract_domain(url):
 
 
 def get_registrable_domain(hostname):
-    """Get the registrable domain (eTLD+1) from a hostname."""
-    parts = hostname.split('.')
-    
-    # Handle .sa sub-TLDs
-    if len(parts) >= 3 and parts[-1] == 'sa' and parts[-2] in ('com', 'gov', 'edu', 'org', 'net', 'med', 'sch'):
-        return '.'.join(parts[-3:])
-    elif len(parts) >= 2 and parts[-1] == 'sa':
-        return '.'.join(parts[-2:])
-    
-    # Handle common two-part TLDs
-    two_part_tlds = {'co.uk', 'com.au', 'co.in', 'co.jp', 'com.br', 'co.za', 'com.eg', 'com.pk', 'co.id'}
-    if len(parts) >= 3:
-        potential_tld = '.'.join(parts[-2:])
-        if potential_tld in two_part_tlds:
-            return '.'.join(parts[-3:])
-    
-    # Default: last two parts
-    if len(parts) >= 2:
-        return '.'.join(parts[-2:])
-    return hostname
+    """Get the registrable domain (eTLD+1) from a hostname via the Public Suffix List."""
+    return registrable_domain(hostname)
 
 
 def is_sa_tld(domain):
@@ -200,55 +116,316 @@ def is_sa_tld(domain):
 def is_global_exclude(domain):
     """Check if domain is a known global service."""
     reg_domain = get_registrable_domain(domain)
-    return reg_domain in GLOBAL_EXCLUDES or domain in GLOBAL_EXCLUDES
+    excludes = _table('GLOBAL_EXCLUDES')
+    return reg_domain in excludes or domain in excludes
+
+
+def match_sa_keyword(domain):
+    """Return the Saudi-specific keyword found in domain, or None."""
+    return _get_keyword_matcher().search(domain)
 
 
 def has_sa_keyword(domain):
     """Check if domain contains Saudi-specific keywords."""
-    domain_lower = domain.lower()
-    for kw in SA_KEYWORDS:
-        if kw in domain_lower:
-            return True
-    return False
+    return _get_keyword_matcher().search(domain) is not None
+
+
+def add_sa_keywords(keywords_file):
+    """Extend SA_KEYWORDS with a keyword file and recompile the matcher."""
+    global _keyword_matcher
+    keywords = _table('SA_KEYWORDS')
+    keywords.update(load_keywords(keywords_file))
+    _keyword_matcher = KeywordMatcher(keywords)
+    return len(keywords)
 
 
 def is_known_saudi(domain):
     """Check if domain is a known Saudi company."""
     reg_domain = get_registrable_domain(domain)
-    return reg_domain in KNOWN_SAUDI_DOMAINS
+    return reg_domain in _table('KNOWN_SAUDI_DOMAINS')
+
+
+def open_text(path):
+    """Open a text file for reading, transparently decompressing gzip."""
+    with open(path, 'rb') as f:
+        is_gzip = f.read(2) == b'\x1f\x8b'
+    if is_gzip:
+        return gzip.open(path, 'rt', newline='')
+    return open(path, 'r', newline='')
+
+
+def iter_crux_rows(csv_file, max_rank=None, assume_sorted=False):
+    """
+    Stream (hostname, rank) pairs from a CrUX CSV as they are read.
+    
+    Rows ranked above max_rank are skipped. With assume_sorted (the file is
+    known to be ordered by rank bucket), reading stops at the first such row
+    instead.
+    """
+    import csv
+    
+    with open_text(csv_file) as f:
+        reader = csv.reader(f)
+        next(reader, None)  # skip header
+        for row in reader:
+            if len(row) < 2:
+                continue
+            try:
+                rank = int(row[1])
+            except ValueError:
+                continue
+            if max_rank is not None and rank > max_rank:
+                if assume_sorted:
+                    break
+                continue
+            
+            domain = extract_domain(row[0])
+            if domain:
+                yield domain, rank
+
+
+def classify_domain(domain, lap=None):
+    """
+    Return (category, registrable domain, reason) for a hostname.
+    
+    reason is the matched keyword for the keyword category, else None.
+    lap, if given, is called with each step's name as that step finishes
+    (sampled per-step timing, see run_metrics.StepTimer).
+    """
+    reg_domain = get_registrable_domain(domain)
+    if lap:
+        lap('psl')
+    
+    # Step 1: Include all .sa domains
+    found = is_sa_tld(domain)
+    if lap:
+        lap('sa_tld')
+    if found:
+        return CATEGORY_SA_TLD, reg_domain, None
+    
+    # Step 2: Exclude known global services
+    found = is_global_exclude(domain)
+    if lap:
+        lap('global_exclude')
+    if found:
+        return CATEGORY_EXCLUDED, reg_domain, None
+    
+    # Step 3: Include known Saudi companies
+    found = is_known_saudi(domain)
+    if lap:
+        lap('known_saudi')
+    if found:
+        return CATEGORY_KNOWN, reg_domain, None
+    
+    # Step 4: Include domains with Saudi keywords
+    keyword = match_sa_keyword(domain)
+    if lap:
+        lap('keyword')
+    if keyword:
+        return CATEGORY_KEYWORD, reg_domain, keyword
+    
+    # Step 5: Remaining domains need DNS check
+    return CATEGORY_REMAINING, reg_domain, None
+
+
+def iter_classified(rows, previous=None, current=None, step_timer=None):
+    """
+    Classify (hostname, rank) pairs into (category, registrable domain, rank, reason).
+    
+    previous maps hostname -> (category, registrable domain, reason) from an
+    earlier run; those hostnames are not classified again. If current is
+    given, it is filled with the classification of every hostname seen.
+    step_timer (a run_metrics.StepTimer) samples per-step timings.
+    """
+    for domain, rank in rows:
+        result = previous.get(domain) if previous else None
+        if result is None:
+            result = classify_domain(domain, step_timer.sample() if step_timer else None)
+        if current is not None:
+            current[domain] = result
+        category, reg_domain, reason = result
+        yield category, reg_domain, rank, reason
+
+
+class CategoryTally:
+    """
+    Best (lowest) rank per registrable domain for each kept category.
+    
+    Tallies built over disjoint parts of the input merge into the same
+    result regardless of order, which makes sharded classification
+    deterministic.
+    """
+    
+    def __init__(self, keep_remaining=False):
+        self.keep_remaining = keep_remaining
+        self.buckets = {
+            CATEGORY_SA_TLD: {},
+            CATEGORY_KNOWN: {},
+            CATEGORY_KEYWORD: {},
+            CATEGORY_REMAINING: {},
+        }
+        self.excluded = set()
+        self.keyword_hits = defaultdict(int)
+        self.total = 0
+        self.remaining_count = 0
+    
+    def add(self, category, reg_domain, rank, reason=None):
+        self.total += 1
+        if category == CATEGORY_KEYWORD:
+            self.keyword_hits[reason] += 1
+        elif category == CATEGORY_EXCLUDED:
+            self.excluded.add(reg_domain)
+            return
+        if category == CATEGORY_REMAINING:
+            self.remaining_count += 1
+            if not self.keep_remaining:
+                return
+        bucket = self.buckets[category]
+        if reg_domain not in bucket or rank < bucket[reg_domain]:
+            bucket[reg_domain] = rank
+    
+    def merge(self, other):
+        for category, bucket in self.buckets.items():
+            for reg_domain, rank in other.buckets[category].items():
+                if reg_domain not in bucket or rank < bucket[reg_domain]:
+                    bucket[reg_domain] = rank
+        self.excluded |= other.excluded
+        for keyword, hits in other.keyword_hits.items():
+            self.keyword_hits[keyword] += hits
+        self.total += other.total
+        self.remaining_count += other.remaining_count
+
+
+def _init_classify_worker(keywords):
+    """Pool initializer: apply keyword additions made in the parent (needed for spawn)."""
+    global _keyword_matcher
+    table = _table('SA_KEYWORDS')
+    if set(keywords) != table:
+        table.update(keywords)
+        _keyword_matcher = KeywordMatcher(table)
+
+
+def _classify_chunk(args):
+    """Worker: classify one chunk of (hostname, rank) rows into a tally (and host results if asked)."""
+    rows, keep_remaining, record_hosts = args
+    tally = CategoryTally(keep_remaining)
+    hosts = {} if record_hosts else None
+    for category, reg_domain, rank, reason in iter_classified(rows, current=hosts):
+        tally.add(category, reg_domain, rank, reason)
+    return tally, hosts
+
+
+def classify_parallel(rows, tally, processes, previous=None, current=None, chunk_size=20000):
+    """
+    Classify (hostname, rank) rows on a process pool, merging into tally.
+    
+    The input is cut into fixed-size chunks in read order; each worker
+    returns a compact per-chunk tally which is merged by best rank, so the
+    result matches the single-process run exactly. Hostnames found in
+    previous are tallied in the parent without being sent to a worker.
+    
+    chunks() runs on the pool's task-handler thread, so it only splits each
+    batch and queues the known rows; all tallying happens on this thread,
+    in result order.
+    """
+    import multiprocessing
+    
+    known_rows = deque()
+    
+    def chunks():
+        while True:
+            batch = list(itertools.islice(rows, chunk_size))
+            if not batch:
+                return
+            known = []
+            if previous:
+                fresh = []
+                for host, rank in batch:
+                    result = previous.get(host)
+                    if result is None:
+                        fresh.append((host, rank))
+                    else:
+                        known.append((host, rank, result))
+                batch = fresh
+            known_rows.append(known)
+            yield batch, tally.keep_remaining, current is not None
+    
+    with multiprocessing.Pool(processes, initializer=_init_classify_worker,
+                              initargs=(sorted(_table('SA_KEYWORDS')),)) as pool:
+        for part, hosts in pool.imap(_classify_chunk, chunks()):
+            # imap returns results in submission order, matching the queue
+            for host, rank, result in known_rows.popleft():
+                if current is not None:
+                    current[host] = result
+                tally.add(result[0], result[1], rank, result[2])
+            tally.merge(part)
+            if hosts:
+                current.update(hosts)
+
+
+def classifier_fingerprint():
+    """Hash of everything classify_domain() depends on besides the hostname."""
+    import hashlib
+    from build_manifest import file_digest
+    
+    h = hashlib.sha256(f"v{CLASSIFIER_VERSION}".encode())
+    for items in (SA_TLDS, _table('GLOBAL_EXCLUDES'), _table('KNOWN_SAUDI_DOMAINS'), _table('SA_KEYWORDS')):
+        h.update('\n'.join(sorted(items)).encode())
+        h.update(b'\0')
+    h.update((file_digest(DEFAULT_PSL_FILE) or '').encode())
+    return h.hexdigest()
+
+
+def load_classification_state(path):
+    """
+    Load hostname -> (category, registrable domain, reason) saved by a previous run.
+    
+    Returns an empty dict if the file is missing, unreadable, or was written
+    with different classification rules.
+    """
+    import json
+    
+    try:
+        with gzip.open(path, 'rt') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if state.get('fingerprint') != classifier_fingerprint():
+        print("  Classification state is from different rules, reclassifying everything", file=sys.stderr)
+        return {}
+    return {host: tuple(entry) for host, entry in state['hosts'].items()}
+
+
+def save_classification_state(path, hosts):
+    """Atomically write the hostname classifications for the next run."""
+    import json
+    
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with gzip.open(tmp, 'wt') as f:
+        json.dump({'fingerprint': classifier_fingerprint(), 'hosts': hosts}, f, separators=(',', ':'))
+    os.replace(tmp, path)
 
 
 def load_sa_ip_ranges(ip_file):
-    """Load Saudi IP ranges from a CIDR file."""
-    networks = []
+    """Load Saudi IP ranges from a CIDR file into a lookup index."""
+    from cidr_index import CidrIndex
+    
     try:
-        with open(ip_file) as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    try:
-                        networks.append(ipaddress.ip_network(line, strict=False))
-                    except ValueError:
-                        pass
+        return CidrIndex.from_file(ip_file)
     except FileNotFoundError:
-        pass
-    return networks
+        return CidrIndex()
 
 
 def is_saudi_ip(ip_str, sa_networks):
     """Check if an IP address is in Saudi ranges."""
-    try:
-        ip = ipaddress.ip_address(ip_str)
-        for net in sa_networks:
-            if ip in net:
-                return True
-    except ValueError:
-        pass
-    return False
+    return sa_networks.contains(ip_str)
 
 
 def resolve_domain(domain):
     """Resolve a domain to its IP addresses."""
+    import socket
+    
     try:
         results = socket.getaddrinfo(domain, None, socket.AF_UNSPEC, socket.SOCK_STREAM)
         ips = set()
@@ -259,133 +436,276 @@ def resolve_domain(domain):
         return []
 
 
-def filter_crux_domains(csv_file, sa_ip_file=None, output_file=None, resolve_dns=False, max_workers=50):
+def resolve_domains_threaded(domains, max_workers=50, observer=None):
+    """
+    Resolve domains with getaddrinfo on a thread pool; return domain -> DnsResult.
+    
+    observer, if given, is called as observer(domain, result, seconds) for
+    each finished lookup.
+    """
+    import time
+    import concurrent.futures
+    from async_dns import DnsResult
+    
+    results = {}
+    
+    def check_domain(domain):
+        start = time.perf_counter()
+        ips = resolve_domain(domain)
+        # getaddrinfo reports neither TTLs nor NXDOMAIN, so empty answers are treated as errors
+        return domain, DnsResult(ips, 0, 'ok' if ips else 'error'), time.perf_counter() - start
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(check_domain, d): d for d in domains}
+        done = 0
+        for future in concurrent.futures.as_completed(futures):
+            done += 1
+            if done % 1000 == 0:
+                print(f"    Resolved {done}/{len(domains)}...", file=sys.stderr)
+            try:
+                domain, result, seconds = future.result()
+                results[domain] = result
+            except Exception:
+                continue
+            if observer is not None:
+                observer(domain, result, seconds)
+    return results
+
+
+def resolve_domains_async(domains, server='8.8.8.8', timeout=2.0, retries=2, concurrency=1000, observer=None):
+    """
+    Resolve domains over UDP with the asyncio resolver; return domain -> DnsResult.
+    
+    observer is passed to DnsResolver (called per finished domain with its latency).
+    """
+    from async_dns import resolve_all, split_server
+    
+    def progress(done, total):
+        if done % 1000 == 0:
+            print(f"    Resolved {done}/{total}...", file=sys.stderr)
+    
+    host, port = split_server(server)
+    results = resolve_all(
+        domains,
+        progress=progress,
+        server=host,
+        port=port,
+        concurrency=concurrency,
+        timeout=timeout,
+        retries=retries,
+        observer=observer,
+    )
+    
+    statuses = defaultdict(int)
+    for result in results.values():
+        statuses[result.status] += 1
+    print(f"    DNS status: {dict(statuses)}", file=sys.stderr)
+    return results
+
+
+def filter_crux_domains(csv_file, sa_ip_file=None, output_file=None, resolve_dns=False, max_workers=50,
+                        resolver='system', dns_server='8.8.8.8', dns_timeout=2.0, dns_retries=2,
+                        dns_concurrency=1000, dns_cache_file=None, dns_cache_max=500000, max_rank=None,
+                        state_file=None, processes=1, metrics=None, with_ranks=False, assume_sorted=False):
     """
     Main filtering function.
     
     Args:
-        csv_file: Path to CrUX CSV file
+        csv_file: Path to CrUX CSV file (plain or gzip-compressed)
         sa_ip_file: Path to Saudi IP ranges file (CIDR format)
         output_file: Path to output file
         resolve_dns: Whether to resolve DNS for non-.sa domains
-        max_workers: Number of concurrent DNS resolution threads
+        max_workers: Number of concurrent DNS resolution threads (system resolver)
+        resolver: 'system' (getaddrinfo on threads) or 'async' (UDP DNS via asyncio)
+        dns_server: DNS server for the async resolver, as host or host:port
+        dns_timeout: Per-query timeout in seconds (async resolver)
+        dns_retries: Retries per timed-out query (async resolver)
+        dns_concurrency: Max domains in flight (async resolver)
+        dns_cache_file: SQLite DNS cache; only new or expired domains are resolved
+        dns_cache_max: Max entries kept in the DNS cache (LRU eviction)
+        max_rank: Skip origins whose CrUX rank bucket exceeds this value
+        state_file: Classification state from the previous run; only origins
+            not seen last time are classified, and the file is rewritten
+        processes: Classify on this many worker processes (1 = in-process)
+        metrics: run_metrics.RunMetrics to record per-phase timings, CSV read
+            time, sampled per-step classification time, category counts and
+            DNS latencies into (the caller writes it out)
+        with_ranks: Write "domain rank" lines (best CrUX rank bucket per
+            domain) instead of bare domains, for rank-tiered lists
+        assume_sorted: The CSV is ordered by rank, so reading can stop at the
+            first row past max_rank
     """
+    from run_metrics import LatencyHistogram, RunMetrics, StepTimer, TimedIterator
     
-    # Load Saudi IP ranges
-    sa_networks = load_sa_ip_ranges(sa_ip_file) if sa_ip_file else []
+    # Per-row instrumentation only runs when metrics were asked for;
+    # phase-level timing is cheap enough to always collect
+    instrumented = metrics is not None
+    if metrics is None:
+        metrics = RunMetrics()
     
-    # Read CrUX CSV
-    domains = {}  # domain -> rank
-    with open(csv_file, 'r') as f:
-        reader = csv.reader(f)
-        header = next(reader)  # skip header
-        for row in reader:
-            if len(row) < 2:
-                continue
-            origin = row[0]
-            try:
-                rank = int(row[1])
-            except ValueError:
-                continue
-            
-            domain = extract_domain(origin)
-            if not domain:
-                continue
-            
-            # Keep the best (lowest) rank
-            if domain not in domains or rank < domains[domain]:
-                domains[domain] = rank
-    
-    print(f"Total domains in CrUX: {len(domains)}", file=sys.stderr)
-    
-    # Categorize domains
-    sa_tld_domains = set()       # .sa TLD
-    keyword_domains = set()      # Saudi keywords
-    known_saudi = set()          # Known Saudi companies
-    dns_saudi = set()            # Resolved to Saudi IPs
-    excluded = set()             # Global services
-    remaining = set()            # Need DNS check
-    
-    for domain, rank in domains.items():
-        reg_domain = get_registrable_domain(domain)
-        
-        # Step 1: Include all .sa domains
-        if is_sa_tld(domain):
-            sa_tld_domains.add(reg_domain)
-            continue
-        
-        # Step 2: Exclude known global services
-        if is_global_exclude(domain):
-            excluded.add(domain)
-            continue
-        
-        # Step 3: Include known Saudi companies
-        if is_known_saudi(domain):
-            known_saudi.add(reg_domain)
-            continue
-        
-        # Step 4: Include domains with Saudi keywords
-        if has_sa_keyword(domain):
-            keyword_domains.add(reg_domain)
-            continue
-        
-        # Step 5: Remaining domains need DNS check
-        remaining.add(reg_domain)
+    with metrics.phase('load'):
+        # Load Saudi IP ranges
+        sa_networks = load_sa_ip_ranges(sa_ip_file) if sa_ip_file else []
+        previous = load_classification_state(state_file) if state_file else None
+    
+    # Stream and categorize CrUX rows, keeping the best (lowest) rank per
+    # registrable domain. Domains needing a DNS check are only kept when
+    # DNS resolution is enabled.
+    keep_remaining = resolve_dns and bool(sa_networks)
+    tally = CategoryTally(keep_remaining)
+    current = {} if state_file else None
+    with metrics.phase('classify', profile=True) as phase:
+        rows = iter_crux_rows(csv_file, max_rank=max_rank, assume_sorted=assume_sorted)
+        if instrumented:
+            rows = TimedIterator(rows)
+        step_timer = StepTimer() if instrumented and processes <= 1 else None
+        if processes > 1:
+            classify_parallel(rows, tally, processes, previous=previous, current=current)
+        else:
+            for category, reg_domain, rank, reason in iter_classified(rows, previous=previous, current=current,
+                                                                      step_timer=step_timer):
+                tally.add(category, reg_domain, rank, reason)
+        phase.rows = tally.total
+        if instrumented:
+            phase.extra['csv_read_seconds'] = round(rows.seconds, 6)
+        if step_timer is not None:
+            phase.extra['step_seconds_estimated'] = step_timer.estimate()
+            phase.extra['step_sample_rate'] = f"1/{step_timer.every}"
     
+    sa_tld_domains = tally.buckets[CATEGORY_SA_TLD]     # .sa TLD
+    known_saudi = tally.buckets[CATEGORY_KNOWN]         # Known Saudi companies
+    keyword_domains = tally.buckets[CATEGORY_KEYWORD]   # Saudi keywords
+    remaining = tally.buckets[CATEGORY_REMAINING]       # Need DNS check
+    excluded = tally.excluded                           # Global services
+    dns_saudi = set()                                   # Resolved to Saudi IPs
+    keyword_hits = tally.keyword_hits
+    total = tally.total
+    remaining_count = tally.remaining_count
+    
+    print(f"Total origins in CrUX: {total}" + (f" (rank <= {max_rank})" if max_rank else ''), file=sys.stderr)
+    if state_file:
+        with metrics.phase('state') as phase:
+            added = sum(1 for host in current if host not in previous)
+            dropped = sum(1 for host in previous if host not in current)
+            print(f"  Incremental: {len(current) - added} origins reused, {added} added (classified), "
+                  f"{dropped} dropped since last run", file=sys.stderr)
+            save_classification_state(state_file, current)
+            phase.rows = len(current)
+            phase.extra.update(reused=len(current) - added, added=added, dropped=dropped)
     print(f"  .sa TLD domains: {len(sa_tld_domains)}", file=sys.stderr)
     print(f"  Known Saudi: {len(known_saudi)}", file=sys.stderr)
     print(f"  Saudi keywords: {len(keyword_domains)}", file=sys.stderr)
+    if keyword_hits:
+        top = sorted(keyword_hits.items(), key=lambda item: (-item[1], item[0]))[:10]
+        print(f"    Top keywords: {', '.join(f'{kw}={n}' for kw, n in top)}", file=sys.stderr)
     print(f"  Global excluded: {len(excluded)}", file=sys.stderr)
-    print(f"  Remaining for DNS check: {len(remaining)}", file=sys.stderr)
+    if keep_remaining:
+        print(f"  Remaining for DNS check: {len(remaining)}", file=sys.stderr)
+    else:
+        print(f"  Remaining (not DNS-checked): {remaining_count} origins", file=sys.stderr)
+    metrics.set('categories', {
+        'origins': total,
+        CATEGORY_SA_TLD: len(sa_tld_domains),
+        CATEGORY_KNOWN: len(known_saudi),
+        CATEGORY_KEYWORD: len(keyword_domains),
+        CATEGORY_EXCLUDED: len(excluded),
+        'remaining_origins': remaining_count,
+    })
+    metrics.set('keyword_hits', dict(sorted(keyword_hits.items(), key=lambda item: (-item[1], item[0]))[:50]))
     
     # Step 6: DNS resolution for remaining domains (if enabled)
     if resolve_dns and sa_networks:
-        print(f"  Resolving DNS for {len(remaining)} domains...", file=sys.stderr)
-        
-        def check_domain(domain):
-            ips = resolve_domain(domain)
-            for ip in ips:
-                if is_saudi_ip(ip, sa_networks):
-                    return domain, True
-            return domain, False
+        from dns_cache import DnsCache
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(check_domain, d): d for d in remaining}
-            done = 0
-            for future in concurrent.futures.as_completed(futures):
-                done += 1
-                if done % 1000 == 0:
-                    print(f"    Resolved {done}/{len(remaining)}...", file=sys.stderr)
-                try:
-                    domain, is_saudi = future.result(timeout=10)
-                    if is_saudi:
-                        dns_saudi.add(domain)
-                except Exception:
-                    pass
+        latency = LatencyHistogram()
+        observe = (lambda domain, result, seconds: latency.add(seconds)) if instrumented else None
+        dns_metrics = {'resolver': resolver}
+        with metrics.phase('dns', profile=True) as phase:
+            cache = DnsCache(dns_cache_file, max_entries=dns_cache_max) if dns_cache_file else None
+            resolved_ips = {}
+            to_resolve = sorted(remaining)
+            if cache is not None:
+                cached, to_resolve = cache.lookup_many(to_resolve)
+                resolved_ips.update(cached)
+                print(f"  DNS cache: {len(cached)} fresh, {len(to_resolve)} new or expired", file=sys.stderr)
+            
+            print(f"  Resolving DNS for {len(to_resolve)} domains ({resolver} resolver)...", file=sys.stderr)
+            
+            if resolver == 'async':
+                results = resolve_domains_async(
+                    to_resolve,
+                    server=dns_server,
+                    timeout=dns_timeout,
+                    retries=dns_retries,
+                    concurrency=dns_concurrency,
+                    observer=observe,
+                )
+            else:
+                results = resolve_domains_threaded(to_resolve, max_workers=max_workers, observer=observe)
+            
+            for domain, result in results.items():
+                resolved_ips[domain] = result.ips
+            
+            if cache is not None:
+                cache.store_many((d, r.ips, r.ttl, r.status) for d, r in results.items())
+                stats = cache.stats()
+                print(f"  DNS cache: hit rate {stats['hit_rate']:.1%} ({stats['hits']} hits, "
+                      f"{stats['negative_hits']} negative, {stats['misses']} misses, {stats['expired']} expired, "
+                      f"{stats['evicted']} evicted, {stats['entries']} entries)", file=sys.stderr)
+                dns_metrics['cache'] = stats
+                cache.close()
+            
+            for domain, ips in resolved_ips.items():
+                if any(sa_networks.contains_many(ips)):
+                    dns_saudi.add(domain)
+            phase.rows = len(to_resolve)
         
+        statuses = defaultdict(int)
+        for result in results.values():
+            statuses[result.status] += 1
+        dns_metrics.update(queried=len(to_resolve), statuses=dict(statuses),
+                           timeouts=statuses.get('timeout', 0), errors=statuses.get('error', 0),
+                           saudi=len(dns_saudi))
+        if instrumented:
+            dns_metrics['latency'] = latency.to_dict()
+        metrics.set('dns', dns_metrics)
         print(f"  DNS-verified Saudi: {len(dns_saudi)}", file=sys.stderr)
     
-    # Combine all Saudi domains
-    all_saudi = sa_tld_domains | known_saudi | keyword_domains | dns_saudi
-    
-    # Sort and output
-    sorted_domains = sorted(all_saudi)
-    
-    print(f"\nTotal Saudi domains: {len(sorted_domains)}", file=sys.stderr)
-    
-    if output_file:
-        with open(output_file, 'w') as f:
-            f.write(f"# Saudi Arabia domains from CrUX Top Lists\n")
-            f.write(f"# Source: Chrome UX Report (CrUX) - Google BigQuery\n")
-            f.write(f"# Filtered from {len(domains)} total domains\n")
-            f.write(f"# .sa TLD: {len(sa_tld_domains)} | Known Saudi: {len(known_saudi)} | Keywords: {len(keyword_domains)} | DNS: {len(dns_saudi)}\n")
-            f.write(f"# Generated by filter_crux_sa_domains.py\n\n")
-            for d in sorted_domains:
-                f.write(d + '\n')
-        print(f"Written to {output_file}", file=sys.stderr)
-    else:
-        for d in sorted_domains:
-            print(d)
+    with metrics.phase('output') as phase:
+        # Combine all Saudi domains
+        all_saudi = sa_tld_domains.keys() | known_saudi.keys() | keyword_domains.keys() | dns_saudi
+        
+        # Sort and output
+        sorted_domains = sorted(all_saudi)
+        if with_ranks:
+            # Best rank over every category a domain was kept in
+            ranks = {}
+            for bucket in (sa_tld_domains, known_saudi, keyword_domains, remaining):
+                for domain, rank in bucket.items():
+                    if domain in all_saudi and rank < ranks.get(domain, rank + 1):
+                        ranks[domain] = rank
+            lines = [f"{d} {ranks[d]}" for d in sorted_domains]
+        else:
+            lines = sorted_domains
+        
+        print(f"\nTotal Saudi domains: {len(sorted_domains)}", file=sys.stderr)
+        
+        if output_file:
+            with open(output_file, 'w') as f:
+                f.write(f"# Saudi Arabia domains from CrUX Top Lists\n")
+                f.write(f"# Source: Chrome UX Report (CrUX) - Google BigQuery\n")
+                f.write(f"# Filtered from {total} total origins\n")
+                f.write(f"# .sa TLD: {len(sa_tld_domains)} | Known Saudi: {len(known_saudi)} | Keywords: {len(keyword_domains)} | DNS: {len(dns_saudi)}\n")
+                if with_ranks:
+                    f.write(f"# Format: domain best-CrUX-rank-bucket\n")
+                f.write(f"# Generated by filter_crux_sa_domains.py\n\n")
+                for line in lines:
+                    f.write(line + '\n')
+            print(f"Written to {output_file}", file=sys.stderr)
+        else:
+            for line in lines:
+                print(line)
+        phase.rows = len(sorted_domains)
     
     return sorted_domains
 
@@ -394,18 +714,63 @@ if __name__ == '__main__':
     import argparse
     
     parser = argparse.ArgumentParser(description='Filter CrUX top-lists for Saudi Arabia domains')
-    parser.add_argument('csv_file', help='Path to CrUX CSV file')
+    parser.add_argument('csv_file', help='Path to CrUX CSV file (.csv or .csv.gz)')
     parser.add_argument('-i', '--ip-file', help='Path to Saudi IP ranges file (CIDR)')
     parser.add_argument('-o', '--output', help='Output file path')
+    parser.add_argument('-k', '--keywords-file', help='Extra Saudi keywords file (one per line)')
+    parser.add_argument('--max-rank', type=int, help='Skip origins past this CrUX rank bucket (e.g. 10000)')
+    parser.add_argument('--assume-sorted', action='store_true',
+                        help='The CSV is ordered by rank: stop reading at the first row past --max-rank')
     parser.add_argument('--resolve-dns', action='store_true', help='Resolve DNS for non-.sa domains')
     parser.add_argument('--max-workers', type=int, default=50, help='Max DNS resolution threads')
+    parser.add_argument('--resolver', choices=['system', 'async'], default='system',
+                        help='DNS resolver: getaddrinfo threads or asyncio UDP')
+    parser.add_argument('--dns-server', default='8.8.8.8', help='DNS server for the async resolver (host or host:port)')
+    parser.add_argument('--dns-timeout', type=float, default=2.0, help='Per-query DNS timeout in seconds')
+    parser.add_argument('--dns-retries', type=int, default=2, help='Retries per timed-out DNS query')
+    parser.add_argument('--dns-concurrency', type=int, default=1000, help='Max domains resolved at once')
+    parser.add_argument('--dns-cache', help='Persistent SQLite DNS cache file (reused across runs)')
+    parser.add_argument('--dns-cache-max', type=int, default=500000, help='Max entries kept in the DNS cache')
+    parser.add_argument('--state', help='Classification state file (.json.gz); only new origins are classified')
+    parser.add_argument('--processes', type=int, default=1, help='Classify on N worker processes (0 = all cores)')
+    parser.add_argument('--with-ranks', action='store_true',
+                        help='Write "domain rank" lines with each domain\'s best CrUX rank bucket')
+    parser.add_argument('--metrics', help='Write per-phase timings, memory, counts and DNS latencies as JSON')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='Write cProfile and tracemalloc snapshots of the classify and DNS phases to DIR')
     
     args = parser.parse_args()
     
+    if args.keywords_file:
+        print(f"Loaded keywords: {add_sa_keywords(args.keywords_file)} total", file=sys.stderr)
+    
+    metrics = None
+    if args.metrics or args.profile:
+        from run_metrics import RunMetrics
+        metrics = RunMetrics(profile_dir=args.profile)
+    
     filter_crux_domains(
         args.csv_file,
         sa_ip_file=args.ip_file,
         output_file=args.output,
         resolve_dns=args.resolve_dns,
         max_workers=args.max_workers,
+        resolver=args.resolver,
+        dns_server=args.dns_server,
+        dns_timeout=args.dns_timeout,
+        dns_retries=args.dns_retries,
+        dns_concurrency=args.dns_concurrency,
+        dns_cache_file=args.dns_cache,
+        dns_cache_max=args.dns_cache_max,
+        max_rank=args.max_rank,
+        assume_sorted=args.assume_sorted,
+        state_file=args.state,
+        processes=args.processes or os.cpu_count() or 1,
+        metrics=metrics,
+        with_ranks=args.with_ranks,
     )
+    
+    if metrics is not None:
+        metrics_file = args.metrics or os.path.join(args.profile, 'metrics.json')
+        metrics.write(metrics_file)
+        print(f"Metrics written to {metrics_file}", file=sys.stderr)
@@ -5,8 +5,18 @@ Reads the generated domain and IP lists and produces a Karing-compatible JSON co
 """
 
 import json
+import math
 import sys
 import os
+from collections import defaultdict
+
+from psl import public_suffix, registrable_domain
+
+# Names too generic to use as a substring match
+GENERIC_WORDS = {'www', 'http', 'https', 'mail', 'smtp', 'imap', 'pop3', 'ftp', 'dns', 'api', 'app', 'web', 'cdn', 'img', 'static', 'dev', 'test', 'beta', 'admin', 'login', 'auth', 'shop', 'store', 'blog', 'news', 'info', 'help', 'support', 'docs', 'data', 'cloud', 'host', 'server', 'node', 'edge', 'proxy', 'vpn', 'ssl', 'tls'}
+
+# Rank assumed for domains missing from CrUX (the last 1M bucket)
+UNRANKED = 1000000
 
 
 def read_lines(filepath):
@@ -27,39 +37,165 @@ def extract_keywords(domains, min_length=4):
     """Extract unique keywords from domain names for domain_keyword matching."""
     keywords = set()
     for domain in domains:
-        # Remove TLD parts
-        parts = domain.split('.')
-        if len(parts) >= 2:
-            # Take the main domain name (second-level domain)
-            name = parts[0] if len(parts) == 2 else parts[-3] if parts[-1] == 'sa' and parts[-2] in ('com', 'gov', 'edu', 'org', 'net') else parts[0]
-            if len(name) >= min_length and not name.isdigit():
-                keywords.add(name)
+        # Take the label just left of the public suffix (example.com.sa -> example)
+        reg_domain = registrable_domain(domain)
+        if reg_domain == public_suffix(domain):
+            continue
+        name = reg_domain.split('.', 1)[0]
+        if len(name) >= min_length and not name.isdigit():
+            keywords.add(name)
     return sorted(keywords)
 
 
-def generate_karing_config(domains_file, ipv4_file, ipv6_file, output_file):
-    """Generate the Karing App JSON config."""
-    
-    # Read domain list
-    domains = read_lines(domains_file)
-    
-    # Read IP ranges
-    ipv4_cidrs = read_lines(ipv4_file)
-    ipv6_cidrs = read_lines(ipv6_file)
-    
-    # Extract keywords from domains
-    keywords = extract_keywords(domains)
-    
-    # Limit keywords to most important ones (avoid overly broad matching)
-    # Keep keywords that are at least 4 chars and not too generic
-    generic_words = {'www', 'http', 'https', 'mail', 'smtp', 'imap', 'pop3', 'ftp', 'dns', 'api', 'app', 'web', 'cdn', 'img', 'static', 'dev', 'test', 'beta', 'admin', 'login', 'auth', 'shop', 'store', 'blog', 'news', 'info', 'help', 'support', 'docs', 'data', 'cloud', 'host', 'server', 'node', 'edge', 'proxy', 'vpn', 'ssl', 'tls'}
-    keywords = [k for k in keywords if k not in generic_words and len(k) >= 4]
-    
-    # Cap at 300 keywords to keep the config manageable
-    if len(keywords) > 300:
-        keywords = keywords[:300]
+def rank_weight(rank):
+    """Traffic weight of a CrUX rank bucket: 4 for the top 1k, 1 for the 1M bucket."""
+    return math.log10(10 * UNRANKED / (rank or UNRANKED))
+
+
+def substring_hits(texts, candidates):
+    """
+    For each candidate keyword, total weight and count of texts containing it.
+
+    texts is an iterable of (text, weight). Rather than scanning every text
+    once per keyword, each text's substrings of the candidate lengths are
+    looked up in the candidate set.
+    """
+    lengths = sorted({len(k) for k in candidates})
+    weights = defaultdict(float)
+    counts = defaultdict(int)
+    for text, weight in texts:
+        found = set()
+        for length in lengths:
+            if length > len(text):
+                break
+            for i in range(len(text) - length + 1):
+                piece = text[i:i + length]
+                if piece in candidates:
+                    found.add(piece)
+        for keyword in found:
+            weights[keyword] += weight
+            counts[keyword] += 1
+    return weights, counts
+
+
+def drop_subsumed(keywords):
+    """Remove keywords that contain another keyword (the shorter one already matches them)."""
+    keywords = set(keywords)
+    kept = []
+    for keyword in sorted(keywords, key=len):
+        n = len(keyword)
+        covered = any(keyword[i:j] in keywords and keyword[i:j] != keyword
+                      for i in range(n) for j in range(i + 1, n + 1))
+        if not covered:
+            kept.append(keyword)
+        else:
+            keywords.discard(keyword)
+    return kept
+
+
+def select_keywords(domains, ranks=None, negatives=(), max_keywords=300, max_false_positives=0,
+                    min_length=4, exclude=GENERIC_WORDS):
+    """
+    Pick the domain_keyword list for the Karing config.
+
+    Candidates come from extract_keywords(). Each is scored by the
+    rank-weighted number of listed domains it matches. A candidate is
+    dropped if it matches more than max_false_positives of the non-Saudi
+    sample, or if it contains a shorter selected keyword. The best
+    max_keywords are returned.
+
+    Args:
+        domains: Saudi domain list
+        ranks: registrable domain -> CrUX rank (missing = UNRANKED)
+        negatives: Iterable of (non-Saudi domain, rank) used to estimate false positives
+        max_keywords: Cap on the returned list
+        max_false_positives: Most negative-sample domains a keyword may match
+        min_length: Shortest keyword allowed
+        exclude: Words never used as keywords
+
+    Returns (sorted keywords, report dict).
+    """
+    ranks = ranks or {}
+    candidates = {k for k in extract_keywords(domains, min_length=min_length) if k not in exclude}
+    coverage, matched = substring_hits(
+        ((d, rank_weight(ranks.get(registrable_domain(d)))) for d in domains), candidates)
+    negatives = list(negatives)
+    fp_weight, fp_count = substring_hits(((d, rank_weight(r)) for d, r in negatives), candidates)
+
+    accepted = [k for k in candidates if fp_count.get(k, 0) <= max_false_positives]
+    eligible = drop_subsumed(accepted)
+    eligible.sort(key=lambda k: (-(coverage[k] - fp_weight.get(k, 0.0)), k))
+    selected = eligible[:max_keywords]
+
+    # Combined reach of the final list over the Saudi list and the negative sample
+    final = set(selected)
+    _, hit_domains = substring_hits(((d, 1.0) for d in domains), final)
+    _, hit_negatives = substring_hits(((d, 1.0) for d, _ in negatives), final)
+    report = {
+        'candidates': len(candidates),
+        'fp_rejected': len(candidates) - len(accepted),
+        'selected': len(selected),
+        'keyword_matches': sum(hit_domains.values()),
+        'negative_sample': len(negatives),
+        'false_positive_keywords': sorted(k for k in selected if fp_count.get(k, 0)),
+        'negative_matches': sum(hit_negatives.values()),
+    }
+    return sorted(selected), report
+
+
+def read_crux_ranks(csv_file, domains):
+    """
+    Read a CrUX list into (ranks, negatives).
+
+    ranks maps registrable domain -> best rank; negatives lists
+    (hostname, rank) for origins not covered by the Saudi domain list,
+    used as the false-positive sample.
+    """
+    from filter_crux_sa_domains import iter_crux_rows
+
+    listed = set(domains)
+
+    def covered(host):
+        while host:
+            if host in listed:
+                return True
+            _, _, host = host.partition('.')
+        return False
+
+    ranks = {}
+    negatives = []
+    for host, rank in iter_crux_rows(csv_file):
+        reg_domain = registrable_domain(host)
+        if reg_domain not in ranks or rank < ranks[reg_domain]:
+            ranks[reg_domain] = rank
+        if not covered(host):
+            negatives.append((host, rank))
+    return ranks, negatives
+
+
+def karing_keywords(domains, crux_file=None, max_keywords=300, max_false_positives=0):
+    """Select the domain_keyword list, reporting its reach on stderr."""
+    # Rank keywords by CrUX traffic and coverage, and estimate false
+    # positives against the non-Saudi CrUX origins. Without CrUX data every
+    # domain weighs the same and only the global-exclude list is checked.
+    if crux_file and os.path.exists(crux_file):
+        ranks, negatives = read_crux_ranks(crux_file, domains)
+    else:
+        from filter_crux_sa_domains import GLOBAL_EXCLUDES
+        ranks, negatives = {}, [(d, None) for d in sorted(GLOBAL_EXCLUDES)]
     
-    config = {
+    keywords, report = select_keywords(domains, ranks=ranks, negatives=negatives,
+                                       max_keywords=max_keywords, max_false_positives=max_false_positives)
+    print(f"Keywords: {report['selected']} selected from {report['candidates']} candidates "
+          f"({report['fp_rejected']} rejected for false positives), matching {report['keyword_matches']} "
+          f"listed domains; {report['negative_matches']}/{report['negative_sample']} sampled non-Saudi "
+          f"domains would also match", file=sys.stderr)
+    return keywords
+
+
+def karing_config(keywords, ipv4_cidrs, ipv6_cidrs):
+    """The Karing App diversion rules as a dict."""
+    return {
         "rules": [
             {
                 "outbound": "direct",
@@ -204,6 +340,22 @@ def generate_karing_config(domains_file, ipv4_file, ipv6_file, output_file):
             }
         ]
     }
+
+
+def generate_karing_config(domains_file, ipv4_file, ipv6_file, output_file, crux_file=None,
+                           max_keywords=300, max_false_positives=0):
+    """Generate the Karing App JSON config."""
+    
+    # Read domain list
+    domains = read_lines(domains_file)
+    
+    # Read IP ranges
+    ipv4_cidrs = read_lines(ipv4_file)
+    ipv6_cidrs = read_lines(ipv6_file)
+    
+    keywords = karing_keywords(domains, crux_file=crux_file, max_keywords=max_keywords,
+                               max_false_positives=max_false_positives)
+    config = karing_config(keywords, ipv4_cidrs, ipv6_cidrs)
     
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(config, f, indent=2, ensure_ascii=False)
@@ -219,7 +371,12 @@ if __name__ == '__main__':
     parser.add_argument('--ipv4', required=True, help='Path to SA IPv4 CIDR list')
     parser.add_argument('--ipv6', required=True, help='Path to SA IPv6 CIDR list')
     parser.add_argument('-o', '--output', required=True, help='Output JSON file path')
+    parser.add_argument('--crux', help='CrUX CSV (.csv/.csv.gz) for rank weights and the false-positive sample')
+    parser.add_argument('--max-keywords', type=int, default=300, help='Cap on domain_keyword entries')
+    parser.add_argument('--max-false-positives', type=int, default=0,
+                        help='Most non-Saudi sample domains a keyword may match')
     
     args = parser.parse_args()
     
-    generate_karing_config(args.domains, args.ipv4, args.ipv6, args.output)
+    generate_karing_config(args.domains, args.ipv4, args.ipv6, args.output, crux_file=args.crux,
+                           max_keywords=args.max_keywords, max_false_positives=args.max_false_positives)
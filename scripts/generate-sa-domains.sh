@@ -7,6 +7,17 @@
 #   3. Saudi services and apps (data/sa-services-domains.txt)
 #   4. Bank domains from karenyousefi/bank-domains
 #   5. CrUX Top Lists (Chrome UX Report) - filtered for Saudi Arabia
+#
+# Environment:
+#   SKIP_DNS    Set to "false" to DNS-verify remaining CrUX domains (default: true)
+#   DNS_SERVER  Resolver used for DNS verification (default: 8.8.8.8)
+#   DNS_CACHE   Persistent DNS result cache (default: .cache/crux-dns-cache.sqlite)
+#   CRUX_STATE  CrUX classification state; only origins new since the last
+#               run are classified (default: .cache/crux-state.json.gz)
+#   SOURCES_DIR Downloaded upstream sources, kept between runs for
+#               conditional requests (default: .cache/sources)
+#   KEEP_CATEGORIES  Set to "true" to keep gov/bank/services entries listed in
+#                    domains/sa.txt even when a suffix covers them (default: false)
 
 set -euo pipefail
 
@@ -14,9 +25,16 @@ echo "==> Generating Saudi Arabia domain list..."
 
 mkdir -p domains
 
-# --- Source 1: Download bank domains for SA ---
-echo "  -> Fetching Saudi bank domains..."
-curl -sSL "https://raw.githubusercontent.com/karenyousefi/bank-domains/main/sa/list.txt" -o sa-banks.txt 2>/dev/null || echo "" > sa-banks.txt
+# Download the bank list and CrUX data concurrently; unchanged sources are
+# not re-downloaded, and sources checked within the last hour are skipped
+SOURCES_DIR="${SOURCES_DIR:-.cache/sources}"
+echo "  -> Fetching upstream sources..."
+python3 ./scripts/fetch_sources.py banks crux --dir "$SOURCES_DIR" --max-age 3600 || true
+CRUX_FILE="$SOURCES_DIR/crux-sa-latest.csv.gz"
+
+# --- Source 1: Saudi bank domains (karenyousefi/bank-domains) ---
+echo "  -> Loading Saudi bank domains..."
+cat "$SOURCES_DIR/sa-banks.txt" > sa-banks.txt 2>/dev/null || echo "" > sa-banks.txt
 
 # --- Source 2: Curated Saudi domains (maintained in this repo) ---
 echo "  -> Loading curated Saudi domains..."
@@ -40,20 +58,29 @@ else
   echo "     CrUX domains file not found, skipping"
 fi
 
-# --- Source 6: Try to fetch latest CrUX data from upstream ---
+# --- Source 6: Latest CrUX data (downloaded above) ---
 echo "  -> Checking for updated CrUX data..."
 if command -v python3 &>/dev/null && [ -f ./scripts/filter_crux_sa_domains.py ]; then
-  CRUX_URL="https://raw.githubusercontent.com/InternetHealthReport/crux-top-lists-country/refs/heads/main/data/SA/latest.csv.gz"
-  if curl -sSL --fail "$CRUX_URL" -o /tmp/crux-sa-latest.csv.gz 2>/dev/null; then
-    gunzip -f /tmp/crux-sa-latest.csv.gz 2>/dev/null || true
-    if [ -f /tmp/crux-sa-latest.csv ] && [ -s /tmp/crux-sa-latest.csv ]; then
+  if [ -f "$CRUX_FILE" ]; then
+    # The filter streams the gzip file directly; no need to decompress to disk
+    if [ -s "$CRUX_FILE" ]; then
       echo "     Running CrUX filter pipeline..."
       if [ -f ./sa-ips/sa-all.txt ]; then
-        python3 ./scripts/filter_crux_sa_domains.py /tmp/crux-sa-latest.csv \
+        DNS_ARGS=()
+        if [ "${SKIP_DNS:-true}" != "true" ]; then
+          echo "     DNS verification enabled (server: ${DNS_SERVER:-8.8.8.8})"
+          mkdir -p "$(dirname "${DNS_CACHE:-.cache/crux-dns-cache.sqlite}")"
+          DNS_ARGS=(--resolve-dns --resolver async --dns-server "${DNS_SERVER:-8.8.8.8}" \
+            --dns-cache "${DNS_CACHE:-.cache/crux-dns-cache.sqlite}")
+        fi
+        python3 ./scripts/filter_crux_sa_domains.py "$CRUX_FILE" \
           -i ./sa-ips/sa-all.txt \
+          "${DNS_ARGS[@]}" \
+          --state "${CRUX_STATE:-.cache/crux-state.json.gz}" \
           -o sa-crux-live.txt 2>/dev/null || true
       else
-        python3 ./scripts/filter_crux_sa_domains.py /tmp/crux-sa-latest.csv \
+        python3 ./scripts/filter_crux_sa_domains.py "$CRUX_FILE" \
+          --state "${CRUX_STATE:-.cache/crux-state.json.gz}" \
           -o sa-crux-live.txt 2>/dev/null || true
       fi
       if [ -s sa-crux-live.txt ]; then
@@ -88,6 +115,15 @@ grep -v '^#' sa-gov.txt 2>/dev/null | grep -v '^$' | tr '[:upper:]' '[:lower:]'
 grep -v '^#' sa-banks.txt 2>/dev/null | grep -v '^$' | tr '[:upper:]' '[:lower:]' | LC_ALL=C sort -u > domains/sa-bank.txt 2>/dev/null || true
 grep -v '^#' sa-services.txt 2>/dev/null | grep -v '^$' | tr '[:upper:]' '[:lower:]' | LC_ALL=C sort -u > domains/sa-services.txt 2>/dev/null || true
 
+# Drop domains already covered by a listed suffix (e.g. everything under "sa")
+echo "  -> Removing domains covered by a listed suffix..."
+KEEP_ARGS=()
+if [ "${KEEP_CATEGORIES:-false}" = "true" ]; then
+  KEEP_ARGS=(--keep domains/sa-gov.txt --keep domains/sa-bank.txt --keep domains/sa-services.txt)
+fi
+python3 ./scripts/dedup_domains.py domains/sa.txt "${KEEP_ARGS[@]}" \
+  --report domains/sa-dedup-report.txt -o domains/sa.txt
+
 echo "  -> Generated $(wc -l < domains/sa.txt) unique Saudi domains"
 echo "==> Done generating Saudi Arabia domain list"
 
@@ -10,34 +10,65 @@ echo "==> Generating Saudi Arabia IP ranges..."
 mkdir -p sa-ips
 
 # --- Source 1: RIPE NCC Delegated Statistics ---
+# Conditional download into .cache/sources/ (a 304 leaves the file as is);
+# skipped when already checked within the last hour, e.g. by the workflow
 echo "  -> Fetching RIPE NCC delegated stats..."
-curl -sSL "https://ftp.ripe.net/pub/stats/ripencc/delegated-ripencc-extended-latest" -o ripencc-delegated.txt
+SOURCES_DIR="${SOURCES_DIR:-.cache/sources}"
+python3 scripts/fetch_sources.py ripe --dir "$SOURCES_DIR" --max-age 3600
+RIPE_FILE="$SOURCES_DIR/ripencc-delegated.txt"
+
+# Stages below are skipped (outputs restored from .cache/) when their
+# inputs hash the same as on the previous run
+RIPE_DEPS=("$RIPE_FILE" scripts/ripe-to-cidr.py scripts/cidr_index.py)
 
 # Extract Saudi Arabia IPv4 allocations and convert to CIDR
 echo "  -> Extracting SA IPv4 ranges..."
-python3 scripts/ripe-to-cidr.py ripencc-delegated.txt SA ipv4 > sa-ips/sa-ipv4-ripe.txt
+python3 scripts/build_manifest.py run ripe-ipv4 --inputs "${RIPE_DEPS[@]}" --outputs sa-ips/sa-ipv4-ripe.txt \
+  -- sh -c "python3 scripts/ripe-to-cidr.py '$RIPE_FILE' SA ipv4 > sa-ips/sa-ipv4-ripe.txt"
 
 # Extract Saudi Arabia IPv6 allocations
 echo "  -> Extracting SA IPv6 ranges..."
-python3 scripts/ripe-to-cidr.py ripencc-delegated.txt SA ipv6 > sa-ips/sa-ipv6-ripe.txt
-
-# Combine IPv4 and IPv6
-cat sa-ips/sa-ipv4-ripe.txt sa-ips/sa-ipv6-ripe.txt | LC_ALL=C sort -u > sa-ips/sa-ripe.txt
+python3 scripts/build_manifest.py run ripe-ipv6 --inputs "${RIPE_DEPS[@]}" --outputs sa-ips/sa-ipv6-ripe.txt \
+  -- sh -c "python3 scripts/ripe-to-cidr.py '$RIPE_FILE' SA ipv6 > sa-ips/sa-ipv6-ripe.txt"
 
 echo "  -> Generated $(wc -l < sa-ips/sa-ipv4-ripe.txt) IPv4 CIDR blocks"
 echo "  -> Generated $(wc -l < sa-ips/sa-ipv6-ripe.txt) IPv6 CIDR blocks"
 
-# --- Source 2: Additional Saudi ISP/CDN IPs (manually maintained) ---
+MERGE_INPUTS=(sa-ips/sa-ipv4-ripe.txt sa-ips/sa-ipv6-ripe.txt)
+
+# --- Source 2: MaxMind GeoLite2 Country CSVs (when downloaded to geolite2/) ---
+GEOLITE2_DIR="${GEOLITE2_DIR:-geolite2}"
+if [ -f "$GEOLITE2_DIR/GeoLite2-Country-Locations-en.csv" ]; then
+  echo "  -> Extracting SA ranges from GeoLite2..."
+  GEOLITE2_FILES=("$GEOLITE2_DIR"/GeoLite2-Country-Locations-en.csv "$GEOLITE2_DIR"/GeoLite2-Country-Blocks-IPv*.csv)
+  python3 scripts/build_manifest.py run geolite2 \
+    --inputs "${GEOLITE2_FILES[@]}" scripts/geolite2_csv.py scripts/cidr_set.py \
+    --outputs sa-ips/sa-geolite2.txt \
+    -- python3 scripts/geolite2_csv.py --dir "$GEOLITE2_DIR" -o sa-ips/sa-geolite2.txt
+  MERGE_INPUTS+=(sa-ips/sa-geolite2.txt)
+fi
+
+# --- Source 3: Additional Saudi ISP/CDN IPs (manually maintained) ---
 echo "  -> Loading additional Saudi ISP IPs..."
 if [ -f ./data/sa-extra-ips.txt ]; then
-  cat ./data/sa-extra-ips.txt >> sa-ips/sa-ripe.txt
+  MERGE_INPUTS+=(./data/sa-extra-ips.txt)
+fi
+EXCLUDE_FILES=()
+if [ -f ./data/sa-exclude-ips.txt ]; then
+  EXCLUDE_FILES+=(./data/sa-exclude-ips.txt)
 fi
+EXCLUDE_ARGS=(--exclude-private)
+for file in "${EXCLUDE_FILES[@]}"; do
+  EXCLUDE_ARGS+=(--exclude "$file")
+done
 
-# Final sort and dedup
-LC_ALL=C sort -u sa-ips/sa-ripe.txt > sa-ips/sa-all.txt
+# Union all sources, subtract exclusions and collapse nested, overlapping
+# and adjacent prefixes into the minimal covering CIDR list
+echo "  -> Merging into minimal CIDR set..."
+python3 scripts/build_manifest.py run merge-ips \
+  --inputs "${MERGE_INPUTS[@]}" "${EXCLUDE_FILES[@]}" scripts/cidr_set.py scripts/cidr_index.py \
+  --outputs sa-ips/sa-all.txt \
+  -- python3 scripts/cidr_set.py "${MERGE_INPUTS[@]}" "${EXCLUDE_ARGS[@]}" -o sa-ips/sa-all.txt
 
 echo "  -> Total: $(wc -l < sa-ips/sa-all.txt) unique CIDR blocks"
 echo "==> Done generating Saudi Arabia IP ranges"
-
-# Cleanup
-rm -f ripencc-delegated.txt
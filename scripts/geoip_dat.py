@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+v2ray GeoIP (.dat) Writer and Reader
+====================================
+Writes geoip.dat files in the v2ray/Xray routercommon protobuf layout
+without the Go Loyalsoldier/geoip toolchain:
+
+    message CIDR      { bytes ip = 1; uint32 prefix = 2; }
+    message GeoIP     { string country_code = 1; repeated CIDR cidr = 2; }
+    message GeoIPList { repeated GeoIP entry = 1; }
+
+Each entry's CIDRs are collapsed into the minimal covering list, IPv4
+first, with 4-byte IPv4 and 16-byte IPv6 addresses.
+
+Usage:
+    python3 geoip_dat.py build --entry SA=sa-ips/sa-all.txt --private -o geoip-lite.dat --verify
+    python3 geoip_dat.py dump geoip-lite.dat SA
+"""
+
+import os
+import sys
+
+from cidr_index import intervals_to_cidrs, parse_cidr
+from cidr_set import CidrSet
+from mmdb import parse_entries
+
+WIRE_VARINT = 0
+WIRE_BYTES = 2
+
+
+def _varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _field_bytes(field, data):
+    return _varint((field << 3) | WIRE_BYTES) + _varint(len(data)) + data
+
+
+def _field_varint(field, value):
+    # proto3 omits fields holding the default value
+    if not value:
+        return b''
+    return _varint((field << 3) | WIRE_VARINT) + _varint(value)
+
+
+def encode_cidr(cidr):
+    """Encode one CIDR string as a CIDR message."""
+    version, first, last = parse_cidr(cidr)
+    width = 4 if version == 4 else 16
+    prefix = width * 8 - (last - first + 1).bit_length() + 1
+    return _field_bytes(1, first.to_bytes(width, 'big')) + _field_varint(2, prefix)
+
+
+def encode_geoip(code, cidrs):
+    """Encode a GeoIP message for one country code."""
+    out = bytearray(_field_bytes(1, code.upper().encode()))
+    for cidr in cidrs:
+        out += _field_bytes(2, encode_cidr(cidr))
+    return bytes(out)
+
+
+def write_geoip_dat(path, entries):
+    """
+    Write a GeoIPList.
+
+    entries is a list of (code, cidrs); each entry is collapsed to a minimal
+    CIDR list and entries are written sorted by code. Returns the file size.
+    """
+    out = bytearray()
+    for code, cidrs in sorted(entries, key=lambda entry: entry[0].upper()):
+        out += _field_bytes(1, encode_geoip(code, CidrSet(cidrs).to_cidrs()))
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(out)
+    os.replace(tmp, path)
+    return len(out)
+
+
+def _iter_fields(data):
+    """Yield (field number, wire type, value) from a protobuf message."""
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        field, wire = key >> 3, key & 7
+        if wire == WIRE_VARINT:
+            value, pos = _read_varint(data, pos)
+        elif wire == WIRE_BYTES:
+            length, pos = _read_varint(data, pos)
+            value = data[pos:pos + length]
+            pos += length
+        else:
+            raise ValueError(f'unsupported protobuf wire type {wire}')
+        yield field, wire, value
+
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def read_geoip_dat(path):
+    """Read a GeoIPList into {country code: [CIDR strings]}."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    entries = {}
+    for field, _, entry in _iter_fields(data):
+        if field != 1:
+            continue
+        code, cidrs = '', []
+        for sub_field, _, value in _iter_fields(entry):
+            if sub_field == 1:
+                code = bytes(value).decode()
+            elif sub_field == 2:
+                ip, prefix = b'', 0
+                for cidr_field, _, cidr_value in _iter_fields(value):
+                    if cidr_field == 1:
+                        ip = bytes(cidr_value)
+                    elif cidr_field == 2:
+                        prefix = cidr_value
+                version = 4 if len(ip) == 4 else 6
+                first = int.from_bytes(ip, 'big')
+                size = 1 << (len(ip) * 8 - prefix)
+                cidrs.extend(intervals_to_cidrs([(first, first + size - 1)], version))
+        entries[code] = cidrs
+    return entries
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Write and read v2ray geoip.dat files')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Build a geoip.dat from CIDR lists')
+    build.add_argument('--entry', action='append', default=[], help='CODE=FILE CIDR list (repeatable)')
+    build.add_argument('--private', action='store_true', help='Add a PRIVATE entry for special-purpose ranges')
+    build.add_argument('--verify', action='store_true', help='Re-read the file and compare every entry')
+    build.add_argument('-o', '--output', required=True, help='Output .dat file')
+
+    dump = sub.add_parser('dump', help='Print the CIDRs of one or all entries')
+    dump.add_argument('dat', help='geoip.dat file')
+    dump.add_argument('codes', nargs='*', help='Country codes (default: all)')
+
+    args = parser.parse_args()
+
+    if args.command == 'dump':
+        entries = read_geoip_dat(args.dat)
+        for code in args.codes or sorted(entries):
+            for cidr in entries.get(code.upper(), []):
+                print(f"{code.upper()}\t{cidr}")
+        sys.exit(0)
+
+    entries = parse_entries(args.entry, include_private=args.private)
+    if not entries:
+        parser.error('build needs at least one --entry or --private')
+    size = write_geoip_dat(args.output, entries)
+    counts = ', '.join(f"{code}={len(cidrs)}" for code, cidrs in entries)
+    print(f"  -> Wrote {args.output}: {counts}, {size} bytes", file=sys.stderr)
+
+    if args.verify:
+        decoded = read_geoip_dat(args.output)
+        expected = {code: CidrSet(cidrs) for code, cidrs in entries}
+        if {code: CidrSet(cidrs) for code, cidrs in decoded.items()} != expected:
+            print(f"  !! {args.output}: decoded entries do not match the input", file=sys.stderr)
+            sys.exit(1)
+        print(f"  -> Verified {args.output}", file=sys.stderr)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+GeoLite2 Country CSV Ingestion
+==============================
+Extracts one country's ranges from the MaxMind GeoLite2 Country CSV
+files, without the Go geoip converter:
+
+- The country's geoname_id(s) are looked up in
+  GeoLite2-Country-Locations-en.csv by ISO code
+- GeoLite2-Country-Blocks-IPv4.csv / -IPv6.csv (millions of rows) are
+  memory-mapped and scanned with one compiled regular expression that only
+  matches rows whose geoname_id is the country's (or, when geoname_id is
+  empty, whose registered_country_geoname_id is). The scan runs in C over
+  the whole file; only matching rows are turned into integer intervals,
+  so no per-row csv parsing or ipaddress objects are involved
+- The result can be unioned with other CIDR lists (the RIPE set) and is
+  written as a minimal CIDR list
+
+Usage:
+    python3 geolite2_csv.py --dir geolite2 -o sa-ips/sa-geolite2.txt
+    python3 geolite2_csv.py --dir geolite2 --merge sa-ips/sa-ipv4-ripe.txt \\
+        --merge sa-ips/sa-ipv6-ripe.txt -o merged.txt
+"""
+
+import os
+import re
+import csv
+import sys
+import mmap
+import socket
+
+from cidr_set import CidrSet, read_cidr_file
+
+LOCATIONS_FILE = 'GeoLite2-Country-Locations-en.csv'
+BLOCKS_FILES = {4: 'GeoLite2-Country-Blocks-IPv4.csv', 6: 'GeoLite2-Country-Blocks-IPv6.csv'}
+
+_FAMILIES = {4: (socket.AF_INET, 32), 6: (socket.AF_INET6, 128)}
+
+
+def find_geoname_ids(locations_file, country='SA'):
+    """geoname_ids whose country_iso_code is the given ISO code."""
+    country = country.upper()
+    with open(locations_file, newline='', encoding='utf-8') as f:
+        return sorted({row['geoname_id'] for row in csv.DictReader(f)
+                       if row.get('country_iso_code', '').upper() == country and row.get('geoname_id')})
+
+
+def block_pattern(geoname_ids):
+    """
+    Regex matching the network of Blocks rows located in the given geonames.
+
+    Columns are network,geoname_id,registered_country_geoname_id,...; a row
+    matches on geoname_id, or on the registered country when geoname_id is
+    empty (ranges MaxMind could not place more precisely).
+    """
+    ids = b'|'.join(re.escape(i.encode()) for i in geoname_ids)
+    # The registered id may end the line, or the file when it has no final newline
+    return re.compile(rb'^([0-9A-Fa-f.:]+/\d+),(?:(?:' + ids + rb'),|,(?:' + ids + rb')(?:[,\r\n]|\Z))', re.M)
+
+
+def network_interval(network, version):
+    """Inclusive integer interval of a network string such as b'5.42.224.0/19'."""
+    address, _, prefix = network.partition(b'/')
+    family, bits = _FAMILIES[version]
+    first = int.from_bytes(socket.inet_pton(family, address.decode()), 'big')
+    host_bits = bits - int(prefix)
+    first = first >> host_bits << host_bits
+    return first, first + (1 << host_bits) - 1
+
+
+def scan_blocks(blocks_file, version, geoname_ids):
+    """Return (rows scanned, [(version, first, last), ...]) for the matching rows of a Blocks file."""
+    pattern = block_pattern(geoname_ids)
+    with open(blocks_file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return 0, []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            rows = _count_rows(data)
+            entries = [(version, *network_interval(m.group(1), version)) for m in pattern.finditer(data)]
+    return rows, entries
+
+
+def _count_rows(data, chunk=1 << 20):
+    """Data rows in a mapped CSV file: lines, minus the header."""
+    lines = sum(data[i:i + chunk].count(b'\n') for i in range(0, len(data), chunk))
+    if data[-1:] != b'\n':
+        lines += 1
+    return max(0, lines - 1)
+
+
+def country_ranges(locations_file, blocks_files, country='SA'):
+    """
+    CidrSet of a country's GeoLite2 ranges plus a report dict.
+
+    blocks_files maps IP version -> Blocks CSV path; missing files are skipped.
+    """
+    geoname_ids = find_geoname_ids(locations_file, country)
+    report = {'country': country.upper(), 'geoname_ids': geoname_ids, 'rows': {}, 'matched': {}}
+    entries = []
+    if geoname_ids:
+        for version, path in sorted(blocks_files.items()):
+            if not os.path.exists(path):
+                continue
+            rows, found = scan_blocks(path, version, geoname_ids)
+            report['rows'][version] = rows
+            report['matched'][version] = len(found)
+            entries.extend(found)
+    return CidrSet(entries), report
+
+
+if __name__ == '__main__':
+    import time
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Extract a country\'s ranges from GeoLite2 Country CSV files')
+    parser.add_argument('-d', '--dir', default='geolite2', help='Directory holding the GeoLite2 Country CSVs')
+    parser.add_argument('--locations', help=f'Locations CSV (default: DIR/{LOCATIONS_FILE})')
+    parser.add_argument('--ipv4', help=f'IPv4 Blocks CSV (default: DIR/{BLOCKS_FILES[4]})')
+    parser.add_argument('--ipv6', help=f'IPv6 Blocks CSV (default: DIR/{BLOCKS_FILES[6]})')
+    parser.add_argument('-c', '--country', default='SA', help='ISO 3166-1 alpha-2 country code')
+    parser.add_argument('--merge', action='append', default=[], help='CIDR file to union with the result (repeatable)')
+    parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    locations = args.locations or os.path.join(args.dir, LOCATIONS_FILE)
+    blocks = {4: args.ipv4 or os.path.join(args.dir, BLOCKS_FILES[4]),
+              6: args.ipv6 or os.path.join(args.dir, BLOCKS_FILES[6])}
+    if not os.path.exists(locations):
+        parser.error(f'{locations} not found (download the GeoLite2 Country CSV archive first)')
+    ranges, report = country_ranges(locations, blocks, args.country)
+    if not report['geoname_ids']:
+        print(f"  !! No geoname_id for {report['country']} in {locations}", file=sys.stderr)
+    for version in sorted(report['rows']):
+        print(f"  -> IPv{version}: {report['matched'][version]} of {report['rows'][version]} rows "
+              f"in {report['country']}", file=sys.stderr)
+
+    result = ranges
+    if args.merge:
+        merged = CidrSet([entry for path in args.merge for entry in read_cidr_file(path)])
+        added = ranges - merged
+        print(f"  -> GeoLite2 adds {added.num_addresses(4)} IPv4 and {added.num_addresses(6)} IPv6 addresses "
+              f"not in {', '.join(args.merge)}", file=sys.stderr)
+        result = merged | ranges
+
+    cidrs = result.to_cidrs()
+    lines = ''.join(cidr + '\n' for cidr in cidrs)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        tmp = args.output + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(lines)
+        os.replace(tmp, args.output)
+    else:
+        sys.stdout.write(lines)
+    print(f"  -> {len(cidrs)} CIDR blocks in {time.perf_counter() - start:.2f}s", file=sys.stderr)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Multi-Pattern Keyword Matcher
+=============================
+Compiles a set of keywords into a single regular expression shaped like a
+trie (shared prefixes are factored out), so one scan over a domain name
+finds any of thousands of keywords without testing them one by one.
+
+Usage as a library:
+    matcher = KeywordMatcher({'riyadh', 'riyadbank', 'saudi'})
+    matcher.search('myriyadhshop.com')   # -> 'riyadh'
+
+Usage as a script (prints "<domain> <keyword>" for every matching domain):
+    python3 keyword_matcher.py -k data/sa-keywords.txt < domains.txt
+"""
+
+import re
+import sys
+
+
+def load_keywords(path):
+    """Read one keyword per line, skipping blank lines and # comments."""
+    keywords = set()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip().lower()
+            if line and not line.startswith('#'):
+                keywords.add(line)
+    return keywords
+
+
+def _build_trie(keywords):
+    root = {}
+    for kw in keywords:
+        node = root
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[''] = True
+    return root
+
+
+def _trie_to_pattern(node):
+    """Render a trie node as a regex that only accepts complete keywords."""
+    branches = [re.escape(ch) + _trie_to_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ''
+    is_end = '' in node
+    if len(branches) == 1 and not is_end:
+        return branches[0]
+    group = '(?:' + '|'.join(branches) + ')'
+    # Greedy optional group: prefer the longer keyword when both match
+    return group + '?' if is_end else group
+
+
+class KeywordMatcher:
+    """Finds which of a set of keywords occurs in a string, in one pass."""
+
+    def __init__(self, keywords):
+        self.keywords = frozenset(kw.lower() for kw in keywords if kw)
+        if self.keywords:
+            self._regex = re.compile(_trie_to_pattern(_build_trie(self.keywords)))
+        else:
+            self._regex = None
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_keywords(path))
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def search(self, text):
+        """Return the first keyword found in text (case-insensitive), or None."""
+        if self._regex is None:
+            return None
+        match = self._regex.search(text.lower())
+        return match.group(0) if match else None
+
+    def find_all(self, text):
+        """Return every non-overlapping keyword occurrence in text."""
+        if self._regex is None:
+            return []
+        return self._regex.findall(text.lower())
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Match domains from stdin against a keyword list')
+    parser.add_argument('-k', '--keywords-file', required=True, help='Keyword file (one per line)')
+
+    args = parser.parse_args()
+
+    matcher = KeywordMatcher.from_file(args.keywords_file)
+    print(f"Loaded {len(matcher)} keywords", file=sys.stderr)
+    for line in sys.stdin:
+        domain = line.strip()
+        keyword = matcher.search(domain) if domain else None
+        if keyword:
+            print(f"{domain} {keyword}")
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+MaxMind DB (.mmdb) Writer and Reader
+====================================
+Writes small country databases (e.g. Country-lite.mmdb with only SA and
+private ranges) in the MaxMind DB binary format, without the Go
+Loyalsoldier/geoip toolchain.
+
+The search tree is a binary trie over the 128-bit IPv6 space with IPv4
+stored under ::/96. Identical subtrees are shared: the IPv4 subtree is
+reached both from ::/96 and through the ::ffff:0:0/96 and 2002::/16
+aliases (as mmdbwriter does), and sibling records with the same data
+collapse into their parent. Every leaf points at one of a handful of
+{"country": {"iso_code": NAME}} records in the data section.
+
+Usage:
+    python3 mmdb.py build --entry SA=sa-ips/sa-all.txt --private -o Country-lite.mmdb --verify
+    python3 mmdb.py lookup Country-lite.mmdb 212.26.1.1 2a02:cf80::1
+"""
+
+import os
+import sys
+import mmap
+import time
+import socket
+import struct
+
+from cidr_index import ip_to_int, parse_cidr
+from cidr_set import PRIVATE_CIDRS, read_cidr_file
+
+METADATA_MARKER = b'\xab\xcd\xefMaxMind.com'
+DATA_SECTION_SEPARATOR = 16
+
+# Data section field types
+TYPE_EXTENDED = 0
+TYPE_POINTER = 1
+TYPE_STRING = 2
+TYPE_DOUBLE = 3
+TYPE_BYTES = 4
+TYPE_UINT16 = 5
+TYPE_UINT32 = 6
+TYPE_MAP = 7
+TYPE_INT32 = 8
+TYPE_UINT64 = 9
+TYPE_UINT128 = 10
+TYPE_ARRAY = 11
+TYPE_BOOLEAN = 14
+TYPE_FLOAT = 15
+
+# IPv6 prefixes that alias the IPv4 subtree (IPv4-mapped and 6to4)
+IPV4_ALIASES = [('::ffff:0:0', 96), ('2002::', 16)]
+
+# Tree references used while building: node index >= 0, EMPTY, or a data
+# record k encoded as -2 - k
+EMPTY = -1
+
+
+# ---------------------------------------------------------------------------
+# Data section encoding
+# ---------------------------------------------------------------------------
+
+def _control(type_id, size):
+    """Control byte(s) for a field of the given type and payload size."""
+    if size < 29:
+        head, extra = size, b''
+    elif size < 285:
+        head, extra = 29, bytes([size - 29])
+    elif size < 65821:
+        head, extra = 30, (size - 285).to_bytes(2, 'big')
+    else:
+        head, extra = 31, (size - 65821).to_bytes(3, 'big')
+    if type_id <= 7:
+        return bytes([(type_id << 5) | head]) + extra
+    return bytes([head, type_id - 7]) + extra
+
+
+def _encode_uint(type_id, value):
+    payload = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return _control(type_id, len(payload)) + payload
+
+
+def encode_value(value):
+    """
+    Encode a Python value as an MMDB data field.
+
+    dicts become maps, lists arrays, str strings, bool booleans, and ints
+    uint16/uint32/uint64 by magnitude. Wrap an int as (TYPE_*, value) to
+    force a specific integer type.
+    """
+    if isinstance(value, tuple):
+        return _encode_uint(*value)
+    if isinstance(value, bool):
+        return _control(TYPE_BOOLEAN, int(value))
+    if isinstance(value, int):
+        if value < 1 << 16:
+            return _encode_uint(TYPE_UINT16, value)
+        if value < 1 << 32:
+            return _encode_uint(TYPE_UINT32, value)
+        return _encode_uint(TYPE_UINT64, value)
+    if isinstance(value, str):
+        data = value.encode()
+        return _control(TYPE_STRING, len(data)) + data
+    if isinstance(value, bytes):
+        return _control(TYPE_BYTES, len(value)) + value
+    if isinstance(value, float):
+        return _control(TYPE_DOUBLE, 8) + struct.pack('>d', value)
+    if isinstance(value, dict):
+        out = bytearray(_control(TYPE_MAP, len(value)))
+        for key in sorted(value):
+            out += encode_value(str(key)) + encode_value(value[key])
+        return bytes(out)
+    if isinstance(value, list):
+        out = bytearray(_control(TYPE_ARRAY, len(value)))
+        for item in value:
+            out += encode_value(item)
+        return bytes(out)
+    raise TypeError(f'cannot encode {type(value).__name__} in MMDB')
+
+
+# ---------------------------------------------------------------------------
+# Search tree
+# ---------------------------------------------------------------------------
+
+def _to_ipv6_space(version, first, prefix_len):
+    """Map an IPv4 network into the ::/96 subtree of the 128-bit space."""
+    if version == 4:
+        return first, prefix_len + 96
+    return first, prefix_len
+
+
+def _network_of(cidr):
+    version, first, last = parse_cidr(cidr) if isinstance(cidr, str) else cidr
+    width = 32 if version == 4 else 128
+    prefix_len = width - (last - first + 1).bit_length() + 1
+    return _to_ipv6_space(version, first, prefix_len)
+
+
+class SearchTree:
+    """Mutable binary trie of 128-bit prefixes; later inserts override earlier ones."""
+
+    def __init__(self):
+        self.nodes = [[EMPTY, EMPTY]]
+
+    def _walk(self, network, depth):
+        """Return the node owning the record at (network, depth), creating nodes on the way."""
+        node = 0
+        for i in range(depth - 1):
+            bit = (network >> (127 - i)) & 1
+            child = self.nodes[node][bit]
+            if child < 0:
+                # Split a data/empty record: both halves inherit it
+                self.nodes.append([child, child])
+                child = len(self.nodes) - 1
+                self.nodes[node][bit] = child
+            node = child
+        return node
+
+    def insert(self, network, prefix_len, ref):
+        if prefix_len == 0:
+            raise ValueError('cannot insert the whole address space')
+        node = self._walk(network, prefix_len)
+        self.nodes[node][(network >> (128 - prefix_len)) & 1] = ref
+
+    def get(self, network, prefix_len):
+        """Reference stored at (network, prefix_len), splitting records as needed."""
+        node = self._walk(network, prefix_len)
+        return self.nodes[node][(network >> (128 - prefix_len)) & 1]
+
+    def alias_ipv4(self):
+        """Point the IPv4-mapped and 6to4 prefixes at the ::/96 IPv4 subtree."""
+        ipv4_root = self.get(0, 96)
+        for address, prefix_len in IPV4_ALIASES:
+            # Raw IPv6 value: ip_to_int() folds ::ffff:0:0/96 into IPv4
+            network = int.from_bytes(socket.inet_pton(socket.AF_INET6, address), 'big')
+            self.insert(network, prefix_len, ipv4_root)
+
+    def compact(self):
+        """
+        Share identical subtrees and collapse records whose children agree.
+
+        Returns a list of (left, right) records numbered breadth-first from
+        the root (node 0), with node references renumbered to match.
+        """
+        canonical = {}      # old node index -> canonical reference
+        interned = {}       # (left, right) -> canonical node id
+        shared = []         # canonical node id -> (left, right)
+        stack = [(0, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if node in canonical:
+                continue
+            left, right = self.nodes[node]
+            if not expanded:
+                stack.append((node, True))
+                for child in (left, right):
+                    if child >= 0 and child not in canonical:
+                        stack.append((child, False))
+                continue
+            left = canonical[left] if left >= 0 else left
+            right = canonical[right] if right >= 0 else right
+            if left == right and left < 0 and node != 0:
+                canonical[node] = left
+                continue
+            key = (left, right)
+            if key not in interned:
+                interned[key] = len(shared)
+                shared.append(key)
+            canonical[node] = interned[key]
+
+        # Renumber breadth-first so the root is node 0
+        root = canonical[0]
+        order = {root: 0}
+        queue = [root]
+        for node in queue:
+            for child in shared[node]:
+                if child >= 0 and child not in order:
+                    order[child] = len(queue)
+                    queue.append(child)
+        return [tuple(order[c] if c >= 0 else c for c in shared[node]) for node in queue]
+
+
+def _record_size(max_value):
+    for size in (24, 28, 32):
+        if max_value < 1 << size:
+            return size
+    raise ValueError('search tree too large for MMDB')
+
+
+def _pack_node(left, right, record_size):
+    if record_size == 24:
+        return left.to_bytes(3, 'big') + right.to_bytes(3, 'big')
+    if record_size == 28:
+        middle = ((left >> 24) << 4) | (right >> 24)
+        return (left & 0xFFFFFF).to_bytes(3, 'big') + bytes([middle]) + (right & 0xFFFFFF).to_bytes(3, 'big')
+    return left.to_bytes(4, 'big') + right.to_bytes(4, 'big')
+
+
+def write_mmdb(path, entries, database_type='GeoLite2-Country', description=None):
+    """
+    Write a country MMDB.
+
+    Args:
+        path: Output file
+        entries: List of (name, cidrs) in insertion order; a later entry wins
+            where networks overlap. cidrs may be strings or (version, first, last).
+        database_type: Metadata database_type (clients such as mihomo check it)
+        description: English description for the metadata
+
+    Returns (node_count, file size).
+    """
+    tree = SearchTree()
+    records = []
+    for name, cidrs in entries:
+        ref = -2 - len(records)
+        records.append(encode_value({'country': {'iso_code': name.upper()}}))
+        for cidr in cidrs:
+            tree.insert(*_network_of(cidr), ref)
+    tree.alias_ipv4()
+    nodes = tree.compact()
+    node_count = len(nodes)
+
+    offsets = []
+    data = bytearray()
+    for record in records:
+        offsets.append(len(data))
+        data += record
+
+    def resolve(ref):
+        if ref >= 0:
+            return ref
+        if ref == EMPTY:
+            return node_count
+        return node_count + DATA_SECTION_SEPARATOR + offsets[-2 - ref]
+
+    record_size = _record_size(node_count + DATA_SECTION_SEPARATOR + len(data))
+    metadata = {
+        'binary_format_major_version': (TYPE_UINT16, 2),
+        'binary_format_minor_version': (TYPE_UINT16, 0),
+        'build_epoch': (TYPE_UINT64, int(os.environ.get('SOURCE_DATE_EPOCH', time.time()))),
+        'database_type': database_type,
+        'description': {'en': description or f"{', '.join(name for name, _ in entries)} country database"},
+        'ip_version': (TYPE_UINT16, 6),
+        'languages': ['en'],
+        'node_count': (TYPE_UINT32, node_count),
+        'record_size': (TYPE_UINT16, record_size),
+    }
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(b''.join(_pack_node(resolve(l), resolve(r), record_size) for l, r in nodes))
+        f.write(b'\0' * DATA_SECTION_SEPARATOR)
+        f.write(data)
+        f.write(METADATA_MARKER)
+        f.write(encode_value(metadata))
+        size = f.tell()
+    os.replace(tmp, path)
+    return node_count, size
+
+
+# ---------------------------------------------------------------------------
+# Reader
+# ---------------------------------------------------------------------------
+
+class MmdbReader:
+    """Memory-mapped MMDB reader supporting lookups and metadata."""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        marker = self._buf.rfind(METADATA_MARKER)
+        if marker < 0:
+            self.close()
+            raise ValueError(f'{path}: not a MaxMind DB')
+        metadata_start = marker + len(METADATA_MARKER)
+        self.metadata, _ = self._decode(metadata_start, metadata_start)
+        self.node_count = self.metadata['node_count']
+        self.record_size = self.metadata['record_size']
+        self._node_bytes = self.record_size // 4
+        self._data_start = self.node_count * self._node_bytes + DATA_SECTION_SEPARATOR
+        self._ipv4_start = 0
+        if self.metadata['ip_version'] == 6:
+            node = 0
+            for _ in range(96):
+                if node >= self.node_count:
+                    break
+                node = self._record(node, 0)
+            self._ipv4_start = node
+
+    def close(self):
+        if getattr(self, '_buf', None) is not None:
+            self._buf.close()
+            self._buf = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _record(self, node, bit):
+        offset = node * self._node_bytes
+        buf = self._buf
+        if self.record_size == 24:
+            start = offset + 3 * bit
+            return int.from_bytes(buf[start:start + 3], 'big')
+        if self.record_size == 28:
+            middle = buf[offset + 3]
+            if bit:
+                return ((middle & 0x0F) << 24) | int.from_bytes(buf[offset + 4:offset + 7], 'big')
+            return ((middle >> 4) << 24) | int.from_bytes(buf[offset:offset + 3], 'big')
+        start = offset + 4 * bit
+        return int.from_bytes(buf[start:start + 4], 'big')
+
+    def _decode(self, offset, base):
+        """Decode the field at offset; pointers are relative to base. Returns (value, next offset)."""
+        buf = self._buf
+        ctrl = buf[offset]
+        offset += 1
+        type_id = ctrl >> 5
+        if type_id == TYPE_POINTER:
+            size = (ctrl >> 3) & 0x3
+            low = ctrl & 0x7
+            if size == 0:
+                pointer = (low << 8) | buf[offset]
+            elif size == 1:
+                pointer = ((low << 16) | int.from_bytes(buf[offset:offset + 2], 'big')) + 2048
+            elif size == 2:
+                pointer = ((low << 24) | int.from_bytes(buf[offset:offset + 3], 'big')) + 526336
+            else:
+                pointer = int.from_bytes(buf[offset:offset + 4], 'big')
+            value, _ = self._decode(base + pointer, base)
+            return value, offset + size + 1
+        if type_id == TYPE_EXTENDED:
+            type_id = buf[offset] + 7
+            offset += 1
+        size = ctrl & 0x1F
+        if size >= 29:
+            extra = size - 28
+            raw = int.from_bytes(buf[offset:offset + extra], 'big')
+            size = (29, 285, 65821)[extra - 1] + raw
+            offset += extra
+        if type_id == TYPE_MAP:
+            value = {}
+            for _ in range(size):
+                key, offset = self._decode(offset, base)
+                value[key], offset = self._decode(offset, base)
+            return value, offset
+        if type_id == TYPE_ARRAY:
+            value = []
+            for _ in range(size):
+                item, offset = self._decode(offset, base)
+                value.append(item)
+            return value, offset
+        if type_id == TYPE_BOOLEAN:
+            return bool(size), offset
+        payload = buf[offset:offset + size]
+        offset += size
+        if type_id == TYPE_STRING:
+            return payload.decode(), offset
+        if type_id in (TYPE_UINT16, TYPE_UINT32, TYPE_UINT64, TYPE_UINT128):
+            return int.from_bytes(payload, 'big'), offset
+        if type_id == TYPE_INT32:
+            return int.from_bytes(payload, 'big', signed=True), offset
+        if type_id == TYPE_DOUBLE:
+            return struct.unpack('>d', payload)[0], offset
+        if type_id == TYPE_FLOAT:
+            return struct.unpack('>f', payload)[0], offset
+        if type_id == TYPE_BYTES:
+            return bytes(payload), offset
+        raise ValueError(f'unsupported MMDB field type {type_id}')
+
+    def lookup(self, ip_str):
+        """Return the data record for an address, or None if it is not in the database."""
+        parsed = ip_to_int(ip_str)
+        if parsed is None:
+            raise ValueError(f'invalid IP address: {ip_str}')
+        version, value = parsed
+        bits = 32 if version == 4 else 128
+        node = self._ipv4_start if version == 4 else 0
+        for i in range(bits):
+            if node >= self.node_count:
+                break
+            node = self._record(node, (value >> (bits - 1 - i)) & 1)
+        if node == self.node_count:
+            return None
+        if node < self.node_count:
+            raise ValueError('search tree deeper than the address')
+        offset = self._data_start + node - self.node_count - DATA_SECTION_SEPARATOR
+        return self._decode(offset, self._data_start)[0]
+
+    def country(self, ip_str):
+        """ISO code stored for an address, or None."""
+        record = self.lookup(ip_str)
+        return record.get('country', {}).get('iso_code') if record else None
+
+
+def verify_mmdb(path, entries):
+    """Check the first and last address of every input network against the written file."""
+    from cidr_index import int_to_ip
+
+    expected = {}
+    for name, cidrs in entries:
+        for cidr in cidrs:
+            version, first, last = parse_cidr(cidr) if isinstance(cidr, str) else cidr
+            for address in (first, last):
+                expected[(version, address)] = name.upper()
+    mismatches = 0
+    with MmdbReader(path) as reader:
+        for (version, address), name in expected.items():
+            ip = int_to_ip(address, version)
+            if reader.country(ip) != name:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"  !! {ip}: expected {name}, got {reader.country(ip)}", file=sys.stderr)
+            # IPv4 addresses must also resolve through the IPv4-mapped alias
+            if version == 4 and reader.country('::ffff:' + ip) != name:
+                mismatches += 1
+    return mismatches
+
+
+def parse_entries(entry_args, include_private=False):
+    """Turn NAME=FILE arguments (plus optional PRIVATE) into (name, cidrs) entries."""
+    entries = []
+    for arg in entry_args:
+        name, _, path = arg.partition('=')
+        if not path:
+            raise ValueError(f'expected NAME=FILE, got {arg!r}')
+        entries.append((name.upper(), read_cidr_file(path)))
+    if include_private:
+        entries.append(('PRIVATE', [parse_cidr(c) for c in PRIVATE_CIDRS]))
+    return entries
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Write and query MaxMind DB country files')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Build a country MMDB from CIDR lists')
+    build.add_argument('--entry', action='append', default=[], help='NAME=FILE CIDR list (repeatable)')
+    build.add_argument('--private', action='store_true', help='Add a PRIVATE entry for special-purpose ranges')
+    build.add_argument('--database-type', default='GeoLite2-Country', help='Metadata database_type')
+    build.add_argument('--verify', action='store_true', help='Re-read the file and check every input network')
+    build.add_argument('-o', '--output', required=True, help='Output .mmdb file')
+
+    look = sub.add_parser('lookup', help='Print the country of each address')
+    look.add_argument('mmdb', help='MMDB file')
+    look.add_argument('ips', nargs='*', help='Addresses (default: read from stdin)')
+
+    args = parser.parse_args()
+
+    if args.command == 'lookup':
+        with MmdbReader(args.mmdb) as reader:
+            for ip in args.ips or (line.strip() for line in sys.stdin if line.strip()):
+                print(f"{ip}\t{reader.country(ip) or '-'}")
+        sys.exit(0)
+
+    entries = parse_entries(args.entry, include_private=args.private)
+    if not entries:
+        parser.error('build needs at least one --entry or --private')
+    started = time.perf_counter()
+    node_count, size = write_mmdb(args.output, entries, database_type=args.database_type)
+    elapsed = time.perf_counter() - started
+    counts = ', '.join(f"{name}={len(cidrs)}" for name, cidrs in entries)
+    print(f"  -> Wrote {args.output}: {counts}, {node_count} nodes, {size} bytes in {elapsed:.2f}s",
+          file=sys.stderr)
+
+    if args.verify:
+        mismatches = verify_mmdb(args.output, entries)
+        if mismatches:
+            print(f"  !! {args.output}: {mismatches} lookups did not match", file=sys.stderr)
+            sys.exit(1)
+        print(f"  -> Verified {args.output}", file=sys.stderr)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Public Suffix List Registrable-Domain Resolver
+==============================================
+Loads a local Public Suffix List snapshot (data/public_suffix_list.dat)
+into a reversed-label trie once, then computes the public suffix and the
+registrable domain (eTLD+1) of a hostname in O(labels). Results are
+memoized with an LRU cache because CrUX origins repeat the same hosts.
+
+Only the ICANN section is used by default: private entries such as
+blogspot.com or github.io would otherwise turn every user site into its
+own registrable domain and defeat the global-service excludes.
+
+Refresh the snapshot with:
+    curl -sSL https://publicsuffix.org/list/public_suffix_list.dat -o data/public_suffix_list.dat
+
+Usage as a script (prints "<hostname> <registrable domain>"):
+    python3 psl.py < hostnames.txt
+"""
+
+import os
+import sys
+import functools
+
+DEFAULT_PSL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'public_suffix_list.dat')
+
+# Trie node marker for "a rule ends at this label"
+_END = ''
+
+
+def _to_ascii(label):
+    """Convert a Unicode label to its punycode form (CrUX hosts are ASCII)."""
+    if label.isascii():
+        return label
+    try:
+        return label.encode('idna').decode('ascii')
+    except UnicodeError:
+        return label
+
+
+def parse_psl(lines, include_private=False):
+    """Yield the rules of a Public Suffix List file."""
+    for line in lines:
+        line = line.strip()
+        if line.startswith('// ===BEGIN PRIVATE DOMAINS===') and not include_private:
+            return
+        if not line or line.startswith('//'):
+            continue
+        yield line.split()[0].lower()
+
+
+class PublicSuffixList:
+    """Reversed-label trie over Public Suffix List rules."""
+
+    def __init__(self, rules):
+        self._root = {}
+        self.rule_count = 0
+        for rule in rules:
+            exception = rule.startswith('!')
+            labels = [_to_ascii(label) for label in rule.lstrip('!').split('.')]
+            node = self._root
+            for label in reversed(labels[1:] if exception else labels):
+                node = node.setdefault(label, {})
+            if exception:
+                node['!' + labels[0]] = True
+            else:
+                node[_END] = True
+            self.rule_count += 1
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_PSL_FILE, include_private=False):
+        with open(path, encoding='utf-8') as f:
+            return cls(parse_psl(f, include_private=include_private))
+
+    def suffix_length(self, labels):
+        """Number of trailing labels that form the public suffix."""
+        # Implicit "*" rule: an unlisted TLD is itself a public suffix
+        suffix_len = 1
+        node = self._root
+        for depth, label in enumerate(reversed(labels), 1):
+            if '!' + label in node:
+                return depth - 1
+            child = node.get(label)
+            wildcard = node.get('*')
+            if (child is not None and _END in child) or (wildcard is not None and _END in wildcard):
+                suffix_len = depth
+            node = child if child is not None else wildcard
+            if node is None:
+                break
+        return suffix_len
+
+    def public_suffix(self, hostname):
+        """Return the public suffix (eTLD) of a hostname."""
+        labels = hostname.lower().strip('.').split('.')
+        return '.'.join(labels[-self.suffix_length(labels):])
+
+    def registrable_domain(self, hostname):
+        """
+        Return the registrable domain (eTLD+1) of a hostname.
+
+        A hostname that is itself a public suffix is returned unchanged.
+        """
+        labels = hostname.lower().strip('.').split('.')
+        suffix_len = self.suffix_length(labels)
+        if len(labels) <= suffix_len:
+            return '.'.join(labels)
+        return '.'.join(labels[-(suffix_len + 1):])
+
+
+@functools.lru_cache(maxsize=1)
+def default_psl():
+    """The bundled ICANN Public Suffix List, loaded on first use."""
+    return PublicSuffixList.from_file(DEFAULT_PSL_FILE)
+
+
+@functools.lru_cache(maxsize=262144)
+def registrable_domain(hostname):
+    """Memoized eTLD+1 lookup against the bundled Public Suffix List."""
+    return default_psl().registrable_domain(hostname)
+
+
+@functools.lru_cache(maxsize=262144)
+def public_suffix(hostname):
+    """Memoized public suffix lookup against the bundled Public Suffix List."""
+    return default_psl().public_suffix(hostname)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Print the registrable domain of each hostname on stdin')
+    parser.add_argument('--psl', default=DEFAULT_PSL_FILE, help='Public Suffix List file')
+    parser.add_argument('--include-private', action='store_true', help='Also apply the PRIVATE section')
+
+    args = parser.parse_args()
+
+    psl = PublicSuffixList.from_file(args.psl, include_private=args.include_private)
+    print(f"Loaded {psl.rule_count} rules", file=sys.stderr)
+    for line in sys.stdin:
+        hostname = line.strip()
+        if hostname:
+            print(f"{hostname} {psl.registrable_domain(hostname)}")
@@ -1,96 +1,90 @@
 #!/usr/bin/env python3
 """
 Convert RIPE NCC delegated statistics to CIDR notation.
-Usage: python3 ripe-to-cidr.py <delegated-file> <country-code> <ipv4|ipv6>
+Usage: python3 ripe-to-cidr.py <delegated-file> <country-code> <ipv4|ipv6> [--no-collapse]
+
+All matching records are read in one batch, adjacent and overlapping
+allocations are collapsed, and the result is written as the minimal list
+of CIDR blocks covering them.
 """
 
 import sys
-import math
+import socket
+
+from cidr_index import intervals_to_cidrs, merge_intervals, range_to_cidrs
 
 
 def count_to_cidr_prefix(count):
     """Convert a host count to a CIDR prefix length."""
-    return 32 - int(math.log2(count))
+    return 33 - count.bit_length()
 
 
 def split_to_cidrs_v4(start_ip, count):
     """Split a range into valid CIDR blocks."""
-    cidrs = []
-    parts = list(map(int, start_ip.split('.')))
-    ip_num = (parts[0] << 24) + (parts[1] << 16) + (parts[2] << 8) + parts[3]
-    
-    remaining = count
-    current = ip_num
-    
-    while remaining > 0:
-        # Find the largest power of 2 that:
-        # 1. Is <= remaining
-        # 2. The current IP is aligned to
-        max_size = remaining
-        # Find alignment
-        if current != 0:
-            trailing_zeros = 0
-            temp = current
-            while temp & 1 == 0 and trailing_zeros < 32:
-                trailing_zeros += 1
-                temp >>= 1
-            max_alignment = 1 << trailing_zeros
-            max_size = min(max_size, max_alignment)
-        
-        # Find largest power of 2 <= max_size
-        size = 1
-        while size * 2 <= max_size:
-            size *= 2
-        
-        prefix = 32 - int(math.log2(size))
-        
-        # Convert back to dotted notation
-        a = (current >> 24) & 0xFF
-        b = (current >> 16) & 0xFF
-        c = (current >> 8) & 0xFF
-        d = current & 0xFF
-        
-        cidrs.append(f"{a}.{b}.{c}.{d}/{prefix}")
-        
-        current += size
-        remaining -= size
-    
-    return cidrs
+    first = int.from_bytes(socket.inet_pton(socket.AF_INET, start_ip), 'big')
+    return range_to_cidrs(first, first + count - 1, 4)
 
 
-def main():
-    if len(sys.argv) != 4:
-        print(f"Usage: {sys.argv[0]} <delegated-file> <country-code> <ipv4|ipv6>", file=sys.stderr)
-        sys.exit(1)
-    
-    delegated_file = sys.argv[1]
-    country_code = sys.argv[2].upper()
-    ip_version = sys.argv[3].lower()
-    
+def read_delegated_intervals(delegated_file, country_code, ip_version):
+    """
+    Read every matching allocation as an inclusive (first, last) integer interval.
+
+    IPv4 records carry a host count; IPv6 records carry a prefix length.
+    """
+    family = socket.AF_INET if ip_version == 'ipv4' else socket.AF_INET6
+    intervals = []
     with open(delegated_file, 'r') as f:
         for line in f:
-            line = line.strip()
-            if not line or line.startswith('#'):
+            if line.startswith('#'):
                 continue
-            
-            parts = line.split('|')
-            if len(parts) < 7:
+            parts = line.rstrip('\n').split('|')
+            if len(parts) < 7 or parts[1] != country_code or parts[2] != ip_version:
                 continue
             
-            registry, cc, record_type, start, value, date, status = parts[0], parts[1], parts[2], parts[3], parts[4], parts[5], parts[6] if len(parts) > 6 else ''
-            
-            if cc != country_code:
+            try:
+                first = int.from_bytes(socket.inet_pton(family, parts[3]), 'big')
+                value = int(parts[4])
+                if ip_version == 'ipv4':
+                    last = first + value - 1
+                    if value <= 0 or last >= 1 << 32:
+                        raise ValueError(f"bad host count {value}")
+                else:
+                    if not 0 <= value <= 128:
+                        raise ValueError(f"bad prefix length {value}")
+                    size = 1 << (128 - value)
+                    first &= ~(size - 1)
+                    last = first + size - 1
+            except (OSError, ValueError):
                 continue
             
-            if ip_version == 'ipv4' and record_type == 'ipv4':
-                count = int(value)
-                cidrs = split_to_cidrs_v4(start, count)
-                for cidr in cidrs:
-                    print(cidr)
-            
-            elif ip_version == 'ipv6' and record_type == 'ipv6':
-                prefix_len = value
-                print(f"{start}/{prefix_len}")
+            intervals.append((first, last))
+    return intervals
+
+
+def main():
+    args = [a for a in sys.argv[1:] if a != '--no-collapse']
+    if len(args) != 3:
+        print(f"Usage: {sys.argv[0]} <delegated-file> <country-code> <ipv4|ipv6> [--no-collapse]", file=sys.stderr)
+        sys.exit(1)
+    
+    delegated_file = args[0]
+    country_code = args[1].upper()
+    ip_version = args[2].lower()
+    collapse = '--no-collapse' not in sys.argv
+    version = 4 if ip_version == 'ipv4' else 6
+    
+    intervals = read_delegated_intervals(delegated_file, country_code, ip_version)
+    
+    if collapse:
+        cidrs = intervals_to_cidrs(intervals, version)
+    else:
+        cidrs = []
+        for first, last in intervals:
+            cidrs.extend(range_to_cidrs(first, last, version))
+    
+    print(f"  {country_code} {ip_version}: {len(intervals)} records -> {len(cidrs)} CIDR blocks "
+          f"({len(merge_intervals(intervals))} merged ranges)", file=sys.stderr)
+    sys.stdout.write(''.join(cidr + '\n' for cidr in cidrs))
 
 
 if __name__ == '__main__':
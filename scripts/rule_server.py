@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+SA Rule Server
+==============
+Small asyncio HTTP/1.1 server for distributing release files to a fleet
+of routers without every client re-downloading every artifact.
+
+    GET /<file>             Release file with a strong ETag (from <file>.sha256sum),
+                            If-None-Match -> 304, precompressed .br/.gz variants
+                            chosen by Accept-Encoding, and single Range requests
+    GET /version            Latest snapshot version
+    GET /delta?since=<v>    JSON of domains and CIDRs added/removed since snapshot v
+
+Snapshots are copies of the domain and CIDR lists kept per build under a
+history directory (see the snapshot command); /delta diffs the requested
+snapshot against the newest one.
+
+Usage:
+    python3 rule_server.py precompress release/
+    python3 rule_server.py snapshot --history history --version 202610170000 \\
+        --domains domains/sa.txt --ips sa-ips/sa-all.txt
+    python3 rule_server.py serve release/ --history history --port 8080
+"""
+
+import os
+import sys
+import gzip
+import json
+import shutil
+import asyncio
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from cidr_set import CidrSet, read_cidr_file
+from dedup_domains import read_domains
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SNAPSHOT_DOMAINS = 'domains.txt'
+SNAPSHOT_IPS = 'ips.txt'
+
+# Preferred order when a client accepts several encodings
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+MAX_HEADER_BYTES = 16384
+DELTA_CACHE_SIZE = 32
+
+REASONS = {
+    200: 'OK', 206: 'Partial Content', 304: 'Not Modified', 400: 'Bad Request',
+    404: 'Not Found', 405: 'Method Not Allowed', 416: 'Range Not Satisfiable',
+}
+
+
+# ---------------------------------------------------------------------------
+# Release directory helpers
+# ---------------------------------------------------------------------------
+
+def precompress(root, min_size=256):
+    """
+    Write .gz (and .br when the brotli module is installed) next to each release file.
+
+    Variants are only rewritten when older than their source. Returns the
+    number of files written.
+    """
+    written = 0
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if (not os.path.isfile(path) or name.endswith(('.gz', '.br', '.sha256sum'))
+                or os.path.getsize(path) < min_size):
+            continue
+        mtime = os.path.getmtime(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        variants = [('.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', lambda d: brotli.compress(d, quality=11)))
+        for suffix, compress in variants:
+            target = path + suffix
+            if os.path.exists(target) and os.path.getmtime(target) >= mtime:
+                continue
+            compressed = compress(data)
+            if len(compressed) >= len(data):
+                # Not worth serving; drop a variant left from an older source
+                if os.path.exists(target):
+                    os.remove(target)
+                continue
+            with open(target, 'wb') as f:
+                f.write(compressed)
+            written += 1
+    return written
+
+
+def file_etag(path):
+    """Strong ETag for a release file: its sha256sum file if present, else a fresh hash."""
+    try:
+        with open(path + '.sha256sum') as f:
+            digest = f.read().split()[0]
+        if len(digest) == 64:
+            return f'"{digest}"'
+    except (FileNotFoundError, IndexError):
+        pass
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return f'"{h.hexdigest()}"'
+
+
+def accepted_encodings(header):
+    """
+    Content codings an Accept-Encoding header allows, lowercased.
+
+    Codings with q=0 are refused; "*" stands for every coding in ENCODINGS
+    that is not refused by name.
+    """
+    allowed, refused = set(), set()
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        (allowed if q > 0 else refused).add(coding.lower())
+    if '*' in allowed:
+        allowed |= {name for name, _ in ENCODINGS} - refused
+    return allowed
+
+
+def parse_range(header, size):
+    """
+    Parse a single "bytes=" range into (start, end) inclusive.
+
+    Returns None when the header should be ignored (multiple or malformed
+    ranges) and 'unsatisfiable' when it cannot be served.
+    """
+    if not header.startswith('bytes=') or ',' in header:
+        return None
+    first, _, last = header[6:].strip().partition('-')
+    try:
+        if not first:
+            length = int(last)
+            if length == 0:
+                return 'unsatisfiable'
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return 'unsatisfiable'
+    return start, min(end, size - 1)
+
+
+# ---------------------------------------------------------------------------
+# Snapshots and deltas
+# ---------------------------------------------------------------------------
+
+def take_snapshot(history, version, domains_file, ips_file, keep=None):
+    """Copy the current lists into history/<version>, keeping the newest `keep` snapshots."""
+    target = os.path.join(history, version)
+    os.makedirs(target, exist_ok=True)
+    shutil.copyfile(domains_file, os.path.join(target, SNAPSHOT_DOMAINS))
+    shutil.copyfile(ips_file, os.path.join(target, SNAPSHOT_IPS))
+    versions = list_versions(history)
+    if keep:
+        for old in versions[:-keep]:
+            shutil.rmtree(os.path.join(history, old))
+    return versions[-keep:] if keep else versions
+
+
+def list_versions(history):
+    """Snapshot versions in build order (version names sort chronologically)."""
+    if not history or not os.path.isdir(history):
+        return []
+    return sorted(name for name in os.listdir(history)
+                  if os.path.isfile(os.path.join(history, name, SNAPSHOT_DOMAINS)))
+
+
+def compute_delta(history, since, current):
+    """Domains and CIDRs added/removed between two snapshots."""
+    old_dir = os.path.join(history, since)
+    new_dir = os.path.join(history, current)
+    old_domains = set(read_domains(os.path.join(old_dir, SNAPSHOT_DOMAINS)))
+    new_domains = set(read_domains(os.path.join(new_dir, SNAPSHOT_DOMAINS)))
+    old_ips = CidrSet(read_cidr_file(os.path.join(old_dir, SNAPSHOT_IPS)))
+    new_ips = CidrSet(read_cidr_file(os.path.join(new_dir, SNAPSHOT_IPS)))
+    return {
+        'from': since,
+        'to': current,
+        'domains': {
+            'added': sorted(new_domains - old_domains),
+            'removed': sorted(old_domains - new_domains),
+        },
+        'cidrs': {
+            'added': (new_ips - old_ips).to_cidrs(),
+            'removed': (old_ips - new_ips).to_cidrs(),
+        },
+    }
+
+
+# ---------------------------------------------------------------------------
+# HTTP server
+# ---------------------------------------------------------------------------
+
+class RuleServer:
+    """Serves one release directory plus snapshot deltas."""
+
+    def __init__(self, root, history=None):
+        self.root = os.path.abspath(root)
+        self.history = history
+        self._etags = {}                    # (path, mtime, size) -> ETag
+        self._deltas = OrderedDict()        # (since, current) -> gzip-able JSON bytes
+        self._deltas_lock = threading.Lock()  # handle() runs on executor threads
+
+    def _etag(self, path):
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        if key not in self._etags:
+            self._etags[key] = file_etag(path)
+        return self._etags[key]
+
+    def _resolve(self, url_path):
+        """Map a URL path to a file inside the release directory, or None."""
+        name = unquote(url_path).lstrip('/')
+        path = os.path.abspath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def _delta(self, since):
+        versions = list_versions(self.history)
+        if not versions:
+            return 404, {'error': 'no snapshots available'}
+        current = versions[-1]
+        if since not in versions:
+            return 404, {'error': f'unknown version {since!r}; download the full lists', 'latest': current}
+        key = (since, current)
+        with self._deltas_lock:
+            body = self._deltas.get(key)
+            if body is not None:
+                self._deltas.move_to_end(key)
+                return 200, body
+        body = json.dumps(compute_delta(self.history, since, current)).encode()
+        with self._deltas_lock:
+            self._deltas[key] = body
+            if len(self._deltas) > DELTA_CACHE_SIZE:
+                self._deltas.popitem(last=False)
+        return 200, body
+
+    def handle(self, method, target, headers):
+        """
+        Build (status, headers, body) for one request.
+
+        Blocking (file reads, delta computation); the server runs it on the
+        event loop's default executor.
+        """
+        if method not in ('GET', 'HEAD'):
+            return 405, {'Allow': 'GET, HEAD'}, b''
+        url = urlsplit(target)
+
+        if url.path in ('/version', '/delta'):
+            if url.path == '/version':
+                versions = list_versions(self.history)
+                status, payload = (200, {'latest': versions[-1]}) if versions else (404, {'error': 'no snapshots'})
+            else:
+                since = parse_qs(url.query).get('since', [''])[0]
+                if not since:
+                    return 400, {'Content-Type': 'application/json'}, b'{"error": "missing since"}'
+                status, payload = self._delta(since)
+            body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+            out = {'Content-Type': 'application/json', 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+            if 'gzip' in accepted_encodings(headers.get('accept-encoding', '')) and len(body) > 1024:
+                body = gzip.compress(body, mtime=0)
+                out['Content-Encoding'] = 'gzip'
+            return status, out, body
+
+        path = self._resolve(url.path)
+        if path is None:
+            return 404, {'Content-Type': 'text/plain'}, b'not found\n'
+
+        etag = self._etag(path)
+        base = {
+            'Content-Type': mimetypes.guess_type(path)[0] or 'application/octet-stream',
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding',
+            'Accept-Ranges': 'bytes',
+        }
+        range_header = headers.get('range')
+
+        # Pick a precompressed variant; ranges are always served from the identity encoding
+        serve_path, encoding = path, None
+        if not range_header:
+            accepted = accepted_encodings(headers.get('accept-encoding', ''))
+            for name, suffix in ENCODINGS:
+                # A variant older than its source holds stale content under the new ETag
+                if (name in accepted and os.path.isfile(path + suffix)
+                        and os.path.getmtime(path + suffix) >= os.path.getmtime(path)):
+                    serve_path, encoding = path + suffix, name
+                    break
+        if encoding:
+            etag = etag[:-1] + f'-{encoding}"'
+            base['Content-Encoding'] = encoding
+        base['ETag'] = etag
+
+        if_none_match = headers.get('if-none-match', '')
+        if etag in (tag.strip() for tag in if_none_match.split(',')) or if_none_match.strip() == '*':
+            return 304, base, b''
+
+        with open(serve_path, 'rb') as f:
+            data = f.read()
+        if range_header:
+            parsed = parse_range(range_header, len(data))
+            if parsed == 'unsatisfiable':
+                base['Content-Range'] = f'bytes */{len(data)}'
+                return 416, base, b''
+            if parsed is not None:
+                start, end = parsed
+                base['Content-Range'] = f'bytes {start}-{end}/{len(data)}'
+                return 206, base, data[start:end + 1]
+        return 200, base, data
+
+    async def _serve_client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                parts = lines[0].split()
+                if len(parts) != 3:
+                    writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                    break
+                method, target, version = parts
+                headers = {}
+                for line in lines[1:]:
+                    name, sep, value = line.partition(':')
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+
+                status, out_headers, body = await loop.run_in_executor(None, self.handle, method, target, headers)
+                keep_alive = (version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close')
+                out_headers['Content-Length'] = str(len(body))
+                out_headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+                response = [f'HTTP/1.1 {status} {REASONS.get(status, "")}']
+                response.extend(f'{name}: {value}' for name, value in out_headers.items())
+                writer.write(('\r\n'.join(response) + '\r\n\r\n').encode('latin-1'))
+                if method != 'HEAD' and status != 304:
+                    writer.write(body)
+                await writer.drain()
+                print(f"  {method} {target} {status} {len(body)}", file=sys.stderr)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def serve(self, host='0.0.0.0', port=8080):
+        server = await asyncio.start_server(self._serve_client, host, port, limit=MAX_HEADER_BYTES)
+        print(f"Serving {self.root} on http://{host}:{port}/", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve release files with ETags, compression, ranges and deltas')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve = sub.add_parser('serve', help='Run the HTTP server')
+    serve.add_argument('root', help='Release directory')
+    serve.add_argument('--history', help='Snapshot history directory (enables /delta and /version)')
+    serve.add_argument('--host', default='0.0.0.0', help='Listen address')
+    serve.add_argument('--port', type=int, default=8080, help='Listen port')
+
+    comp = sub.add_parser('precompress', help='Write .gz/.br variants of release files')
+    comp.add_argument('root', help='Release directory')
+
+    snap = sub.add_parser('snapshot', help='Record the current lists as a delta base')
+    snap.add_argument('--history', required=True, help='Snapshot history directory')
+    snap.add_argument('--version', required=True, help='Build version (sortable, e.g. the release tag)')
+    snap.add_argument('--domains', required=True, help='Domain list (e.g. domains/sa.txt)')
+    snap.add_argument('--ips', required=True, help='CIDR list (e.g. sa-ips/sa-all.txt)')
+    snap.add_argument('--keep', type=int, default=12, help='Snapshots to keep (default: 12)')
+
+    args = parser.parse_args()
+
+    if args.command == 'precompress':
+        written = precompress(args.root)
+        note = '' if brotli is not None else ' (brotli module not installed, gzip only)'
+        print(f"  -> Wrote {written} compressed variants in {args.root}{note}", file=sys.stderr)
+    elif args.command == 'snapshot':
+        versions = take_snapshot(args.history, args.version, args.domains, args.ips, keep=args.keep)
+        print(f"  -> Snapshot {args.version} recorded ({len(versions)} kept)", file=sys.stderr)
+    else:
+        try:
+            asyncio.run(RuleServer(args.root, history=args.history).serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
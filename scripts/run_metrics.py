@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Run Metrics and Profiling
+=========================
+Per-phase instrumentation for long pipeline runs:
+
+- Wall time, CPU time (including reaped worker processes), peak RSS and
+  rows per second for each phase
+- Free-form counters and nested values (category counts, DNS statuses)
+- A fixed-bucket latency histogram with approximate percentiles
+- Optional profiling of hot phases: a cProfile .prof file (open with
+  pstats or snakeviz) plus a text summary, and a tracemalloc snapshot with
+  its top allocation sites
+
+Everything is written as one JSON document.
+
+Usage as a library:
+    metrics = RunMetrics(profile_dir='profiles')
+    with metrics.phase('classify', profile=True) as phase:
+        for row in rows:
+            ...
+        phase.rows = n
+    metrics.write('metrics.json')
+
+Usage as a script (print the phase table of a metrics file):
+    python3 run_metrics.py metrics.json
+"""
+
+import os
+import sys
+import json
+import time
+import bisect
+import platform
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Histogram bucket upper bounds in milliseconds; the last bucket is open-ended
+LATENCY_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def cpu_seconds():
+    """User + system CPU of this process and its reaped children."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (or the largest child) in MiB, or None."""
+    if resource is None:
+        return None
+    peaks = [resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+             resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss]
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1 << 20 if sys.platform == 'darwin' else 1 << 10
+    return max(peaks) / scale
+
+
+class LatencyHistogram:
+    """Counts of latencies per fixed millisecond bucket, with approximate percentiles."""
+
+    def __init__(self, bounds_ms=LATENCY_BOUNDS_MS):
+        self.bounds_ms = tuple(bounds_ms)
+        self.counts = [0] * (len(self.bounds_ms) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.bounds_ms, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples, capped at the observed max."""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(self.bounds_ms[i], self.max) if i < len(self.bounds_ms) else self.max
+        return self.max
+
+    def to_dict(self):
+        labels = [f"<={b}" for b in self.bounds_ms] + [f">{self.bounds_ms[-1]}"]
+        return {
+            'unit': 'ms',
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.percentile(0.50),
+            'p90': self.percentile(0.90),
+            'p99': self.percentile(0.99),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class TimedIterator:
+    """Wraps an iterator, accumulating the time spent producing items (e.g. file reading and parsing)."""
+
+    def __init__(self, iterable):
+        self._it = iter(iterable)
+        self.seconds = 0.0
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            item = next(self._it)
+        finally:
+            self.seconds += time.perf_counter() - start
+        self.count += 1
+        return item
+
+
+class StepTimer:
+    """
+    Sampled per-step timing for a per-item pipeline.
+
+    sample() returns a lap(step) callable for every `every`-th item and None
+    for the rest; the code under test calls lap() as each step finishes.
+    estimate() scales the sampled times up to all items, so the cost of
+    timing stays small on large inputs.
+    """
+
+    def __init__(self, every=64):
+        self.every = every
+        self.items = 0
+        self.samples = 0
+        self.seconds = {}
+        self._last = 0.0
+
+    def sample(self):
+        self.items += 1
+        if self.items % self.every:
+            return None
+        self.samples += 1
+        self._last = time.perf_counter()
+        return self.lap
+
+    def lap(self, step):
+        now = time.perf_counter()
+        self.seconds[step] = self.seconds.get(step, 0.0) + now - self._last
+        self._last = now
+
+    def estimate(self):
+        """Estimated seconds per step over all items."""
+        if not self.samples:
+            return {}
+        scale = self.items / self.samples
+        return {step: round(seconds * scale, 6) for step, seconds in self.seconds.items()}
+
+
+class Phase:
+    """Measurements of one phase; set rows and add extra values while it runs."""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.extra = {}
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.rss_start = None
+        self.rss_end = None
+
+    def to_dict(self):
+        out = {
+            'name': self.name,
+            'wall_seconds': round(self.wall, 6),
+            'cpu_seconds': round(self.cpu, 6),
+            'peak_rss_mb': round(self.rss_end, 1) if self.rss_end is not None else None,
+            'peak_rss_growth_mb': (round(self.rss_end - self.rss_start, 1)
+                                   if self.rss_end is not None else None),
+        }
+        if self.rows is not None:
+            out['rows'] = self.rows
+            out['rows_per_second'] = round(self.rows / self.wall, 1) if self.wall > 0 else None
+        out.update(self.extra)
+        return out
+
+
+class RunMetrics:
+    """
+    Collects phases and counters for one run.
+
+    With profile_dir set, phases entered with profile=True are run under
+    cProfile and tracemalloc, writing <phase>.prof, <phase>-profile.txt,
+    <phase>.tracemalloc and <phase>-alloc.txt there.
+    """
+
+    def __init__(self, profile_dir=None):
+        self.profile_dir = profile_dir
+        self.phases = []
+        self.values = {}
+        self._start_wall = time.perf_counter()
+        self._start_cpu = cpu_seconds()
+        self._started = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+
+    @contextmanager
+    def phase(self, name, profile=False):
+        phase = Phase(name)
+        profiler = None
+        tracing = False
+        if profile and self.profile_dir:
+            import cProfile
+            import tracemalloc
+            os.makedirs(self.profile_dir, exist_ok=True)
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(1)
+                tracing = True
+            profiler = cProfile.Profile()
+        phase.rss_start = peak_rss_mb()
+        cpu_start = cpu_seconds()
+        wall_start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield phase
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            phase.wall = time.perf_counter() - wall_start
+            phase.cpu = cpu_seconds() - cpu_start
+            phase.rss_end = peak_rss_mb()
+            self.phases.append(phase)
+            if profiler is not None:
+                self._write_profiles(name, profiler, tracing)
+
+    def _write_profiles(self, name, profiler, stop_tracing):
+        import io
+        import pstats
+        import tracemalloc
+
+        base = os.path.join(self.profile_dir, name)
+        profiler.dump_stats(base + '.prof')
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(40)
+        with open(base + '-profile.txt', 'w') as f:
+            f.write(text.getvalue())
+
+        snapshot = tracemalloc.take_snapshot()
+        snapshot.dump(base + '.tracemalloc')
+        current, peak = tracemalloc.get_traced_memory()
+        with open(base + '-alloc.txt', 'w') as f:
+            f.write(f"# traced memory: {current / 1e6:.1f} MB current, {peak / 1e6:.1f} MB peak\n")
+            for stat in snapshot.statistics('lineno')[:30]:
+                f.write(f"{stat}\n")
+        if stop_tracing:
+            tracemalloc.stop()
+
+    def set(self, key, value):
+        """Record a top-level value (a number, dict or list)."""
+        self.values[key] = value
+
+    def to_dict(self):
+        rss = peak_rss_mb()
+        return {
+            'started': self._started,
+            'argv': sys.argv,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'total': {
+                'wall_seconds': round(time.perf_counter() - self._start_wall, 6),
+                'cpu_seconds': round(cpu_seconds() - self._start_cpu, 6),
+                'peak_rss_mb': round(rss, 1) if rss is not None else None,
+            },
+            'phases': [phase.to_dict() for phase in self.phases],
+            **self.values,
+        }
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp, path)
+
+
+def format_phases(report):
+    """Render the phase table of a metrics document."""
+    lines = [f"{'phase':<12} {'wall s':>9} {'cpu s':>9} {'rss MB':>8} {'rows':>10} {'rows/s':>11}"]
+    for phase in report['phases']:
+        rss = phase.get('peak_rss_mb')
+        rate = phase.get('rows_per_second')
+        lines.append(f"{phase['name']:<12} {phase['wall_seconds']:>9.3f} {phase['cpu_seconds']:>9.3f} "
+                     f"{rss if rss is not None else '-':>8} {phase.get('rows', '-'):>10} "
+                     f"{rate if rate is not None else '-':>11}")
+    total = report['total']
+    lines.append(f"{'total':<12} {total['wall_seconds']:>9.3f} {total['cpu_seconds']:>9.3f} "
+                 f"{total['peak_rss_mb'] if total['peak_rss_mb'] is not None else '-':>8}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Print the phase table of a metrics JSON file')
+    parser.add_argument('metrics', help='Metrics file written by --metrics')
+
+    args = parser.parse_args()
+
+    with open(args.metrics) as f:
+        report = json.load(f)
+    print(format_phases(report))
+    dns = report.get('dns', {})
+    if dns.get('latency'):
+        latency = dns['latency']
+        print(f"DNS latency: p50 {latency['p50']} ms, p90 {latency['p90']} ms, p99 {latency['p99']} ms, "
+              f"max {latency['max']:.0f} ms over {latency['count']} lookups")
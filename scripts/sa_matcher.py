@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Compiled SA Domain/IP Matcher
+=============================
+Compiles domains/sa.txt and sa-ips/sa-all.txt into one binary index that
+gateways can memory-map and query without parsing any text at startup.
+
+Index layout (all integers little-endian unless noted):
+    header      magic "SAMX", u16 version, u16 reserved, u32 hash slots,
+                u32 domain count, u32 string bytes, u32 IPv4 ranges, u32 IPv6 ranges
+    slots       open-addressing hash table of domain suffixes:
+                u64 hash, u32 string offset, u32 string length (0 = empty slot)
+    strings     UTF-8 domain suffixes, concatenated
+    ipv4        merged ranges as 4-byte big-endian starts, then ends
+    ipv6        merged ranges as 16-byte big-endian starts, then ends
+
+A hostname matches when it or any parent domain is listed (domain_suffix
+semantics); an address matches when it falls inside a listed range.
+
+Usage:
+    python3 sa_matcher.py compile --domains domains/sa.txt --ips sa-ips/sa-all.txt -o sa-matcher.idx
+    cat hosts.txt | python3 sa_matcher.py lookup sa-matcher.idx
+"""
+
+import os
+import sys
+import mmap
+import struct
+import bisect
+import hashlib
+
+from cidr_index import ip_to_int, merge_intervals
+from cidr_set import read_cidr_file
+from dedup_domains import read_domains
+
+MAGIC = b'SAMX'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHIIIII')
+SLOT = struct.Struct('<QII')
+
+
+def domain_hash(domain):
+    """Stable 64-bit hash of a domain name."""
+    return int.from_bytes(hashlib.blake2b(domain.encode(), digest_size=8).digest(), 'little')
+
+
+def compile_index(path, domains, cidr_entries):
+    """
+    Write a matcher index.
+
+    Args:
+        path: Output index file
+        domains: Iterable of domain suffixes
+        cidr_entries: (version, first, last) intervals, e.g. from read_cidr_file
+
+    Returns (domain count, IPv4 ranges, IPv6 ranges, file size).
+    """
+    domains = sorted({d.strip('.').lower() for d in domains if d.strip('.')})
+    slots = 1
+    while slots < 2 * len(domains):
+        slots <<= 1
+
+    table = [None] * slots
+    strings = bytearray()
+    for domain in domains:
+        encoded = domain.encode()
+        h = domain_hash(domain)
+        i = h & (slots - 1)
+        while table[i] is not None:
+            i = (i + 1) & (slots - 1)
+        table[i] = (h, len(strings), len(encoded))
+        strings += encoded
+
+    intervals = {4: [], 6: []}
+    for version, first, last in cidr_entries:
+        intervals[version].append((first, last))
+    ranges = {version: merge_intervals(items) for version, items in intervals.items()}
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, slots, len(domains), len(strings),
+                            len(ranges[4]), len(ranges[6])))
+        f.write(b''.join(SLOT.pack(*slot) if slot else SLOT.pack(0, 0, 0) for slot in table))
+        f.write(strings)
+        for version, width in ((4, 4), (6, 16)):
+            f.write(b''.join(first.to_bytes(width, 'big') for first, _ in ranges[version]))
+            f.write(b''.join(last.to_bytes(width, 'big') for _, last in ranges[version]))
+        size = f.tell()
+    os.replace(tmp, path)
+    return len(domains), len(ranges[4]), len(ranges[6]), size
+
+
+class _FixedWidthKeys:
+    """Read-only sequence view of fixed-width big-endian keys inside a buffer, for bisect."""
+
+    def __init__(self, buf, offset, width, count):
+        self._buf = buf
+        self._offset = offset
+        self._width = width
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        start = self._offset + index * self._width
+        return self._buf[start:start + self._width]
+
+
+class SaMatcher:
+    """
+    Memory-mapped lookups against a compiled index.
+
+    Opening only maps the file and reads the header, so startup cost does
+    not grow with the list sizes.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, slots, domains, string_bytes, v4, v6 = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f'{path}: not a version {FORMAT_VERSION} SA matcher index')
+        self.domain_count = domains
+        self._mask = slots - 1
+        self._slots_offset = HEADER.size
+        self._strings_offset = self._slots_offset + slots * SLOT.size
+        offset = self._strings_offset + string_bytes
+        self._ranges = {}
+        for ip_version, width, count in ((4, 4, v4), (6, 16, v6)):
+            starts = _FixedWidthKeys(self._buf, offset, width, count)
+            ends = _FixedWidthKeys(self._buf, offset + count * width, width, count)
+            self._ranges[ip_version] = (starts, ends, width)
+            offset += 2 * count * width
+
+    def close(self):
+        if getattr(self, '_buf', None) is not None:
+            self._buf.close()
+            self._buf = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _has_domain(self, domain):
+        encoded = domain.encode()
+        h = domain_hash(domain)
+        i = h & self._mask
+        buf = self._buf
+        while True:
+            slot_hash, start, length = SLOT.unpack_from(buf, self._slots_offset + i * SLOT.size)
+            if length == 0:
+                return False
+            if slot_hash == h:
+                start += self._strings_offset
+                if buf[start:start + length] == encoded:
+                    return True
+            i = (i + 1) & self._mask
+
+    def match_domain(self, hostname):
+        """Return the listed suffix covering hostname, or None."""
+        domain = hostname.strip().rstrip('.').lower()
+        while domain:
+            if self._has_domain(domain):
+                return domain
+            _, _, domain = domain.partition('.')
+        return None
+
+    def match_ip(self, ip_str):
+        """True if the address lies in a listed range; False for unlisted or invalid input."""
+        parsed = ip_to_int(ip_str.strip())
+        if parsed is None:
+            return False
+        version, value = parsed
+        starts, ends, width = self._ranges[version]
+        key = value.to_bytes(width, 'big')
+        i = bisect.bisect_right(starts, key) - 1
+        return i >= 0 and key <= ends[i]
+
+    def match_domains(self, hostnames):
+        return [self.match_domain(h) for h in hostnames]
+
+    def match_ips(self, ips):
+        return [self.match_ip(ip) for ip in ips]
+
+    def match(self, query):
+        """Match a hostname or address; returns the covering suffix, the address, or None."""
+        query = query.strip()
+        if ip_to_int(query) is not None:
+            return query if self.match_ip(query) else None
+        return self.match_domain(query)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compile and query the SA domain/IP matcher index')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    comp = sub.add_parser('compile', help='Build an index from domain and CIDR lists')
+    comp.add_argument('--domains', action='append', default=[], help='Domain suffix list (repeatable)')
+    comp.add_argument('--ips', action='append', default=[], help='CIDR list (repeatable)')
+    comp.add_argument('-o', '--output', required=True, help='Output index file')
+
+    look = sub.add_parser('lookup', help='Match hostnames/IPs read from stdin, one per line')
+    look.add_argument('index', help='Compiled index file')
+
+    args = parser.parse_args()
+
+    if args.command == 'compile':
+        domains = [d for path in args.domains for d in read_domains(path)]
+        cidrs = [entry for path in args.ips for entry in read_cidr_file(path)]
+        counts = compile_index(args.output, domains, cidrs)
+        print(f"  -> Wrote {args.output}: {counts[0]} domains, {counts[1]} IPv4 + {counts[2]} IPv6 ranges, "
+              f"{counts[3]} bytes", file=sys.stderr)
+        sys.exit(0)
+
+    # Print "<query>\t<match>" for hits and "<query>\t-" for misses
+    out = sys.stdout
+    with SaMatcher(args.index) as matcher:
+        for line in sys.stdin:
+            query = line.strip()
+            if query:
+                out.write(f"{query}\t{matcher.match(query) or '-'}\n")
@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+"""
+sing-box Binary Rule-Set (.srs) Writer and Reader
+=================================================
+Serializes headless default rules (domain, domain_suffix, domain_keyword,
+domain_regex, ip_cidr) straight into sing-box's binary rule-set format,
+so the release no longer needs a Go toolchain and `sing-box rule-set
+compile` or an intermediate JSON file.
+
+File layout:
+    "SRS" magic, 1 byte rule-set version, then a zlib stream holding
+    uvarint rule count followed by the rules.
+
+Default rule:
+    0x00, then items: 1 byte item type + payload, then 0xFF and the
+    invert flag byte.
+      domain (2):         domain/domain_suffix matcher as a succinct trie
+                          over reversed keys (see domain_matcher_keys)
+      domain_keyword (3), domain_regex (4):
+                          uvarint count, then uvarint length + bytes each
+      ip_cidr (6):        0x01, uint64 BE range count, then for each merged
+                          range uvarint length + from bytes, uvarint length + to bytes
+
+Usage:
+    python3 srs.py compile --domain-suffix domains/sa.txt -o rule-set/geosite-sa.srs --verify
+    python3 srs.py compile --ip-cidr sa-ips/sa-all.txt -o rule-set/geoip-sa.srs --verify
+    python3 srs.py decompile rule-set/geosite-sa.srs      # prints the rule-set as JSON
+
+    # Check against sing-box's own decoder
+    sing-box rule-set decompile rule-set/geosite-sa.srs -o geosite-sa.json
+    python3 srs.py compare geosite-sa.json --domain-suffix domains/sa.txt
+"""
+
+import io
+import sys
+import json
+import zlib
+import struct
+
+from cidr_index import intervals_to_cidrs, merge_intervals, parse_cidr
+
+MAGIC = b'SRS'
+
+# Rule-set versions: 1 is readable by sing-box 1.8+, 2 (sing-box 1.10+)
+# stores each domain_suffix as one key instead of two
+RULE_SET_VERSION_1 = 1
+RULE_SET_VERSION_2 = 2
+
+RULE_TYPE_DEFAULT = 0
+
+ITEM_DOMAIN = 2
+ITEM_DOMAIN_KEYWORD = 3
+ITEM_DOMAIN_REGEX = 4
+ITEM_IP_CIDR = 6
+ITEM_FINAL = 0xFF
+
+# Marker labels prepended (before reversal) to domain matcher keys
+PREFIX_LABEL = '\r'     # ".example.com": strict subdomains only
+ROOT_LABEL = '\n'       # "example.com" as a v2 suffix: itself and subdomains
+
+
+# ---------------------------------------------------------------------------
+# Primitive encoding
+# ---------------------------------------------------------------------------
+
+def uvarint(value):
+    """Encode an unsigned integer as a protobuf-style varint."""
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def read_uvarint(stream):
+    """Decode a varint from a binary stream."""
+    result = shift = 0
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            raise ValueError('truncated varint')
+        result |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return result
+        shift += 7
+
+
+def _read_exact(stream, n):
+    data = stream.read(n)
+    if len(data) != n:
+        raise ValueError('truncated rule-set')
+    return data
+
+
+def _encode_bytes(data):
+    return uvarint(len(data)) + data
+
+
+def _decode_bytes(stream):
+    return _read_exact(stream, read_uvarint(stream))
+
+
+def _encode_strings(values):
+    return uvarint(len(values)) + b''.join(_encode_bytes(v.encode()) for v in values)
+
+
+def _decode_strings(stream):
+    return [_decode_bytes(stream).decode() for _ in range(read_uvarint(stream))]
+
+
+def _encode_uint64s(words):
+    return uvarint(len(words)) + struct.pack(f'>{len(words)}Q', *words)
+
+
+def _decode_uint64s(stream):
+    count = read_uvarint(stream)
+    return list(struct.unpack(f'>{count}Q', _read_exact(stream, 8 * count)))
+
+
+# ---------------------------------------------------------------------------
+# Domain matcher (succinct trie)
+# ---------------------------------------------------------------------------
+
+def domain_matcher_keys(domains=(), suffixes=(), version=RULE_SET_VERSION_2):
+    """
+    Build the sorted, reversed matcher keys for domain and domain_suffix lists.
+
+    Mirrors sing-box's domain.NewMatcher: a suffix starting with '.' matches
+    strict subdomains; any other suffix matches the domain and its
+    subdomains (one root-label key in v2, an exact key plus a
+    prefix-label key in v1). An exact domain already listed as a suffix
+    is dropped.
+    """
+    keys = []
+    seen = set()
+    for suffix in suffixes:
+        if suffix in seen:
+            continue
+        seen.add(suffix)
+        if suffix.startswith('.'):
+            keys.append(PREFIX_LABEL + suffix)
+        elif version == RULE_SET_VERSION_1:
+            keys.append(suffix)
+            dotted = '.' + suffix
+            if dotted not in seen:
+                seen.add(dotted)
+                keys.append(PREFIX_LABEL + dotted)
+        else:
+            keys.append(ROOT_LABEL + suffix)
+    for domain in domains:
+        if domain in seen:
+            continue
+        seen.add(domain)
+        keys.append(domain)
+    return sorted(key[::-1].encode() for key in keys)
+
+
+def _bitmap_words(bits, length):
+    """Pack a bit-per-byte-index bytearray into little-endian-bit uint64 words."""
+    words = []
+    for start in range(0, length, 64):
+        word = 0
+        for offset, bit in enumerate(bits[start:start + 64]):
+            if bit:
+                word |= 1 << offset
+        words.append(word)
+    return words
+
+
+def build_succinct_set(keys):
+    """
+    Encode sorted byte-string keys as a LOUDS-style succinct trie.
+
+    Nodes are numbered breadth-first. leaves has bit i set when node i ends a
+    key; labelBitmap lists each node's children as 0 bits terminated by a 1
+    bit, with the child labels in the parallel labels array. Returns
+    (leaves, label_bitmap, labels) as (list of uint64, list of uint64, bytes).
+    """
+    leaf_bits = bytearray()
+    label_bits = bytearray()
+    labels = bytearray()
+    queue = [(0, len(keys), 0)] if keys else []
+    i = 0
+    while i < len(queue):
+        start, end, col = queue[i]
+        if col == len(keys[start]):
+            start += 1
+            leaf_bits.extend(b'\0' * (i + 1 - len(leaf_bits)))
+            leaf_bits[i] = 1
+        j = start
+        while j < end:
+            first = j
+            label = keys[first][col]
+            while j < end and keys[j][col] == label:
+                j += 1
+            queue.append((first, j, col + 1))
+            labels.append(label)
+            label_bits.append(0)
+        label_bits.append(1)
+        i += 1
+    # Go's setBit grows the leaves array only up to the last set bit
+    leaves = _bitmap_words(leaf_bits, len(leaf_bits))
+    label_bitmap = _bitmap_words(label_bits, len(label_bits))
+    return leaves, label_bitmap, bytes(labels)
+
+
+def decode_succinct_set(leaves, label_bitmap, labels):
+    """Recover the sorted byte-string keys of a succinct trie."""
+
+    def bit(words, index):
+        word = index >> 6
+        return word < len(words) and (words[word] >> (index & 63)) & 1
+
+    keys = []
+    prefixes = [b'']
+    label_index = 0
+    position = 0
+    node = 0
+    while node < len(prefixes):
+        if bit(leaves, node):
+            keys.append(prefixes[node])
+        while not bit(label_bitmap, position):
+            if label_index >= len(labels):
+                raise ValueError('corrupt domain matcher')
+            prefixes.append(prefixes[node] + labels[label_index:label_index + 1])
+            label_index += 1
+            position += 1
+        position += 1
+        node += 1
+    return sorted(keys)
+
+
+def matcher_keys_to_rules(keys, version=RULE_SET_VERSION_2):
+    """Turn matcher keys back into sorted (domain, domain_suffix) lists."""
+    exact, suffixes, dotted = set(), set(), set()
+    for key in keys:
+        text = key.decode()[::-1]
+        if text.startswith(ROOT_LABEL):
+            suffixes.add(text[1:])
+        elif text.startswith(PREFIX_LABEL):
+            dotted.add(text[1:])
+        else:
+            exact.add(text)
+    if version == RULE_SET_VERSION_1:
+        # A v1 suffix is stored as the exact domain plus its dotted form
+        for name in list(exact):
+            if '.' + name in dotted:
+                exact.discard(name)
+                dotted.discard('.' + name)
+                suffixes.add(name)
+    return sorted(exact), sorted(suffixes | dotted)
+
+
+# ---------------------------------------------------------------------------
+# Rules
+# ---------------------------------------------------------------------------
+
+def encode_default_rule(rule, version=RULE_SET_VERSION_2):
+    """
+    Encode one headless default rule.
+
+    rule is a dict using sing-box's JSON field names: domain, domain_suffix,
+    domain_keyword, domain_regex, ip_cidr (lists) and invert (bool).
+    """
+    out = bytearray([RULE_TYPE_DEFAULT])
+    domains = rule.get('domain', ())
+    suffixes = rule.get('domain_suffix', ())
+    if domains or suffixes:
+        keys = domain_matcher_keys(domains, suffixes, version)
+        leaves, label_bitmap, labels = build_succinct_set(keys)
+        out.append(ITEM_DOMAIN)
+        out.append(0)  # matcher format version
+        out += _encode_uint64s(leaves)
+        out += _encode_uint64s(label_bitmap)
+        out += _encode_bytes(labels)
+    if rule.get('domain_keyword'):
+        out.append(ITEM_DOMAIN_KEYWORD)
+        out += _encode_strings(rule['domain_keyword'])
+    if rule.get('domain_regex'):
+        out.append(ITEM_DOMAIN_REGEX)
+        out += _encode_strings(rule['domain_regex'])
+    if rule.get('ip_cidr'):
+        out.append(ITEM_IP_CIDR)
+        out += encode_ip_set(rule['ip_cidr'])
+    out.append(ITEM_FINAL)
+    out.append(1 if rule.get('invert') else 0)
+    return bytes(out)
+
+
+def encode_ip_set(cidrs):
+    """Encode CIDRs as sing-box's IP set: merged ranges, IPv4 before IPv6."""
+    intervals = {4: [], 6: []}
+    for cidr in cidrs:
+        version, first, last = parse_cidr(cidr) if isinstance(cidr, str) else cidr
+        intervals[version].append((first, last))
+    ranges = []
+    for version, width in ((4, 4), (6, 16)):
+        for first, last in merge_intervals(intervals[version]):
+            ranges.append((first.to_bytes(width, 'big'), last.to_bytes(width, 'big')))
+    out = bytearray([1])  # IP set format version
+    out += struct.pack('>Q', len(ranges))
+    for first, last in ranges:
+        out += _encode_bytes(first) + _encode_bytes(last)
+    return bytes(out)
+
+
+def decode_ip_set(stream):
+    """Decode an IP set into the minimal CIDR list covering it."""
+    if _read_exact(stream, 1)[0] != 1:
+        raise ValueError('unsupported IP set version')
+    (count,) = struct.unpack('>Q', _read_exact(stream, 8))
+    intervals = {4: [], 6: []}
+    for _ in range(count):
+        first, last = _decode_bytes(stream), _decode_bytes(stream)
+        version = 4 if len(first) == 4 else 6
+        intervals[version].append((int.from_bytes(first, 'big'), int.from_bytes(last, 'big')))
+    return intervals_to_cidrs(intervals[4], 4) + intervals_to_cidrs(intervals[6], 6)
+
+
+def decode_default_rule(stream, version=RULE_SET_VERSION_2):
+    """Decode one default rule (after its type byte) into a JSON-style dict."""
+    rule = {}
+    while True:
+        item = _read_exact(stream, 1)[0]
+        if item == ITEM_FINAL:
+            invert = _read_exact(stream, 1)[0]
+            if invert:
+                rule['invert'] = True
+            return rule
+        if item == ITEM_DOMAIN:
+            if _read_exact(stream, 1)[0] != 0:
+                raise ValueError('unsupported domain matcher version')
+            leaves = _decode_uint64s(stream)
+            label_bitmap = _decode_uint64s(stream)
+            labels = _decode_bytes(stream)
+            domains, suffixes = matcher_keys_to_rules(
+                decode_succinct_set(leaves, label_bitmap, labels), version)
+            if domains:
+                rule['domain'] = domains
+            if suffixes:
+                rule['domain_suffix'] = suffixes
+        elif item == ITEM_DOMAIN_KEYWORD:
+            rule['domain_keyword'] = _decode_strings(stream)
+        elif item == ITEM_DOMAIN_REGEX:
+            rule['domain_regex'] = _decode_strings(stream)
+        elif item == ITEM_IP_CIDR:
+            rule['ip_cidr'] = decode_ip_set(stream)
+        else:
+            raise ValueError(f'unsupported rule item type {item}')
+
+
+# ---------------------------------------------------------------------------
+# Files
+# ---------------------------------------------------------------------------
+
+def write_rule_set(path, rules, version=RULE_SET_VERSION_2):
+    """Write default rules to a .srs file; rules are compressed as they are encoded."""
+    compressor = zlib.compressobj(zlib.Z_BEST_COMPRESSION)
+    size = 0
+    with open(path, 'wb') as f:
+        f.write(MAGIC + bytes([version]))
+        f.write(compressor.compress(uvarint(len(rules))))
+        for rule in rules:
+            f.write(compressor.compress(encode_default_rule(rule, version)))
+        f.write(compressor.flush())
+        size = f.tell()
+    return size
+
+
+def read_rule_set(path):
+    """Read a .srs file into (version, list of rule dicts)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:3] != MAGIC:
+        raise ValueError(f'{path}: not a sing-box rule-set')
+    version = data[3]
+    if version not in (RULE_SET_VERSION_1, RULE_SET_VERSION_2):
+        raise ValueError(f'{path}: unsupported rule-set version {version}')
+    stream = io.BytesIO(zlib.decompress(data[4:]))
+    rules = []
+    for _ in range(read_uvarint(stream)):
+        rule_type = _read_exact(stream, 1)[0]
+        if rule_type != RULE_TYPE_DEFAULT:
+            raise ValueError(f'{path}: unsupported rule type {rule_type}')
+        rules.append(decode_default_rule(stream, version))
+    return version, rules
+
+
+def read_list(path):
+    """Read non-empty, non-comment lines from a list file, one entry per line."""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+
+def rule_from_lists(domain=(), domain_suffix=(), domain_keyword=(), ip_cidr=()):
+    """One default rule built from list files; fields without entries are left out."""
+    rule = {}
+    for field, paths in (('domain', domain), ('domain_suffix', domain_suffix), ('domain_keyword', domain_keyword)):
+        values = [line.lower() for path in paths for line in read_list(path)]
+        if values:
+            rule[field] = values
+    if ip_cidr:
+        rule['ip_cidr'] = [parse_cidr(line) for path in ip_cidr for line in read_list(path)]
+    return rule
+
+
+def read_rules(path):
+    """Rules of a .srs file, or of rule-set JSON such as `sing-box rule-set decompile` writes."""
+    with open(path, 'rb') as f:
+        is_binary = f.read(len(MAGIC)) == MAGIC
+    if is_binary:
+        return read_rule_set(path)[1]
+    with open(path, encoding='utf-8') as f:
+        return json.load(f).get('rules', [])
+
+
+def normalize_rule(rule):
+    """Canonical form of a rule as the reader reports it, for round-trip checks."""
+    keys = domain_matcher_keys(rule.get('domain', ()), rule.get('domain_suffix', ()))
+    domains, suffixes = matcher_keys_to_rules(keys)
+    # "example.com" plus ".example.com" (the version 1 spelling) is the
+    # suffix "example.com", and ".example.com" adds nothing once it is listed
+    exact = set(domains)
+    folded = {s[1:] for s in suffixes if s.startswith('.') and s[1:] in exact}
+    domains = [d for d in domains if d not in folded]
+    listed = set(suffixes) | folded
+    suffixes = sorted(s for s in listed if not (s.startswith('.') and s[1:] in listed))
+    out = {}
+    if domains:
+        out['domain'] = domains
+    if suffixes:
+        out['domain_suffix'] = suffixes
+    for field in ('domain_keyword', 'domain_regex'):
+        if rule.get(field):
+            out[field] = list(rule[field])
+    if rule.get('ip_cidr'):
+        out['ip_cidr'] = decode_ip_set(io.BytesIO(encode_ip_set(rule['ip_cidr'])))
+    if rule.get('invert'):
+        out['invert'] = True
+    return out
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Write and read sing-box binary rule-sets (.srs)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    comp = sub.add_parser('compile', help='Build a single-rule .srs from list files')
+    comp.add_argument('--domain', action='append', default=[], help='Exact domain list file')
+    comp.add_argument('--domain-suffix', action='append', default=[], help='Domain suffix list file')
+    comp.add_argument('--domain-keyword', action='append', default=[], help='Domain keyword list file')
+    comp.add_argument('--ip-cidr', action='append', default=[], help='CIDR list file')
+    comp.add_argument('--version', type=int, choices=[RULE_SET_VERSION_1, RULE_SET_VERSION_2],
+                      default=RULE_SET_VERSION_2, help='Rule-set version (1 for sing-box < 1.10)')
+    comp.add_argument('--verify', action='store_true', help='Decode the written file and compare')
+    comp.add_argument('-o', '--output', required=True, help='Output .srs file')
+
+    dec = sub.add_parser('decompile', help='Print a .srs file as rule-set JSON')
+    dec.add_argument('input', help='.srs file')
+    dec.add_argument('-o', '--output', help='Output JSON file (default: stdout)')
+
+    cmp_ = sub.add_parser('compare', help='Check a .srs or decompiled rule-set JSON against list files')
+    cmp_.add_argument('input', help='.srs file or rule-set JSON (e.g. from sing-box rule-set decompile)')
+    for name, help_text in (('--domain', 'Exact domain list file'), ('--domain-suffix', 'Domain suffix list file'),
+                            ('--domain-keyword', 'Domain keyword list file'), ('--ip-cidr', 'CIDR list file')):
+        cmp_.add_argument(name, action='append', default=[], help=help_text)
+
+    args = parser.parse_args()
+
+    if args.command == 'decompile':
+        version, rules = read_rule_set(args.input)
+        text = json.dumps({'version': version, 'rules': rules}, indent=2) + '\n'
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(text)
+        else:
+            sys.stdout.write(text)
+        sys.exit(0)
+
+    rule = rule_from_lists(args.domain, args.domain_suffix, args.domain_keyword, args.ip_cidr)
+    if not rule:
+        parser.error(f'{args.command} needs at least one list file')
+
+    if args.command == 'compare':
+        if [normalize_rule(r) for r in read_rules(args.input)] != [normalize_rule(rule)]:
+            print(f"  !! {args.input}: rule-set does not match the input lists", file=sys.stderr)
+            sys.exit(1)
+        print(f"  -> {args.input} matches the input lists", file=sys.stderr)
+        sys.exit(0)
+
+    size = write_rule_set(args.output, [rule], version=args.version)
+    counts = ', '.join(f"{len(values)} {field}" for field, values in rule.items())
+    print(f"  -> Wrote {args.output}: {counts} ({size} bytes)", file=sys.stderr)
+
+    if args.verify:
+        _, decoded = read_rule_set(args.output)
+        if [normalize_rule(r) for r in decoded] != [normalize_rule(rule)]:
+            print(f"  !! {args.output}: decoded rule-set does not match the input", file=sys.stderr)
+            sys.exit(1)
+        print(f"  -> Verified {args.output} round-trips", file=sys.stderr)
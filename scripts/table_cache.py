@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Compiled Lookup Table Cache
+===========================
+Loads one-entry-per-line data files (domain and keyword lists under data/)
+as frozensets, compiling each file on first use into a pickle stored next
+to it in __pycache__/ and keyed by the file's content hash. Later loads
+hash the text and unpickle the set instead of parsing it, so lists can
+grow to tens of thousands of entries without adding startup cost, and an
+edited file is recompiled automatically.
+
+Lines are stripped and lowercased; blank lines and # comments are skipped.
+
+Usage as a library:
+    excludes = load_table('data/global-excludes.txt')   # frozenset
+
+Usage as a script (precompile, e.g. before a read-only deployment):
+    python3 table_cache.py data/global-excludes.txt data/sa-keywords.txt
+"""
+
+import os
+import sys
+import pickle
+import hashlib
+
+# Overrides the per-directory __pycache__ location (e.g. for read-only data dirs)
+CACHE_DIR_ENV = 'TABLE_CACHE_DIR'
+
+
+def parse_table(data):
+    """Parse file bytes into a frozenset of entries."""
+    entries = set()
+    for line in data.decode('utf-8').splitlines():
+        line = line.strip().lower()
+        if line and not line.startswith('#'):
+            entries.add(line)
+    return frozenset(entries)
+
+
+def cache_path(path, digest):
+    cache_dir = os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.dirname(os.path.abspath(path)), '__pycache__')
+    return os.path.join(cache_dir, f"{os.path.basename(path)}.{digest[:16]}.pickle")
+
+
+def _store(cached, table):
+    """Write the compiled table, replacing versions compiled from older file contents."""
+    cache_dir = os.path.dirname(cached)
+    prefix = os.path.basename(cached).rsplit('.', 2)[0] + '.'
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in os.listdir(cache_dir):
+            if name.startswith(prefix) and name.endswith('.pickle'):
+                os.remove(os.path.join(cache_dir, name))
+        tmp = f"{cached}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cached)
+    except OSError:
+        # A read-only checkout still works, it just parses every time
+        pass
+
+
+def load_table(path):
+    """Load a data file as a frozenset, via the compiled cache when it is current."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    cached = cache_path(path, hashlib.blake2b(data, digest_size=16).hexdigest())
+    try:
+        with open(cached, 'rb') as f:
+            table = pickle.load(f)
+        if isinstance(table, frozenset):
+            return table
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        pass
+    table = parse_table(data)
+    _store(cached, table)
+    return table
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Precompile data files into the lookup table cache')
+    parser.add_argument('files', nargs='+', help='Data files (one entry per line)')
+
+    args = parser.parse_args()
+
+    for path in args.files:
+        table = load_table(path)
+        print(f"  -> {path}: {len(table)} entries", file=sys.stderr)
@@ -0,0 +1,168 @@
+import socket
+import struct
+import asyncio
+
+import pytest
+
+from async_dns import DnsResolver, DnsResult, QTYPES
+
+A, AAAA = QTYPES['A'], QTYPES['AAAA']
+
+
+def _question(data):
+    """(name, qtype, question bytes) of a query packet."""
+    offset, labels = 12, []
+    while data[offset]:
+        length = data[offset]
+        labels.append(data[offset + 1:offset + 1 + length].decode())
+        offset += length + 1
+    qtype = struct.unpack_from('>H', data, offset + 1)[0]
+    return '.'.join(labels), qtype, data[12:offset + 5]
+
+
+def reply(query_id, question, rcode=0, ips=(), ttl=300):
+    """A response packet carrying the question and one record per IP."""
+    answers = b''
+    for ip in ips:
+        family, rtype = (socket.AF_INET6, AAAA) if ':' in ip else (socket.AF_INET, A)
+        rdata = socket.inet_pton(family, ip)
+        answers += b'\xc0\x0c' + struct.pack('>HHIH', rtype, 1, ttl, len(rdata)) + rdata
+    return struct.pack('>HHHHHH', query_id, 0x8180 | rcode, 1, len(ips), 0, 0) + question + answers
+
+
+class StubServer(asyncio.DatagramProtocol):
+    """
+    UDP DNS server driven by a handler(name, qtype, attempt, query_id, question).
+
+    The handler returns a list of (delay seconds, packet) to send back; an
+    empty list drops the query. attempt counts queries per (name, qtype).
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.attempts = {}
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        name, qtype, question = _question(data)
+        attempt = self.attempts.get((name, qtype), 0)
+        self.attempts[(name, qtype)] = attempt + 1
+        query_id = struct.unpack_from('>H', data)[0]
+        loop = asyncio.get_running_loop()
+        for delay, packet in self.handler(name, qtype, attempt, query_id, question):
+            loop.call_later(delay, self.transport.sendto, packet, addr)
+
+
+def resolve(handler, names, **kwargs):
+    """Resolve names against a stub server; returns ({name: DnsResult}, server)."""
+    async def run():
+        loop = asyncio.get_running_loop()
+        transport, server = await loop.create_datagram_endpoint(
+            lambda: StubServer(handler), local_addr=('127.0.0.1', 0))
+        port = transport.get_extra_info('sockname')[1]
+        try:
+            async with DnsResolver('127.0.0.1', port, timeout=kwargs.pop('timeout', 0.2), **kwargs) as resolver:
+                results = await asyncio.gather(*(resolver.resolve(name) for name in names))
+        finally:
+            transport.close()
+        return dict(zip(names, results)), server
+    return asyncio.run(run())
+
+
+def records(table):
+    """Handler answering from {name: [ips]} and NXDOMAIN for anything else."""
+    def handler(name, qtype, attempt, query_id, question):
+        if name not in table:
+            return [(0, reply(query_id, question, rcode=3))]
+        ips = [ip for ip in table[name] if (':' in ip) == (qtype == AAAA)]
+        return [(0, reply(query_id, question, ips=ips, ttl=300 if qtype == A else 120))]
+    return handler
+
+
+def test_a_and_aaaa_are_merged_with_min_ttl():
+    results, _ = resolve(records({'dual.test': ['192.0.2.1', '2001:db8::1']}), ['dual.test'])
+    assert results['dual.test'] == DnsResult(['192.0.2.1', '2001:db8::1'], 120, 'ok')
+
+
+def test_nxdomain():
+    results, _ = resolve(records({}), ['missing.test'])
+    assert results['missing.test'] == DnsResult([], 0, 'nxdomain')
+
+
+def test_empty_noerror_on_every_qtype_is_ok():
+    results, _ = resolve(records({'empty.test': []}), ['empty.test'])
+    assert results['empty.test'] == DnsResult([], 0, 'ok')
+
+
+def test_retry_after_timeout():
+    answer = records({'flaky.test': ['192.0.2.7']})
+
+    def handler(name, qtype, attempt, query_id, question):
+        return [] if attempt == 0 else answer(name, qtype, attempt, query_id, question)
+
+    results, server = resolve(handler, ['flaky.test'], retries=1, qtypes=('A',))
+    assert results['flaky.test'] == DnsResult(['192.0.2.7'], 300, 'ok')
+    assert server.attempts[('flaky.test', A)] == 2
+
+
+def test_every_attempt_timing_out():
+    results, server = resolve(lambda *_: [], ['silent.test'], retries=1, qtypes=('A',))
+    assert results['silent.test'] == DnsResult([], 0, 'timeout')
+    assert server.attempts[('silent.test', A)] == 2
+
+
+def test_mismatched_reply_id_and_question_are_ignored():
+    def handler(name, qtype, attempt, query_id, question):
+        other = b'\x05other\x04test\x00' + struct.pack('>HH', A, 1)
+        return [
+            (0, reply(query_id ^ 1, question, ips=['198.51.100.1'])),   # wrong ID
+            (0, reply(query_id, other, ips=['198.51.100.2'])),          # right ID, other question
+            (0.02, reply(query_id, question, ips=['192.0.2.9'])),
+        ]
+
+    results, _ = resolve(handler, ['right.test'], qtypes=('A',))
+    assert results['right.test'] == DnsResult(['192.0.2.9'], 300, 'ok')
+
+
+def test_late_reply_to_abandoned_query_is_ignored():
+    def handler(name, qtype, attempt, query_id, question):
+        if attempt == 0:
+            # Arrives after the first attempt was given up on
+            return [(0.3, reply(query_id, question, ips=['198.51.100.1']))]
+        return [(0, reply(query_id, question, ips=['192.0.2.10']))]
+
+    results, _ = resolve(handler, ['late.test'], retries=1, qtypes=('A',))
+    assert results['late.test'] == DnsResult(['192.0.2.10'], 300, 'ok')
+
+
+def test_timeout_on_one_qtype_is_not_an_empty_answer():
+    def handler(name, qtype, attempt, query_id, question):
+        return [(0, reply(query_id, question))] if qtype == A else []
+
+    results, _ = resolve(handler, ['half.test'], retries=0)
+    assert results['half.test'] == DnsResult([], 0, 'timeout')
+
+
+def test_servfail_with_empty_noerror_is_an_error():
+    def handler(name, qtype, attempt, query_id, question):
+        return [(0, reply(query_id, question, rcode=0 if qtype == A else 2))]
+
+    results, _ = resolve(handler, ['broken.test'])
+    assert results['broken.test'] == DnsResult([], 0, 'error')
+
+
+@pytest.mark.parametrize('replies, status', [
+    ([(0, [(A, 60, '192.0.2.1')]), (None, [])], 'ok'),
+    ([(0, []), (0, [])], 'ok'),
+    ([(3, []), (3, [])], 'nxdomain'),
+    ([(None, []), (None, [])], 'timeout'),
+    ([(None, []), (0, [])], 'timeout'),
+    ([(2, []), (0, [])], 'error'),
+    ([(2, []), (None, [])], 'error'),
+    (None, 'error'),
+])
+def test_merge_replies_status(replies, status):
+    assert DnsResolver._merge_replies(replies).status == status
@@ -0,0 +1,35 @@
+import pytest
+
+from cidr_index import CidrIndex, ip_to_int, parse_cidr
+from sa_matcher import SaMatcher, compile_index
+
+CIDRS = ['212.26.0.0/16', '2a02:cf80::/29']
+
+
+@pytest.mark.parametrize('address, expected', [
+    ('212.26.1.1', (4, 0xD41A0101)),
+    ('::ffff:212.26.1.1', (4, 0xD41A0101)),
+    ('::FFFF:d41a:101', (4, 0xD41A0101)),
+    ('::212.26.1.1', (6, 0xD41A0101)),          # IPv4-compatible, not mapped
+    ('2a02:cf80::1', (6, 0x2A02CF80 << 96 | 1)),
+    ('fe80::1%eth0', (6, 0xFE80 << 112 | 1)),
+    ('212.26.1', None),
+    ('::ffff:212.26.1', None),
+])
+def test_ip_to_int(address, expected):
+    assert ip_to_int(address) == expected
+
+
+def test_mapped_addresses_match_ipv4_ranges(tmp_path):
+    index = CidrIndex(CIDRS)
+    queries = ['::ffff:212.26.1.1', '::ffff:8.8.8.8', '212.26.255.255', '2a02:cf80::1']
+    assert index.contains_many(queries) == [True, False, True, True]
+    assert [index.contains(q) for q in queries] == [True, False, True, True]
+
+    path = str(tmp_path / 'sa-matcher.idx')
+    compile_index(path, ['example.sa'], [parse_cidr(c) for c in CIDRS])
+    matcher = SaMatcher(path)
+    try:
+        assert matcher.match_ips(queries) == [True, False, True, True]
+    finally:
+        matcher.close()
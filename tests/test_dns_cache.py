@@ -0,0 +1,25 @@
+from dns_cache import CADENCE, DnsCache
+
+RUN = 1_700_000_000
+
+
+def cached_after(cache, runs, drift=0):
+    """Domains still fresh a number of weekly runs after RUN."""
+    cached, _ = cache.lookup_many(['short.test', 'gone.test'], now=RUN + runs * CADENCE + drift)
+    return sorted(cached)
+
+
+def test_entries_survive_exactly_one_weekly_run(tmp_path):
+    with DnsCache(str(tmp_path / 'cache.sqlite')) as cache:
+        cache.store_many([('short.test', ['192.0.2.1'], 60, 'ok'),
+                          ('gone.test', [], 0, 'nxdomain')], now=RUN)
+        # The next run may start a little late and must still hit the cache
+        assert cached_after(cache, 1) == ['gone.test', 'short.test']
+        assert cached_after(cache, 1, drift=6 * 3600) == ['gone.test', 'short.test']
+        assert cached_after(cache, 2) == []
+
+
+def test_timeouts_are_not_cached(tmp_path):
+    with DnsCache(str(tmp_path / 'cache.sqlite')) as cache:
+        cache.store_many([('short.test', [], 0, 'timeout')], now=RUN)
+        assert cached_after(cache, 0) == []
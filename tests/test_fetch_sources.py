@@ -0,0 +1,89 @@
+import gzip
+import threading
+import http.server
+
+import pytest
+
+from fetch_sources import STATUS_FAILED, STATUS_FETCHED, STATUS_NOT_MODIFIED, fetch_source, fetch_sources
+
+BODY = b'5.42.224.0/19\n' * 1000
+ETAG = '"v1"'
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Serves BODY at /plain and /gzip, honouring If-None-Match, and broken variants."""
+
+    requests = []
+
+    def do_GET(self):
+        Handler.requests.append((self.path, dict(self.headers)))
+        if self.path == '/always-304':
+            self.send_response(304)
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.send_header('ETag', ETAG)
+            self.send_header('Last-Modified', 'Sun, 11 Oct 2026 03:00:00 GMT')
+            self.end_headers()
+            return
+        compressed = 'gzip' in self.path
+        body = gzip.compress(BODY) if compressed else BODY
+        if self.path == '/truncated-gzip':
+            body = body[:len(body) // 2]
+        self.send_response(200)
+        self.send_header('ETag', ETAG)
+        if compressed:
+            self.send_header('Content-Encoding', 'gzip')
+        # /short-read announces more bytes than it sends, then closes the connection
+        length = len(body) + (100 if self.path == '/short-read' else 0)
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    Handler.requests = []
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def source(url, filename='list.txt'):
+    return {'url': url, 'filename': filename, 'required': True}
+
+
+@pytest.mark.parametrize('path', ['/plain', '/gzip'])
+def test_fetch_then_not_modified(server, tmp_path, path):
+    sources = {'list': source(server + path)}
+    first, = fetch_sources(sources_dir=str(tmp_path), sources=sources)
+    assert first['status'] == STATUS_FETCHED
+    assert (tmp_path / 'list.txt').read_bytes() == BODY
+
+    second, = fetch_sources(sources_dir=str(tmp_path), sources=sources)
+    assert second['status'] == STATUS_NOT_MODIFIED
+    assert Handler.requests[-1][1].get('If-None-Match') == ETAG
+    assert (tmp_path / 'list.txt').read_bytes() == BODY
+
+
+@pytest.mark.parametrize('path', ['/truncated-gzip', '/short-read'])
+def test_broken_body_keeps_previous_copy(server, tmp_path, path):
+    (tmp_path / 'list.txt').write_bytes(b'previous\n')
+    report, = fetch_sources(sources_dir=str(tmp_path), sources={'list': source(server + path)})
+    assert report['status'] == STATUS_FAILED
+    assert report['available']
+    assert (tmp_path / 'list.txt').read_bytes() == b'previous\n'
+    assert [p.name for p in tmp_path.iterdir() if p.name.endswith('.part')] == []
+
+
+def test_unprompted_304_is_a_failure(server, tmp_path):
+    entry, report = fetch_source('list', source(server + '/always-304'), str(tmp_path), entry=None)
+    assert entry is None
+    assert report['status'] == STATUS_FAILED
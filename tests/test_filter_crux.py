@@ -0,0 +1,17 @@
+from filter_crux_sa_domains import iter_crux_rows
+
+# Not ordered by rank: a top-1000 origin follows a 10000 one
+CSV = """origin,rank
+https://shop.example.sa,1000
+https://news.example.com,10000
+https://late.example.sa,1000
+https://bank.example.sa,5000
+"""
+
+
+def test_max_rank_skips_rows_in_unsorted_input(tmp_path):
+    path = tmp_path / 'crux.csv'
+    path.write_text(CSV)
+    assert list(iter_crux_rows(str(path), max_rank=1000)) == [('shop.example.sa', 1000), ('late.example.sa', 1000)]
+    assert list(iter_crux_rows(str(path), max_rank=1000, assume_sorted=True)) == [('shop.example.sa', 1000)]
+    assert len(list(iter_crux_rows(str(path)))) == 4
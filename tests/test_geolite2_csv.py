@@ -0,0 +1,50 @@
+from geolite2_csv import BLOCKS_FILES, LOCATIONS_FILE, country_ranges
+
+SA = '102358'
+# Longer ids starting with the SA id must not match
+OTHER = '1023580'
+
+LOCATIONS = f"""geoname_id,locale_code,continent_code,continent_name,country_iso_code,country_name,is_in_european_union
+{SA},en,AS,Asia,SA,"Saudi Arabia",0
+{OTHER},en,AS,Asia,XX,Elsewhere,0
+290557,en,AS,Asia,AE,"United Arab Emirates",0
+"""
+
+HEADER = 'network,geoname_id,registered_country_geoname_id,represented_country_geoname_id,is_anonymous_proxy,is_satellite_provider'
+
+IPV4_ROWS = [
+    f'5.42.224.0/19,{SA},{SA},,0,0',             # located in SA
+    f'5.42.0.0/24,{OTHER},{OTHER},,0,0',          # id with the SA id as a prefix
+    f'5.43.0.0/24,290557,{SA},,0,0',              # located elsewhere, registered in SA: not SA
+    f'5.44.0.0/24,,{SA},,0,0',                    # no location: falls back to the registered country
+    f'5.45.0.0/24,,{OTHER},,0,0',
+    f'5.46.0.0/24,{SA}1,,,0,0',
+]
+IPV6_ROWS = [
+    f'2a00:1::/32,{SA},{SA},,0,0',
+    f'2a00:2::/32,{OTHER},{SA}0,,0,0',
+    f'2a00:3::/32,,{SA}',                         # last row, registered id in the final column, no newline
+]
+
+
+def write_csvs(tmp_path, newline):
+    (tmp_path / LOCATIONS_FILE).write_bytes(LOCATIONS.replace('\n', newline).encode())
+    blocks = {}
+    for version, rows in ((4, IPV4_ROWS), (6, IPV6_ROWS)):
+        path = tmp_path / BLOCKS_FILES[version]
+        text = newline.join([HEADER] + rows)
+        path.write_bytes((text + newline if version == 4 else text).encode())
+        blocks[version] = str(path)
+    return str(tmp_path / LOCATIONS_FILE), blocks
+
+
+def test_country_ranges(tmp_path):
+    for newline in ('\n', '\r\n'):
+        directory = tmp_path / repr(newline)
+        directory.mkdir()
+        locations, blocks = write_csvs(directory, newline)
+        ranges, report = country_ranges(locations, blocks, 'sa')
+        assert ranges.to_cidrs() == ['5.42.224.0/19', '5.44.0.0/24', '2a00:1::/32', '2a00:3::/32']
+        assert report['geoname_ids'] == [SA]
+        assert report['rows'] == {4: len(IPV4_ROWS), 6: len(IPV6_ROWS)}
+        assert report['matched'] == {4: 2, 6: 2}
@@ -0,0 +1,29 @@
+import os
+import importlib.util
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts', 'ripe-to-cidr.py')
+spec = importlib.util.spec_from_file_location('ripe_to_cidr', SCRIPT)
+ripe_to_cidr = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(ripe_to_cidr)
+
+DELEGATED = """\
+2|ripencc|20260101|9|19830101|20260101|+0000
+ripencc|*|ipv4|*|9|summary
+ripencc|SA|ipv4|5.42.224.0|8192|20110101|allocated
+ripencc|SA|ipv4|5.42.0.0|0|20110101|allocated
+ripencc|SA|ipv4|5.43.0.0|-5|20110101|allocated
+ripencc|SA|ipv4|255.255.255.0|512|20110101|allocated
+ripencc|SA|ipv6|2a00:1::|32|20110101|allocated
+ripencc|SA|ipv6|2a00:2::|-1|20110101|allocated
+ripencc|SA|ipv6|2a00:3::|129|20110101|allocated
+ripencc|SA|ipv6|2a00:4::|x|20110101|allocated
+ripencc|AE|ipv4|5.30.0.0|65536|20110101|allocated
+"""
+
+
+def test_malformed_records_are_skipped(tmp_path):
+    path = tmp_path / 'delegated.txt'
+    path.write_text(DELEGATED)
+    assert ripe_to_cidr.read_delegated_intervals(str(path), 'SA', 'ipv4') == [(0x052AE000, 0x052AFFFF)]
+    first = 0x2A000001 << 96
+    assert ripe_to_cidr.read_delegated_intervals(str(path), 'SA', 'ipv6') == [(first, first + (1 << 96) - 1)]
@@ -0,0 +1,170 @@
+import os
+import gzip
+import json
+import asyncio
+import hashlib
+import threading
+
+import pytest
+
+import rule_server
+from rule_server import (MAX_HEADER_BYTES, RuleServer, accepted_encodings, compute_delta, precompress,
+                         take_snapshot)
+
+
+def test_precompress_drops_variant_not_worth_keeping(tmp_path):
+    path = tmp_path / 'sa.txt'
+    path.write_bytes(b'example.sa\n' * 100)
+    assert precompress(str(tmp_path)) == 1
+    assert gzip.decompress((tmp_path / 'sa.txt.gz').read_bytes()) == path.read_bytes()
+
+    # Incompressible new content: the old variant must not outlive it
+    path.write_bytes(os.urandom(2048))
+    os.utime(path, (os.path.getmtime(path) + 10,) * 2)
+    assert precompress(str(tmp_path)) == 0
+    assert not (tmp_path / 'sa.txt.gz').exists()
+
+
+def test_variant_older_than_source_is_not_served(tmp_path):
+    path = tmp_path / 'sa.txt'
+    path.write_bytes(b'example.sa\n' * 100)
+    precompress(str(tmp_path))
+    server = RuleServer(str(tmp_path))
+    status, headers, body = server.handle('GET', '/sa.txt', {'accept-encoding': 'gzip'})
+    assert (status, headers['Content-Encoding']) == (200, 'gzip')
+
+    # The list changes after precompress ran; the .gz now holds the old content
+    path.write_bytes(b'example.sa\nnew.example.sa\n' * 100)
+    os.utime(path, (os.path.getmtime(path) + 10,) * 2)
+    (tmp_path / 'sa.txt.sha256sum').write_text(hashlib.sha256(path.read_bytes()).hexdigest() + '  sa.txt\n')
+    status, headers, body = server.handle('GET', '/sa.txt', {'accept-encoding': 'gzip'})
+    assert status == 200 and 'Content-Encoding' not in headers
+    assert body == path.read_bytes()
+    assert headers['ETag'] == f'"{hashlib.sha256(body).hexdigest()}"'
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, br', {'gzip', 'br'}),
+    ('gzip;q=0, br;q=0.5', {'br'}),
+    ('GZIP ; Q=0.0', set()),
+    ('x-brotli-ish', {'x-brotli-ish'}),
+    ('*;q=0.1, br;q=0', {'*', 'gzip'}),
+    ('', set()),
+])
+def test_accepted_encodings(header, expected):
+    assert accepted_encodings(header) == expected
+
+
+def test_refused_and_lookalike_encodings_get_identity(tmp_path):
+    path = tmp_path / 'sa.txt'
+    path.write_bytes(b'example.sa\n' * 100)
+    precompress(str(tmp_path))
+    (tmp_path / 'sa.txt.br').write_bytes(b'not really brotli')
+    server = RuleServer(str(tmp_path))
+    for header in ('gzip;q=0', 'x-brotli-ish', 'identity'):
+        _, headers, body = server.handle('GET', '/sa.txt', {'accept-encoding': header})
+        assert 'Content-Encoding' not in headers
+        assert body == path.read_bytes()
+
+
+async def request(reader, writer, target, headers=()):
+    """Send one GET on a keep-alive connection; returns (status, headers, body)."""
+    lines = [f'GET {target} HTTP/1.1', 'Host: test', *headers]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    out = {}
+    for line in head[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            out[name.strip().lower()] = value.strip()
+    status = int(head[0].split()[1])
+    body = await reader.readexactly(int(out['content-length'])) if status != 304 else b''
+    return status, out, body
+
+
+def run_server(server, client):
+    """Run client(reader, writer) against server on a loopback port."""
+    async def main():
+        listener = await asyncio.start_server(server._serve_client, '127.0.0.1', 0, limit=MAX_HEADER_BYTES)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            return await client(port)
+        finally:
+            listener.close()
+            await listener.wait_closed()
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def release(tmp_path):
+    root = tmp_path / 'release'
+    root.mkdir()
+    (root / 'geoip-sa.srs').write_bytes(bytes(range(256)) * 4)
+    history = tmp_path / 'history'
+    for version, domains, ips in (('202610100300', 'a.sa\nb.sa\n', '192.0.2.0/24\n'),
+                                  ('202610170300', 'b.sa\nc.sa\n', '192.0.2.0/24\n198.51.100.0/24\n')):
+        (tmp_path / 'domains.txt').write_text(domains)
+        (tmp_path / 'ips.txt').write_text(ips)
+        take_snapshot(str(history), version, str(tmp_path / 'domains.txt'), str(tmp_path / 'ips.txt'))
+    return RuleServer(str(root), history=str(history))
+
+
+def test_etag_range_and_delta_over_http(release):
+    data = bytes(range(256)) * 4
+
+    async def client(port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            status, headers, body = await request(reader, writer, '/geoip-sa.srs')
+            assert (status, body) == (200, data)
+            etag = headers['etag']
+            assert (await request(reader, writer, '/geoip-sa.srs', [f'If-None-Match: {etag}']))[0] == 304
+
+            status, headers, body = await request(reader, writer, '/geoip-sa.srs', ['Range: bytes=1000-'])
+            assert (status, headers['content-range'], body) == (206, 'bytes 1000-1023/1024', data[1000:])
+            status, headers, _ = await request(reader, writer, '/geoip-sa.srs', ['Range: bytes=2000-'])
+            assert (status, headers['content-range']) == (416, 'bytes */1024')
+
+            status, _, body = await request(reader, writer, '/delta?since=202610100300')
+            assert status == 200
+            assert json.loads(body) == {
+                'from': '202610100300', 'to': '202610170300',
+                'domains': {'added': ['c.sa'], 'removed': ['a.sa']},
+                'cidrs': {'added': ['198.51.100.0/24'], 'removed': []},
+            }
+            assert (await request(reader, writer, '/delta?since=1999'))[0] == 404
+            assert (await request(reader, writer, '/missing.txt'))[0] == 404
+        finally:
+            writer.close()
+
+    run_server(release, client)
+
+
+def test_slow_delta_does_not_block_other_clients(release, monkeypatch):
+    started, finish = threading.Event(), threading.Event()
+
+    def slow_delta(*args):
+        started.set()
+        finish.wait(5)
+        return compute_delta(*args)
+
+    monkeypatch.setattr(rule_server, 'compute_delta', slow_delta)
+
+    async def client(port):
+        slow = await asyncio.open_connection('127.0.0.1', port)
+        fast = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            delta = asyncio.ensure_future(request(*slow, '/delta?since=202610100300'))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            # Served while the delta is still being computed
+            status, _, body = await asyncio.wait_for(request(*fast, '/version'), 2)
+            assert (status, json.loads(body)) == (200, {'latest': '202610170300'})
+            assert not delta.done()
+            finish.set()
+            assert (await delta)[0] == 200
+        finally:
+            finish.set()
+            slow[1].close()
+            fast[1].close()
+
+    run_server(release, client)
@@ -0,0 +1,38 @@
+import json
+
+from srs import (RULE_SET_VERSION_1, normalize_rule, read_rules, rule_from_lists, write_rule_set)
+
+
+def write_lists(tmp_path):
+    (tmp_path / 'domains.txt').write_text('# comment\nexample.sa\nGov.SA\n')
+    (tmp_path / 'cidrs.txt').write_text('192.0.2.0/25\n192.0.2.128/25\n2001:db8::/32\n')
+    return rule_from_lists(domain_suffix=[tmp_path / 'domains.txt'], ip_cidr=[tmp_path / 'cidrs.txt'])
+
+
+def test_written_rule_set_reads_back(tmp_path):
+    rule = write_lists(tmp_path)
+    for version in (RULE_SET_VERSION_1, 2):
+        path = tmp_path / f'v{version}.srs'
+        write_rule_set(path, [rule], version=version)
+        assert [normalize_rule(r) for r in read_rules(path)] == [normalize_rule(rule)]
+
+
+def test_decompiled_json_spellings_compare_equal(tmp_path):
+    rule = write_lists(tmp_path)
+    # Version 1 files decompile to a domain plus a ".domain" suffix; CIDRs come back merged
+    decompiled = {'version': 1, 'rules': [{
+        'domain': ['example.sa', 'gov.sa'],
+        'domain_suffix': ['.example.sa', '.gov.sa'],
+        'ip_cidr': ['192.0.2.0/24', '2001:db8::/32'],
+    }]}
+    path = tmp_path / 'decompiled.json'
+    path.write_text(json.dumps(decompiled))
+    assert [normalize_rule(r) for r in read_rules(path)] == [normalize_rule(rule)]
+
+
+def test_missing_entries_do_not_compare_equal(tmp_path):
+    rule = write_lists(tmp_path)
+    path = tmp_path / 'decompiled.json'
+    path.write_text(json.dumps({'version': 2, 'rules': [{
+        'domain_suffix': ['example.sa'], 'ip_cidr': ['192.0.2.0/24', '2001:db8::/32']}]}))
+    assert [normalize_rule(r) for r in read_rules(path)] != [normalize_rule(rule)]